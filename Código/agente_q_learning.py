@@ -1,27 +1,66 @@
+import heapq
 import numpy as np
-import random
-import matplotlib.pyplot as plt
 from collections import deque
 import time
 import pickle
-import pandas as pd
-import json
 import os
 from datetime import datetime
+from instrumentacion import Cronometro
+import graficos
+
+
+class BufferRepeticion:
+    """
+    Buffer circular de transiciones (estado, acción, recompensa, nuevo estado) en
+    arreglos preasignados; al llenarse se sobrescriben las más antiguas
+    """
+    
+    def __init__(self, capacidad=100_000, rng=None):
+        self.capacidad = capacidad
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.estados = np.zeros(capacidad, dtype=np.int16)
+        self.acciones = np.zeros(capacidad, dtype=np.int8)
+        self.recompensas = np.zeros(capacidad, dtype=np.float32)
+        self.nuevos_estados = np.zeros(capacidad, dtype=np.int16)
+        self.posicion = 0
+        self.tamano = 0
+    
+    def __len__(self):
+        return self.tamano
+    
+    def agregar(self, estado_idx, accion_idx, recompensa, nuevo_estado_idx):
+        i = self.posicion
+        self.estados[i] = estado_idx
+        self.acciones[i] = accion_idx
+        self.recompensas[i] = recompensa
+        self.nuevos_estados[i] = nuevo_estado_idx
+        self.posicion = (i + 1) % self.capacidad
+        self.tamano = min(self.tamano + 1, self.capacidad)
+    
+    def muestrear(self, n):
+        """n transiciones al azar (con reemplazo): arreglos estados, acciones, recompensas, nuevos_estados"""
+        indices = self.rng.integers(0, self.tamano, size=n)
+        return self.estados[indices], self.acciones[indices], self.recompensas[indices], self.nuevos_estados[indices]
+
 
 class AgenteQLearning:
     
-    def __init__(self, n_estados=240, n_acciones=4):
+    def __init__(self, n_estados=240, n_acciones=4, rng=None):
         """
         Args:
             n_estados: Número de estados (240 según propuesta)
             n_acciones: Número de acciones (4 según propuesta)
+            rng: np.random.Generator propio del agente (Q-table inicial, ε-greedy y
+                 muestreo del buffer), o semilla / SeedSequence para crearlo
         """
         self.n_estados = n_estados
         self.n_acciones = n_acciones
+        self.rng = np.random.default_rng(rng)
+        self._uniformes = []
+        self._i_uniforme = 0
         
         # Q-table inicializada con valores pequeños aleatorios para evitar estancamiento
-        self.q_table = np.random.uniform(-1, 1, (n_estados, n_acciones)) * 0.1
+        self.q_table = self.rng.uniform(-1, 1, (n_estados, n_acciones)) * 0.1
         
         # Hiperparámetros
         self.alpha = 0.3      # Tasa de aprendizaje
@@ -33,6 +72,23 @@ class AgenteQLearning:
         self.historial_epsilon = []
         self.historial_exploracion = []
         
+        # Repetición de experiencia y planificación Dyna-Q (desactivadas por defecto,
+        # ver configurar_repeticion)
+        self.buffer = None
+        self.actualizaciones_por_paso = 0
+        self.barridos_planificacion = 0
+        self.intervalo_planificacion = 48
+        self.alpha_repeticion = 0.03
+        self.presupuesto_priorizado = 0
+        self.umbral_prioridad = 1e-3
+        self._modelo_transiciones = None
+        self._modelo_recompensas = None
+        self._modelo_conteos = None
+        self._predecesores = None
+        self._cola_prioridad = []
+        self._prioridad_en_cola = None
+        self._pasos_observados = 0
+        
         # Metadatos del entrenamiento
         self.metadata = {
             'fecha_creacion': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
@@ -55,21 +111,47 @@ class AgenteQLearning:
         # Guardar epsilon actual para historial
         self.historial_epsilon.append(epsilon_actual)
         
-        # ε-greedy
-        if random.random() < epsilon_actual:
-            accion = random.randint(0, self.n_acciones - 1)
+        # ε-greedy (dos uniformes presorteadas por llamada: exploración y acción / desempate)
+        i = self._i_uniforme
+        if i == len(self._uniformes):
+            self._uniformes = self.rng.random(4096).tolist()
+            i = 0
+        u_exploracion = self._uniformes[i]
+        u_accion = self._uniformes[i + 1]
+        self._i_uniforme = i + 2
+        if u_exploracion < epsilon_actual:
+            accion = int(u_accion * self.n_acciones)
             explorando = True
         else:
             # Si hay empate, elegir aleatoriamente entre las mejores
             q_values = self.q_table[estado_idx]
             max_q = np.max(q_values)
             mejores_acciones = np.where(q_values == max_q)[0]
-            accion = random.choice(mejores_acciones)
+            accion = int(mejores_acciones[int(u_accion * len(mejores_acciones))])
             explorando = False
         
         self.historial_exploracion.append(explorando)
         return accion
     
+    def fijar_generador(self, rng):
+        """Reemplaza el generador del agente (y del buffer) y descarta las uniformes ya sorteadas"""
+        self.rng = np.random.default_rng(rng)
+        self._uniformes = []
+        self._i_uniforme = 0
+        if self.buffer is not None:
+            self.buffer.rng = self.rng
+    
+    def probabilidad_accion(self, estado_idx, accion_idx, epsilon=None):
+        """
+        Probabilidad con que seleccionar_accion elige accion_idx en estado_idx
+        (por defecto con el último ε usado; los empates se reparten como en la selección)
+        """
+        if epsilon is None:
+            epsilon = self.historial_epsilon[-1] if self.historial_epsilon else self.epsilon
+        q_values = self.q_table[estado_idx]
+        mejores = q_values == np.max(q_values)
+        return epsilon / self.n_acciones + (1 - epsilon) * mejores[accion_idx] / np.sum(mejores)
+    
     def actualizar_q_table(self, estado_idx, accion_idx, recompensa, nuevo_estado_idx):
         """
         Actualiza Q-table usando la ecuación de Bellman
@@ -86,6 +168,179 @@ class AgenteQLearning:
         # Actualizar Q-table
         self.q_table[estado_idx, accion_idx] = nuevo_q
     
+    def configurar_repeticion(self, capacidad=100_000, actualizaciones_por_paso=32, barridos_planificacion=0,
+                              intervalo_planificacion=48, alpha_repeticion=0.03, presupuesto_priorizado=0,
+                              umbral_prioridad=1e-3):
+        """
+        Activa la repetición de experiencia y la planificación Dyna-Q
+        
+        Cada transición simulada se guarda en un BufferRepeticion y en un modelo tabular
+        (conteos de transiciones y recompensa media por estado-acción). Después de cada
+        paso real se repiten `actualizaciones_por_paso` transiciones del buffer en una
+        actualización vectorizada, y cada `intervalo_planificacion` pasos se hacen
+        `barridos_planificacion` barridos Dyna-Q sobre los pares estado-acción vistos.
+        Con presupuesto_priorizado > 0, además, después de cada paso se hacen hasta esa
+        cantidad de actualizaciones por barrido priorizado (ver barrido_priorizado).
+        
+        Las transiciones repetidas usan una tasa menor (alpha_repeticion): con la tasa
+        del agente (0.3) y decenas de repeticiones por paso la Q-table sigue el ruido
+        de las últimas muestras y la política final empeora.
+        """
+        self.buffer = BufferRepeticion(capacidad, rng=self.rng)
+        self.alpha_repeticion = alpha_repeticion
+        self.actualizaciones_por_paso = actualizaciones_por_paso
+        self.barridos_planificacion = barridos_planificacion
+        self.intervalo_planificacion = intervalo_planificacion
+        self.presupuesto_priorizado = presupuesto_priorizado
+        self.umbral_prioridad = umbral_prioridad
+        self._modelo_transiciones = np.zeros((self.n_estados, self.n_acciones, self.n_estados), dtype=np.float32)
+        self._modelo_recompensas = np.zeros((self.n_estados, self.n_acciones))
+        self._modelo_conteos = np.zeros((self.n_estados, self.n_acciones))
+        self._predecesores = [set() for _ in range(self.n_estados)]
+        self._cola_prioridad = []
+        self._prioridad_en_cola = np.zeros((self.n_estados, self.n_acciones))
+        self._pasos_observados = 0
+        self.metadata['repeticion'] = {
+            'capacidad': capacidad,
+            'actualizaciones_por_paso': actualizaciones_por_paso,
+            'barridos_planificacion': barridos_planificacion,
+            'intervalo_planificacion': intervalo_planificacion,
+            'alpha_repeticion': alpha_repeticion,
+            'presupuesto_priorizado': presupuesto_priorizado,
+            'umbral_prioridad': umbral_prioridad
+        }
+    
+    @property
+    def repeticion_activa(self):
+        return self.buffer is not None
+    
+    def actualizar_con_repeticion(self, estado_idx, accion_idx, recompensa, nuevo_estado_idx):
+        """
+        Actualización de un paso real más las actualizaciones de repetición y
+        planificación que correspondan (reemplaza a actualizar_q_table en el bucle)
+        """
+        self.actualizar_q_table(estado_idx, accion_idx, recompensa, nuevo_estado_idx)
+        
+        self.buffer.agregar(estado_idx, accion_idx, recompensa, nuevo_estado_idx)
+        self._modelo_transiciones[estado_idx, accion_idx, nuevo_estado_idx] += 1
+        self._modelo_recompensas[estado_idx, accion_idx] += recompensa
+        self._modelo_conteos[estado_idx, accion_idx] += 1
+        self._predecesores[nuevo_estado_idx].add(estado_idx * self.n_acciones + accion_idx)
+        self._pasos_observados += 1
+        
+        if self.actualizaciones_por_paso:
+            self.repetir_experiencia(self.actualizaciones_por_paso)
+        if self.barridos_planificacion and self._pasos_observados % self.intervalo_planificacion == 0:
+            self.planificar(self.barridos_planificacion)
+        if self.presupuesto_priorizado:
+            self._encolar(estado_idx, accion_idx, abs(self._error_esperado(estado_idx, accion_idx)))
+            self.barrido_priorizado(self.presupuesto_priorizado)
+    
+    def repetir_experiencia(self, n):
+        """
+        Actualización vectorizada con n transiciones del buffer
+        
+        Todas usan la Q-table actual como objetivo; si un estado-acción sale varias veces
+        se aplica el promedio de sus errores TD (una sola actualización con tasa alpha_repeticion).
+        """
+        if self.buffer is None or len(self.buffer) == 0:
+            return
+        estados, acciones, recompensas, nuevos_estados = self.buffer.muestrear(n)
+        celdas = estados.astype(np.intp) * self.n_acciones + acciones
+        
+        q_plana = self.q_table.reshape(-1)
+        error_td = recompensas + self.gamma * self.q_table[nuevos_estados].max(axis=1) - q_plana[celdas]
+        
+        suma = np.bincount(celdas, weights=error_td, minlength=q_plana.size)
+        conteo = np.bincount(celdas, minlength=q_plana.size)
+        vistas = np.flatnonzero(conteo)
+        q_plana[vistas] += self.alpha_repeticion * suma[vistas] / conteo[vistas]
+    
+    def planificar(self, n_barridos=1):
+        """
+        Barridos Dyna-Q con el modelo aprendido: actualización esperada de todos los
+        estado-acción observados, Q(s,a) += α_rep (r̄(s,a) + γ Σ P(s'|s,a) max Q(s') - Q(s,a))
+        """
+        if self._modelo_transiciones is None:
+            return
+        conteos = self._modelo_conteos
+        vistos = conteos > 0
+        if not vistos.any():
+            return
+        
+        probabilidades = self._modelo_transiciones[vistos] / conteos[vistos][:, None]
+        recompensa_media = self._modelo_recompensas[vistos] / conteos[vistos]
+        for _ in range(n_barridos):
+            objetivo = recompensa_media + self.gamma * probabilidades @ self.q_table.max(axis=1)
+            self.q_table[vistos] += self.alpha_repeticion * (objetivo - self.q_table[vistos])
+    
+    def barrido_priorizado(self, presupuesto):
+        """
+        Barrido priorizado: actualiza con el modelo los estado-acción de mayor |error TD|
+        esperado (cola heapq) y encola a sus predecesores, hasta `presupuesto` actualizaciones.
+        Usa alpha_repeticion, como la repetición de experiencia: el modelo tabular no ve el
+        estado oculto del paciente y con α completo sesga la Q-table.
+        
+        Returns:
+            número de actualizaciones hechas
+        """
+        cola = self._cola_prioridad
+        actualizaciones = 0
+        while cola and actualizaciones < presupuesto:
+            prioridad, estado_idx, accion_idx = heapq.heappop(cola)
+            if -prioridad != self._prioridad_en_cola[estado_idx, accion_idx]:
+                continue  # entrada vieja: el par se volvió a encolar con más prioridad
+            self._prioridad_en_cola[estado_idx, accion_idx] = 0
+            
+            self.q_table[estado_idx, accion_idx] += self.alpha_repeticion * self._error_esperado(estado_idx, accion_idx)
+            actualizaciones += 1
+            
+            # El valor de estado_idx cambió: recalcular la prioridad de quienes llevan a él
+            predecesores = self._predecesores[estado_idx]
+            if predecesores:
+                celdas = np.fromiter(predecesores, dtype=np.intp, count=len(predecesores))
+                estados, acciones = np.divmod(celdas, self.n_acciones)
+                errores = np.abs(self._error_esperado(estados, acciones))
+                for i in np.flatnonzero(errores > self.umbral_prioridad):
+                    self._encolar(int(estados[i]), int(acciones[i]), float(errores[i]))
+        
+        return actualizaciones
+    
+    def _error_esperado(self, estados, acciones):
+        """Error TD con el modelo: r̄(s,a) + γ Σ P(s'|s,a) max Q(s') - Q(s,a)"""
+        conteos = self._modelo_conteos[estados, acciones]
+        valor_futuro = self._modelo_transiciones[estados, acciones] @ self.q_table.max(axis=1)
+        objetivo = (self._modelo_recompensas[estados, acciones] + self.gamma * valor_futuro) / conteos
+        return objetivo - self.q_table[estados, acciones]
+    
+    def _encolar(self, estado_idx, accion_idx, prioridad):
+        # Solo se encola si supera el umbral y la prioridad con que ya estaba en la cola
+        if prioridad > self.umbral_prioridad and prioridad > self._prioridad_en_cola[estado_idx, accion_idx]:
+            self._prioridad_en_cola[estado_idx, accion_idx] = prioridad
+            heapq.heappush(self._cola_prioridad, (-prioridad, estado_idx, accion_idx))
+    
+    def __getstate__(self):
+        # El buffer, el modelo Dyna-Q, la cola y los uniformes presorteados son estado de
+        # entrenamiento: no se guardan en los .pkl
+        estado = self.__dict__.copy()
+        estado.update(buffer=None, _modelo_transiciones=None, _modelo_recompensas=None, _modelo_conteos=None,
+                      _predecesores=None, _cola_prioridad=[], _prioridad_en_cola=None,
+                      _uniformes=[], _i_uniforme=0)
+        return estado
+    
+    def __setstate__(self, estado):
+        # Modelos guardados antes de existir la repetición de experiencia
+        self.__dict__.update({'buffer': None, 'actualizaciones_por_paso': 0, 'barridos_planificacion': 0,
+                              'intervalo_planificacion': 48, 'alpha_repeticion': 0.03, 'presupuesto_priorizado': 0,
+                              'umbral_prioridad': 1e-3, '_modelo_transiciones': None, '_modelo_recompensas': None,
+                              '_modelo_conteos': None, '_predecesores': None, '_cola_prioridad': [],
+                              '_prioridad_en_cola': None, '_pasos_observados': 0})
+        # ... y antes de que el agente tuviera generador propio
+        self.__dict__.update({'rng': None, '_uniformes': [], '_i_uniforme': 0})
+        self.__dict__.update(estado)
+        if self.rng is None:
+            self.rng = np.random.default_rng()
+    
     def estado_a_indice(self, estado, simulador):
         
         glucosa_cat, insulina_cat, tiempo_cat, sensibilidad_cat = estado
@@ -121,7 +376,15 @@ class AgenteQLearning:
             print(f"Categorías disponibles: glucosa={simulador.categorias_glucosa}")
             return 0  # Estado por defecto en caso de error
     
-    def entrenar(self, simulador, n_episodios=1000):
+    def entrenar(self, simulador, n_episodios=1000, instrumentar=False):
+        """
+        Entrena el agente con un simulador
+        
+        Args:
+            instrumentar: Si True, mide tiempo y llamadas por etapa (simulación, indexado,
+                          selección de acción, actualización) y agrega el resumen al log
+                          JSONL de instrumentación
+        """
         
         print(f"\n")
         print(f"ENTRENANDO AGENTE Q-LEARNING")
@@ -139,24 +402,39 @@ class AgenteQLearning:
         mejores_recompensas = deque(maxlen=100)
         tiempo_inicio = time.time()
         
+        # Funciones del bucle (envueltas con contadores solo si se instrumenta)
+        reset = simulador.reset
+        step = simulador.step
+        estado_a_indice = self.estado_a_indice
+        seleccionar_accion = self.seleccionar_accion
+        actualizar_q_table = self.actualizar_con_repeticion if self.repeticion_activa else self.actualizar_q_table
+        cronometro = None
+        if instrumentar:
+            cronometro = Cronometro()
+            reset = cronometro.envolver(reset, 'reset')
+            step = cronometro.envolver(step, 'simulacion')
+            estado_a_indice = cronometro.envolver(estado_a_indice, 'indice_estado')
+            seleccionar_accion = cronometro.envolver(seleccionar_accion, 'seleccion_accion')
+            actualizar_q_table = cronometro.envolver(actualizar_q_table, 'actualizacion_q')
+        
         for episodio in range(n_episodios):
             # Estado inicial
-            estado = simulador.reset()
-            estado_idx = self.estado_a_indice(estado, simulador)
+            estado = reset()
+            estado_idx = estado_a_indice(estado, simulador)
             terminado = False
             recompensa_total = 0
             pasos = 0
             
             while not terminado:
                 # Seleccionar acción
-                accion_idx = self.seleccionar_accion(estado_idx, episodio, n_episodios)
+                accion_idx = seleccionar_accion(estado_idx, episodio, n_episodios)
                 
                 # Ejecutar acción en el entorno
-                nuevo_estado, recompensa, terminado = simulador.step(accion_idx)
-                nuevo_estado_idx = self.estado_a_indice(nuevo_estado, simulador)
+                nuevo_estado, recompensa, terminado = step(accion_idx)
+                nuevo_estado_idx = estado_a_indice(nuevo_estado, simulador)
                 
                 # Actualizar Q-table
-                self.actualizar_q_table(estado_idx, accion_idx, recompensa, nuevo_estado_idx)
+                actualizar_q_table(estado_idx, accion_idx, recompensa, nuevo_estado_idx)
                 
                 # Actualizar para siguiente iteración
                 estado_idx = nuevo_estado_idx
@@ -180,6 +458,14 @@ class AgenteQLearning:
         
         tiempo_total = time.time() - tiempo_inicio
         
+        if cronometro is not None:
+            registro = cronometro.reporte(
+                unidades={'pasos': cronometro.llamadas('simulacion'), 'episodios': n_episodios},
+                extra={'origen': 'AgenteQLearning.entrenar', 'paciente_id': simulador.paciente_id}
+            )
+            cronometro.registrar(registro)
+            cronometro.imprimir(registro)
+        
         # Actualizar metadatos
         self.metadata.update({
             'fecha_fin_entrenamiento': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
@@ -308,6 +594,9 @@ class AgenteQLearning:
         Returns:
             dict: Diccionario con las rutas de los archivos guardados
         """
+        import json
+        import pandas as pd
+        
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         
         if usar_timestamp:
@@ -468,6 +757,7 @@ class AgenteQLearning:
             print("No hay datos de entrenamiento para visualizar")
             return
         
+        plt = graficos.pyplot()
         fig, axes = plt.subplots(2, 3, figsize=(15, 10))
         fig.suptitle('Proceso de Aprendizaje del Agente RL', fontsize=14, fontweight='bold')
         
@@ -540,7 +830,7 @@ class AgenteQLearning:
             plt.savefig(filename, dpi=300, bbox_inches='tight')
             print(f"Gráfico guardado como: {filename}")
         
-        plt.show()
+        graficos.mostrar(plt)
         
         return fig
     
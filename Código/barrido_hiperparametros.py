@@ -0,0 +1,242 @@
+import itertools
+import os
+import sys
+import time
+from datetime import datetime
+import numpy as np
+from simulador_vectorizado import SimuladorDiabetesVectorizado, crear_simulador_vectorizado
+from evaluacion_panel import seleccionar_panel, evaluar_politicas, resumir_metricas
+import perfilado
+
+# Barrido de hiperparámetros en paralelo.
+#
+# Cada configuración es un agente Q-learning independiente, pero todos se entrenan a
+# la vez: las Q-tables se apilan en un arreglo (C, 240, 4) y el simulador vectorizado
+# lleva una fila por configuración. Todas ven el mismo flujo de pacientes, la misma
+# glucosa inicial, el mismo ruido y los mismos sorteos de exploración, así que las
+# diferencias en el ranking se deben a los hiperparámetros. Con una Q-table de 240x4,
+# decenas de configuraciones cuestan poco más que una.
+
+# Valores por defecto de AgenteQLearning / EntrenadorInteligente
+CONFIGURACION_BASE = {
+    'alpha': 0.3,
+    'gamma': 0.95,
+    'epsilon': 0.3,
+    'exponente_epsilon': 0.8,  # ε decreciente: ε * (1 - progreso ** exponente)
+    'episodios_por_paciente': 3
+}
+EPSILON_MINIMO = 0.01
+
+
+def generar_grilla(**valores):
+    """
+    Producto cartesiano de los valores de cada hiperparámetro; los que no se
+    indican toman el valor de CONFIGURACION_BASE
+    
+    Ejemplo: generar_grilla(alpha=[0.1, 0.3], gamma=[0.9, 0.95, 0.99])  -> 6 configuraciones
+    """
+    for nombre in valores:
+        if nombre not in CONFIGURACION_BASE:
+            raise ValueError(f"Hiperparámetro desconocido: {nombre}")
+    
+    nombres = list(CONFIGURACION_BASE)
+    listas = [list(valores.get(nombre) or [CONFIGURACION_BASE[nombre]]) for nombre in nombres]
+    return [dict(zip(nombres, combinacion)) for combinacion in itertools.product(*listas)]
+
+
+def _parametros_pacientes(df_pacientes):
+    """Parámetros fisiológicos por paciente (mismo ajuste que crear_simulador_personalizado)"""
+    simulador = crear_simulador_vectorizado(df_pacientes)
+    return {
+        'sensibilidad_idx': simulador.sensibilidad_idx,
+        'efecto_insulina': simulador.efecto_insulina,
+        'metabolismo_basal': simulador.metabolismo_basal,
+        'fuerza_comida': simulador.fuerza_comida
+    }
+
+
+def entrenar_configuraciones(configuraciones, pacientes, n_episodios_max, semilla, pbar=None):
+    """
+    Entrena las configuraciones apiladas sobre el flujo de pacientes
+    
+    Los sorteos (Q-table inicial, estado inicial, ruido y exploración) dependen solo de
+    la semilla y de n_episodios_max, no de qué configuraciones se entrenan juntas:
+    repartir las configuraciones entre procesos da exactamente las mismas Q-tables.
+    
+    Args:
+        pacientes: dict de parámetros por paciente (ver _parametros_pacientes)
+        n_episodios_max: Máximo de episodios_por_paciente de todo el barrido
+    
+    Returns:
+        arreglo (C, 240, 4) con las Q-tables entrenadas
+    """
+    c = len(configuraciones)
+    alpha = np.array([cfg['alpha'] for cfg in configuraciones], dtype=float)
+    gamma = np.array([cfg['gamma'] for cfg in configuraciones], dtype=float)
+    epsilon = np.array([cfg['epsilon'] for cfg in configuraciones], dtype=float)
+    exponente = np.array([cfg['exponente_epsilon'] for cfg in configuraciones], dtype=float)
+    episodios = np.array([cfg['episodios_por_paciente'] for cfg in configuraciones])
+    
+    rng = np.random.default_rng(semilla)
+    
+    # Misma inicialización que AgenteQLearning para todas las configuraciones
+    q_inicial = rng.uniform(-1, 1, (240, 4)) * 0.1
+    q = np.repeat(q_inicial[None], c, axis=0)
+    filas = np.arange(c)
+    
+    # El simulador recibe estado y ruido explícitos; su generador propio solo se usa en
+    # el reset del constructor (que sortea C valores y desincronizaría los grupos)
+    simulador = SimuladorDiabetesVectorizado(np.zeros(c, dtype=np.int64), rng=np.random.default_rng(semilla))
+    n_pacientes = len(pacientes['sensibilidad_idx'])
+    
+    for p in range(n_pacientes):
+        simulador.sensibilidad_idx.fill(pacientes['sensibilidad_idx'][p])
+        simulador.efecto_insulina.fill(pacientes['efecto_insulina'][p])
+        simulador.metabolismo_basal.fill(pacientes['metabolismo_basal'][p])
+        simulador.fuerza_comida.fill(pacientes['fuerza_comida'][p])
+        
+        # ε decreciente según el avance en el flujo de pacientes
+        epsilon_actual = np.maximum(EPSILON_MINIMO, epsilon * (1 - (p / n_pacientes) ** exponente))
+        
+        for episodio in range(n_episodios_max):
+            glucosa_inicial = rng.uniform(80, 160)
+            tiempo_desde_dosis = rng.integers(120, 300)
+            sorteo_exploracion = rng.random(48)
+            accion_azar = rng.integers(0, 4, 48)
+            ruido = rng.normal(0, 5, 48)
+            
+            # Configuraciones con menos episodios por paciente no aprenden en este
+            # episodio (los sorteos se consumen igual para mantener la sincronía)
+            alpha_episodio = np.where(episodios > episodio, alpha, 0.0)
+            if not alpha_episodio.any():
+                continue
+            
+            estados = simulador.fijar_estado(glucosa_inicial, 0, tiempo_desde_dosis, 0, 0)
+            for paso in range(48):
+                greedy = np.argmax(q[filas, estados], axis=1)
+                acciones = np.where(sorteo_exploracion[paso] < epsilon_actual, accion_azar[paso], greedy)
+                
+                # Todas las configuraciones ven el mismo ruido (mismo paciente, mismo episodio)
+                nuevos_estados, recompensas, _ = simulador.step(acciones, ruido=np.full(c, ruido[paso]))
+                
+                # Ecuación de Bellman para todas las configuraciones a la vez
+                q_actual = q[filas, estados, acciones]
+                objetivo = recompensas + gamma * q[filas, nuevos_estados].max(axis=1)
+                q[filas, estados, acciones] = q_actual + alpha_episodio * (objetivo - q_actual)
+                
+                estados = nuevos_estados
+        
+        if pbar is not None:
+            pbar.update(1)
+    
+    return q
+
+
+def _entrenar_grupo_proceso(configuraciones, pacientes, n_episodios_max, semilla):
+    """Entrena un grupo de configuraciones en un proceso aparte"""
+    return entrenar_configuraciones(configuraciones, pacientes, n_episodios_max, semilla)
+
+
+def ejecutar_barrido(configuraciones, db_path, total_pacientes=None, pacientes_panel=500,
+                     episodios_panel=1, n_workers=1, semilla=None, directorio='Resultados/barridos'):
+    """
+    Entrena todas las configuraciones sobre el mismo flujo de pacientes, las evalúa
+    en un panel común y guarda el ranking
+    
+    Args:
+        configuraciones: Lista de dicts (ver generar_grilla)
+        total_pacientes: Pacientes del flujo de entrenamiento (por defecto todos)
+        pacientes_panel: Pacientes del panel de evaluación
+        n_workers: Procesos; las configuraciones se reparten entre ellos
+    
+    Returns:
+        dict con el ranking (lista de dicts, mejor primero) y los archivos generados
+    """
+    import pandas as pd
+    from tqdm import tqdm
+    
+    if semilla is None:
+        semilla = int(datetime.now().timestamp())
+    
+    # Mismo orden de pacientes que EntrenadorInteligente.cargar_y_validar
+    df_pacientes = pd.read_csv(db_path).sample(frac=1, random_state=42).reset_index(drop=True)
+    if total_pacientes is None:
+        total_pacientes = len(df_pacientes)
+    pacientes = _parametros_pacientes(df_pacientes.iloc[:total_pacientes])
+    n_episodios_max = max(cfg['episodios_por_paciente'] for cfg in configuraciones)
+    
+    print(f"\nBARRIDO DE HIPERPARÁMETROS: {len(configuraciones)} configuraciones")
+    print(f"   - Pacientes de entrenamiento: {total_pacientes:,}")
+    print(f"   - Panel de evaluación: {pacientes_panel} pacientes x {episodios_panel} episodios")
+    print(f"   - Procesos: {n_workers}")
+    
+    inicio = time.perf_counter()
+    n_workers = max(1, min(n_workers, len(configuraciones)))
+    if n_workers == 1:
+        pbar = tqdm(total=total_pacientes, desc="Pacientes procesados", unit="paciente")
+        q_tables = entrenar_configuraciones(configuraciones, pacientes, n_episodios_max, semilla, pbar=pbar)
+        pbar.close()
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        
+        grupos = [list(g) for g in np.array_split(np.array(configuraciones, dtype=object), n_workers)]
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            futuros = [executor.submit(_entrenar_grupo_proceso, grupo, pacientes, n_episodios_max, semilla)
+                       for grupo in grupos]
+            q_tables = np.concatenate([futuro.result() for futuro in futuros])
+    tiempo_entrenamiento = time.perf_counter() - inicio
+    print(f"   Entrenamiento: {tiempo_entrenamiento:.1f} s")
+    
+    # Evaluación en el panel común
+    panel = seleccionar_panel(df_pacientes, pacientes_panel, semilla=semilla)
+    metricas = evaluar_politicas(q_tables, panel, n_episodios=episodios_panel, semilla=semilla)
+    resumen = resumir_metricas(metricas)
+    
+    ranking = []
+    for i, (configuracion, fila) in enumerate(zip(configuraciones, resumen)):
+        ranking.append({'configuracion': i, **configuracion, **fila})
+    ranking.sort(key=lambda fila: fila['puntuacion'], reverse=True)
+    for posicion, fila in enumerate(ranking, start=1):
+        fila['posicion'] = posicion
+    
+    # Guardar ranking y Q-tables (índice = columna "configuracion")
+    os.makedirs(directorio, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    archivo_ranking = os.path.join(directorio, f"barrido_{timestamp}_ranking.csv")
+    archivo_q_tables = os.path.join(directorio, f"barrido_{timestamp}_q_tables.npy")
+    columnas = ['posicion', 'configuracion', *CONFIGURACION_BASE, 'puntuacion', 'puntuacion_ic_inf',
+                'puntuacion_ic_sup', 'tiempo_en_rango', 'hipoglucemias', 'hiperglucemias',
+                'glucosa_promedio', 'recompensas']
+    pd.DataFrame(ranking)[columnas].to_csv(archivo_ranking, index=False)
+    np.save(archivo_q_tables, q_tables)
+    
+    print(f"\nRANKING (panel de {len(panel)} pacientes):")
+    print(f"   {'#':>3} {'alpha':>6} {'gamma':>6} {'eps':>5} {'exp':>5} {'ep':>3} "
+          f"{'puntuación (IC95)':>22} {'TIR':>6} {'hipo':>5}")
+    for fila in ranking[:10]:
+        print(f"   {fila['posicion']:>3} {fila['alpha']:>6.3g} {fila['gamma']:>6.3g} {fila['epsilon']:>5.2g} "
+              f"{fila['exponente_epsilon']:>5.2g} {fila['episodios_por_paciente']:>3} "
+              f"{fila['puntuacion']:>8.1f} ({fila['puntuacion_ic_inf']:.1f}-{fila['puntuacion_ic_sup']:.1f}) "
+              f"{fila['tiempo_en_rango']:>5.1f}% {fila['hipoglucemias']:>4.1f}%")
+    print(f"\n   - Ranking: {archivo_ranking}")
+    print(f"   - Q-tables: {archivo_q_tables}")
+    
+    return {
+        'configuraciones': len(configuraciones),
+        'pacientes_entrenamiento': total_pacientes,
+        'pacientes_panel': len(panel),
+        'semilla': semilla,
+        'tiempo_entrenamiento_s': tiempo_entrenamiento,
+        'ranking': ranking,
+        'archivos': {'ranking': archivo_ranking, 'q_tables': archivo_q_tables}
+    }
+
+
+def main(argv=None):
+    # Mismo flujo que "python cli.py sweep"
+    from cli import main as cli_main
+    return cli_main(['sweep'] + list(sys.argv[1:] if argv is None else argv))
+
+
+if __name__ == "__main__":
+    sys.exit(perfilado.ejecutar(main, 'barrido'))
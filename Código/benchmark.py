@@ -0,0 +1,391 @@
+import numpy as np
+import pandas as pd
+import argparse
+import contextlib
+import io
+import json
+import os
+import pickle
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from agente_q_learning import AgenteQLearning
+from simulador_diabetes_rl import generador_derivado
+
+# Benchmarks de los caminos críticos del proyecto.
+# Todo corre sobre una cohorte sintética generada con semillas fijas en un directorio
+# temporal, así que no hace falta la base de datos ni un modelo entrenado previamente.
+
+SEMILLA = 42
+TOLERANCIA_DEFECTO = 0.10
+MEMORIA_MINIMA_COMPARAR_KB = 64  # debajo de esto la memoria pico es puro ruido
+
+# Presupuesto de tiempo de importación de simulador + agente en un proceso nuevo
+# (incluye numpy, que es casi todo el costo; los módulos del proyecto no deben sumar más
+# de unos pocos ms, así que matplotlib/pandas/seaborn solo se importan al usarse)
+PRESUPUESTO_IMPORTACION_MS = 100
+DIRECTORIO_CODIGO = os.path.dirname(os.path.abspath(__file__))
+
+
+def fijar_semillas(*objetos, semilla=SEMILLA):
+    """Semillas globales (generador de pacientes) y generador propio (rng) de simuladores y planificador"""
+    random.seed(semilla)
+    np.random.seed(semilla)
+    for objeto in objetos:
+        objeto.rng = np.random.default_rng(semilla)
+
+
+@contextlib.contextmanager
+def silencio():
+    """Oculta prints y barras de progreso de los módulos medidos"""
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        yield
+
+
+def medir(nombre, funcion, repeticiones=5, unidades=1, unidad='llamadas', preparar=None):
+    """
+    Mide una función: tiempo (mediana/mínimo de varias repeticiones), throughput
+    y memoria pico (tracemalloc, en una ejecución aparte para no distorsionar el tiempo)
+    
+    Args:
+        funcion: Callable sin argumentos; cada llamada procesa `unidades` unidades
+        preparar: Callable opcional que se ejecuta antes de cada repetición (no se mide)
+    """
+    tiempos = []
+    with silencio():
+        # Calentamiento
+        if preparar is not None:
+            preparar()
+        funcion()
+        
+        for _ in range(repeticiones):
+            if preparar is not None:
+                preparar()
+            inicio = time.perf_counter()
+            funcion()
+            tiempos.append(time.perf_counter() - inicio)
+        
+        if preparar is not None:
+            preparar()
+        tracemalloc.start()
+        funcion()
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    
+    mediana = float(np.median(tiempos))
+    resultado = {
+        'tiempo_mediana_s': mediana,
+        'tiempo_min_s': float(np.min(tiempos)),
+        'repeticiones': repeticiones,
+        'unidades': unidades,
+        'unidad': unidad,
+        'throughput_por_s': unidades / mediana if mediana > 0 else float('inf'),
+        'memoria_pico_kb': pico / 1024
+    }
+    
+    print(f"  {nombre:<32} {mediana*1000:10.3f} ms  "
+          f"{resultado['throughput_por_s']:14,.0f} {unidad}/s  "
+          f"{resultado['memoria_pico_kb']:10,.1f} KB")
+    
+    return resultado
+
+
+def medir_importacion(repeticiones=5):
+    """
+    Tiempo de importar simulador + agente en procesos nuevos (separando numpy del resto)
+    """
+    codigo = (
+        "import time; t0 = time.perf_counter(); import numpy; t1 = time.perf_counter(); "
+        "import simulador_diabetes_rl, agente_q_learning; t2 = time.perf_counter(); "
+        "import sys; print(t1 - t0, t2 - t1, 'matplotlib' in sys.modules or 'pandas' in sys.modules)"
+    )
+    entorno = dict(os.environ)
+    entorno.pop('PYTHONDONTWRITEBYTECODE', None)  # medir con bytecode en caché, como en uso normal
+    
+    muestras = []
+    for i in range(repeticiones + 1):
+        salida = subprocess.run([sys.executable, '-c', codigo], cwd=DIRECTORIO_CODIGO, env=entorno,
+                                capture_output=True, text=True, check=True).stdout.split()
+        if i > 0:  # la primera corrida solo compila el bytecode
+            muestras.append((float(salida[0]), float(salida[1])))
+        pesadas = salida[2] == 'True'
+    
+    numpy_s = float(np.median([m[0] for m in muestras]))
+    proyecto_s = float(np.median([m[1] for m in muestras]))
+    total_s = float(np.median([m[0] + m[1] for m in muestras]))
+    
+    resultado = {
+        'tiempo_mediana_s': total_s,
+        'tiempo_min_s': float(np.min([m[0] + m[1] for m in muestras])),
+        'repeticiones': repeticiones,
+        'unidades': 1,
+        'unidad': 'procesos',
+        'throughput_por_s': 1 / total_s,
+        'memoria_pico_kb': 0.0,
+        'numpy_s': numpy_s,
+        'proyecto_s': proyecto_s,
+        'importa_librerias_pesadas': pesadas,
+        'presupuesto_ms': PRESUPUESTO_IMPORTACION_MS
+    }
+    
+    print(f"  {'importacion_simulador_agente':<32} {total_s*1000:10.3f} ms  "
+          f"(numpy {numpy_s*1000:.1f} ms + proyecto {proyecto_s*1000:.1f} ms)")
+    if total_s * 1000 > PRESUPUESTO_IMPORTACION_MS:
+        print(f"  ADVERTENCIA: supera el presupuesto de {PRESUPUESTO_IMPORTACION_MS} ms")
+    if pesadas:
+        print("  ADVERTENCIA: importar simulador + agente carga matplotlib o pandas")
+    
+    return resultado
+
+
+def ejecutar_benchmarks(directorio, repeticiones=5):
+    """Ejecuta todos los benchmarks dentro de `directorio` y retorna los resultados"""
+    from generador_pacientes import generar_dataset_antropometrico_coherente
+    from entrenamiento_checkpoints import EntrenadorInteligente
+    from test_modelo_final import EvaluadorFinal
+    from plan_insulina_personalizado import PlanificadorInsulinaPersonalizado
+    
+    resultados = {}
+    db_path = os.path.join(directorio, 'db_benchmark.csv')
+    modelo_path = os.path.join(directorio, 'best_model.pkl')
+    
+    # 0. IMPORTACIÓN
+    print("\nIMPORTACIÓN")
+    resultados['importacion_simulador_agente'] = medir_importacion(repeticiones)
+    
+    # 1. DATASET
+    print("\nDATASET")
+    
+    def generar():
+        fijar_semillas()
+        generar_dataset_antropometrico_coherente(db_path)
+    
+    resultados['dataset_generacion'] = medir('dataset_generacion', generar, repeticiones=1,
+                                             unidades=50000, unidad='pacientes')
+    resultados['dataset_carga'] = medir('dataset_carga', lambda: pd.read_csv(db_path),
+                                        repeticiones=repeticiones, unidades=50000, unidad='pacientes')
+    df_pacientes = pd.read_csv(db_path)
+    
+    # Mismo mapeo paciente -> simulador que el entrenamiento
+    entrenador = EntrenadorInteligente(db_path=db_path, semilla=SEMILLA)
+    entrenador.df_pacientes = df_pacientes
+    crear_simulador = entrenador.crear_simulador_personalizado
+    
+    # 2. SIMULADOR
+    print("\nSIMULADOR")
+    simulador = crear_simulador(df_pacientes.iloc[0].to_dict(), rng=SEMILLA)
+    n_dias = 200
+    
+    def dias_simulados():
+        for _ in range(n_dias):
+            simulador.reset()
+            for paso in range(48):
+                simulador.step(paso % 4)
+    
+    def resets():
+        for _ in range(10000):
+            simulador.reset()
+    
+    def discretizaciones():
+        for _ in range(10000):
+            simulador._discretizar_estado()
+    
+    resultados['simulador_step'] = medir('simulador_step', dias_simulados, repeticiones,
+                                         unidades=n_dias * 48, unidad='pasos',
+                                         preparar=lambda: fijar_semillas(simulador))
+    resultados['simulador_reset'] = medir('simulador_reset', resets, repeticiones,
+                                          unidades=10000, unidad='resets', preparar=lambda: fijar_semillas(simulador))
+    resultados['simulador_discretizar'] = medir('simulador_discretizar', discretizaciones, repeticiones,
+                                                unidades=10000, unidad='estados')
+    
+    # 3. AGENTE
+    print("\nAGENTE")
+    fijar_semillas(simulador)
+    agente = AgenteQLearning(n_estados=240, n_acciones=4, rng=SEMILLA)
+    estados = [simulador.reset() for _ in range(10000)]
+    indices = np.random.randint(0, 240, size=10000).tolist()
+    acciones = np.random.randint(0, 4, size=10000).tolist()
+    recompensas = np.random.choice([10, -1, -15, -20], size=10000).tolist()
+    
+    def convertir_estados():
+        for estado in estados:
+            agente.estado_a_indice(estado, simulador)
+    
+    def seleccionar():
+        for i, estado_idx in enumerate(indices):
+            agente.seleccionar_accion(estado_idx, i, 10000)
+    
+    def limpiar_historial():
+        agente.fijar_generador(SEMILLA)
+        agente.historial_epsilon = []
+        agente.historial_exploracion = []
+    
+    def actualizar():
+        for i in range(9999):
+            agente.actualizar_q_table(indices[i], acciones[i], recompensas[i], indices[i + 1])
+    
+    resultados['agente_estado_a_indice'] = medir('agente_estado_a_indice', convertir_estados, repeticiones,
+                                                 unidades=10000, unidad='estados')
+    resultados['agente_seleccionar_accion'] = medir('agente_seleccionar_accion', seleccionar, repeticiones,
+                                                    unidades=10000, unidad='acciones', preparar=limpiar_historial)
+    resultados['agente_actualizar_q_table'] = medir('agente_actualizar_q_table', actualizar, repeticiones,
+                                                    unidades=9999, unidad='updates')
+    
+    n_episodios = 20
+    resultados['entrenar_episodio'] = medir('entrenar_episodio',
+                                            lambda: agente.entrenar(simulador, n_episodios=n_episodios),
+                                            repeticiones, unidades=n_episodios, unidad='episodios',
+                                            preparar=lambda: (fijar_semillas(simulador), agente.fijar_generador(SEMILLA)))
+    
+    # Modelo de referencia para evaluación y planificación (entrenamiento corto y determinista)
+    with silencio():
+        agente = AgenteQLearning(n_estados=240, n_acciones=4, rng=SEMILLA)
+        for i, (_, paciente) in enumerate(df_pacientes.head(300).iterrows()):
+            agente.entrenar(crear_simulador(paciente.to_dict(), rng=generador_derivado(SEMILLA, i)), n_episodios=3)
+    with open(modelo_path, 'wb') as f:
+        pickle.dump(agente, f, protocol=pickle.HIGHEST_PROTOCOL)
+    
+    def cargar_modelo():
+        with open(modelo_path, 'rb') as f:
+            pickle.load(f)
+    
+    resultados['modelo_carga'] = medir('modelo_carga', cargar_modelo, repeticiones)
+    
+    # 4. EVALUACIÓN
+    print("\nEVALUACIÓN")
+    entrenador.agente = agente
+    resultados['evaluar_checkpoint'] = medir('evaluar_checkpoint',
+                                             lambda: entrenador.evaluar_checkpoint(n_pacientes=100),
+                                             repeticiones, unidades=100, unidad='pacientes')
+    
+    evaluador = EvaluadorFinal(modelo_path=modelo_path, db_path=db_path)
+    evaluador.agente = agente
+    evaluador.df_pacientes = df_pacientes
+    resultados['evaluar_muestra_1k'] = medir('evaluar_muestra_1k',
+                                             lambda: evaluador.evaluar_muestra(n_pacientes=1000, semilla=SEMILLA),
+                                             max(1, repeticiones // 2), unidades=1000, unidad='pacientes')
+    
+    # 5. PLANIFICACIÓN
+    print("\nPLANIFICACIÓN")
+    with silencio():
+        planificador = PlanificadorInsulinaPersonalizado(modelo_path=modelo_path, db_path=db_path)
+    resultados['generar_plan_24h'] = medir('generar_plan_24h',
+                                           lambda: planificador.generar_plan_24h(paciente_id=0, glucosa_inicial=150,
+                                                                                 mostrar_detalles=False),
+                                           repeticiones, unidades=1, unidad='planes',
+                                           preparar=lambda: fijar_semillas(planificador))
+    
+    return resultados
+
+
+def info_entorno():
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'plataforma': platform.platform(),
+        'procesador': platform.processor() or platform.machine()
+    }
+
+
+def comparar(actual, baseline, tolerancia=TOLERANCIA_DEFECTO):
+    """
+    Compara dos corridas y marca regresiones de tiempo (mediana) o memoria pico
+    mayores que la tolerancia relativa
+    
+    Returns:
+        Lista de regresiones (nombre, métrica, valor base, valor actual, cambio relativo)
+    """
+    regresiones = []
+    
+    print(f"\nCOMPARACIÓN CON BASELINE (tolerancia {tolerancia*100:.0f}%)")
+    print(f"  {'benchmark':<32} {'base ms':>10} {'actual ms':>10} {'cambio':>8}")
+    
+    for nombre, base in baseline['resultados'].items():
+        if nombre not in actual['resultados']:
+            print(f"  {nombre:<32} (no medido en esta corrida)")
+            continue
+        nuevo = actual['resultados'][nombre]
+        
+        cambio_tiempo = nuevo['tiempo_mediana_s'] / base['tiempo_mediana_s'] - 1
+        marca = ''
+        if cambio_tiempo > tolerancia:
+            marca = '  <-- REGRESIÓN'
+            regresiones.append((nombre, 'tiempo', base['tiempo_mediana_s'], nuevo['tiempo_mediana_s'], cambio_tiempo))
+        
+        print(f"  {nombre:<32} {base['tiempo_mediana_s']*1000:10.3f} {nuevo['tiempo_mediana_s']*1000:10.3f} "
+              f"{cambio_tiempo*100:+7.1f}%{marca}")
+        
+        if base['memoria_pico_kb'] >= MEMORIA_MINIMA_COMPARAR_KB:
+            cambio_memoria = nuevo['memoria_pico_kb'] / base['memoria_pico_kb'] - 1
+            if cambio_memoria > tolerancia:
+                print(f"  {'':<32} memoria pico {base['memoria_pico_kb']:,.0f} KB -> "
+                      f"{nuevo['memoria_pico_kb']:,.0f} KB ({cambio_memoria*100:+.1f}%)  <-- REGRESIÓN")
+                regresiones.append((nombre, 'memoria', base['memoria_pico_kb'], nuevo['memoria_pico_kb'], cambio_memoria))
+    
+    if regresiones:
+        print(f"\n{len(regresiones)} regresión(es) detectada(s)")
+    else:
+        print("\nSin regresiones")
+    
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks de rendimiento del proyecto")
+    parser.add_argument('--salida', default=None,
+                        help="Archivo JSON de resultados (por defecto Resultados/benchmarks/benchmark_<fecha>.json)")
+    parser.add_argument('--comparar', default=None, metavar='BASELINE_JSON',
+                        help="Compara contra una corrida previa y marca regresiones")
+    parser.add_argument('--tolerancia', type=float, default=TOLERANCIA_DEFECTO,
+                        help="Cambio relativo tolerado antes de marcar regresión (0.10 = 10%%)")
+    parser.add_argument('--repeticiones', type=int, default=5)
+    args = parser.parse_args()
+    
+    if args.salida is None:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        args.salida = os.path.join('Resultados', 'benchmarks', f'benchmark_{timestamp}.json')
+    salida = os.path.abspath(args.salida)
+    baseline_path = os.path.abspath(args.comparar) if args.comparar else None
+    
+    print("BENCHMARKS DE RENDIMIENTO")
+    print(f"  {'benchmark':<32} {'mediana':>13}  {'throughput':>20}  {'memoria pico':>13}")
+    
+    # Todo lo que escriben los módulos (Resultados/..., CSV, modelos) queda en un directorio temporal
+    directorio = tempfile.mkdtemp(prefix='benchmark_')
+    directorio_original = os.getcwd()
+    try:
+        os.chdir(directorio)
+        resultados = ejecutar_benchmarks(directorio, repeticiones=args.repeticiones)
+    finally:
+        os.chdir(directorio_original)
+        shutil.rmtree(directorio, ignore_errors=True)
+    
+    corrida = {
+        'fecha': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        'semilla': SEMILLA,
+        'entorno': info_entorno(),
+        'resultados': resultados
+    }
+    
+    os.makedirs(os.path.dirname(salida), exist_ok=True)
+    with open(salida, 'w') as f:
+        json.dump(corrida, f, indent=2)
+    print(f"\nResultados guardados en: {salida}")
+    
+    if baseline_path:
+        with open(baseline_path, 'r') as f:
+            baseline = json.load(f)
+        regresiones = comparar(corrida, baseline, args.tolerancia)
+        if regresiones:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,488 @@
+import argparse
+import contextlib
+import json
+import os
+import sys
+import perfilado
+from simulador_diabetes_rl import RESOLUCIONES_CGM
+
+# Interfaz de línea de comandos única del proyecto (sin prompts interactivos).
+#
+#   python cli.py generate --pacientes 50000 --semilla 1
+#   python cli.py train --db "Base de datos/db_diabetes_50k.csv" --intervalo-checkpoint 500
+#   python cli.py evaluate --pacientes 10000 --workers 4 --lote 500
+#   python cli.py plan --paciente-id 42 --glucosa-inicial 150
+#   python cli.py plan --paciente-id 42 --minutos-paso 5
+#   python cli.py sweep --alpha 0.1 0.3 --gamma 0.9 0.95 0.99 --pacientes 5000
+#   python cli.py rank --pacientes 2000 --workers 4
+#   python cli.py rank Resultados/barridos/*_q_tables.npy --analitico --confirmar 10
+#   python cli.py fit Resultados/trayectorias/entrenamiento --salida Resultados/offline/modelo_offline
+#   python cli.py ope Resultados/trayectorias/entrenamiento Resultados/checkpoints/checkpoint_0*.pkl
+#   python cli.py hypo --pacientes 5000 --episodios-por-paciente 2
+#   python cli.py multiday --dias 90 --lote 10000 --salida Resultados/largo_plazo/pacientes.csv
+#
+# Con --formato json los mensajes de progreso van a stderr y stdout queda con un
+# único JSON de resumen, para encadenar con otras herramientas o un planificador de tareas.
+
+DB_DEFECTO = os.path.join("Base de datos", "db_diabetes_50k.csv")
+MODELO_DEFECTO = os.path.join("Resultados", "best_model", "best_model.pkl")
+
+
+def _convertir_json(obj):
+    if hasattr(obj, 'item'):
+        return obj.item()
+    if hasattr(obj, 'tolist'):
+        return obj.tolist()
+    return str(obj)
+
+
+def comando_generate(args):
+    from generador_pacientes import generar_dataset_antropometrico_coherente, validar_dataset
+    
+    print(f"GENERADOR DE DATASET DE DIABETES TIPO 1 - {args.pacientes:,} REGISTROS")
+    
+    directorio = os.path.dirname(args.salida)
+    if directorio:
+        os.makedirs(directorio, exist_ok=True)
+    df = generar_dataset_antropometrico_coherente(args.salida, total_pacientes=args.pacientes, semilla=args.semilla)
+    perfilado.snapshot_memoria("dataset_generado")
+    validar_dataset(df)
+    
+    return {'archivo': args.salida, 'pacientes': len(df), 'semilla': args.semilla}
+
+
+def comando_train(args):
+    from entrenamiento_checkpoints import ejecutar_entrenamiento
+    
+    resumen = ejecutar_entrenamiento(
+        db_path=args.db,
+        total_pacientes=args.pacientes,
+        episodios_por_paciente=args.episodios_por_paciente,
+        checkpoint_interval=args.intervalo_checkpoint,
+        pacientes_evaluacion_final=args.pacientes_evaluacion,
+        semilla=args.semilla,
+        instrumentar=args.instrumentar,
+        visualizar=not args.sin_graficos,
+        presupuesto_segundos=args.presupuesto_segundos,
+        presupuesto_pasos=args.presupuesto_pasos,
+        paciencia_politica=args.paciencia_politica,
+        umbral_delta_q=args.umbral_delta_q,
+        paciencia_puntuacion=args.paciencia_puntuacion,
+        actualizaciones_por_paso=args.repeticiones_por_paso,
+        barridos_planificacion=args.barridos_planificacion,
+        capacidad_buffer=args.capacidad_buffer,
+        presupuesto_priorizado=args.barrido_priorizado,
+        directorio_trayectorias=args.trayectorias
+    )
+    if resumen is None:
+        raise SystemExit(2)
+    return resumen
+
+
+def comando_evaluate(args):
+    from test_modelo_final import EvaluadorFinal
+    
+    print("TEST FINAL DEL MODELO RL - DIABETES TIPO 1")
+    
+    if not os.path.exists(args.db):
+        print(f"ERROR: No se encuentra la base de datos: {args.db}")
+        raise SystemExit(2)
+    
+    n_pacientes = args.pacientes
+    if n_pacientes is None:
+        with open(args.db, encoding='utf-8') as f:
+            n_pacientes = sum(1 for _ in f) - 1  # todas las filas menos el encabezado
+    
+    print(f"\nConfiguracion:")
+    print(f" - Modelo: {args.modelo}")
+    print(f" - Base de datos: {args.db}")
+    print(f" - Pacientes a evaluar: {n_pacientes}")
+    print(f" - Procesos: {args.workers} (lotes de {args.lote} pacientes)")
+    
+    evaluador = EvaluadorFinal(modelo_path=args.modelo, db_path=args.db)
+    resultados = evaluador.ejecutar_evaluacion_completa(
+        n_pacientes=n_pacientes,
+        n_episodios_por_paciente=args.episodios_por_paciente,
+        n_workers=args.workers,
+        tamano_lote=args.lote,
+        semilla=args.semilla,
+        visualizar=not args.sin_graficos,
+        directorio_trayectorias=args.trayectorias
+    )
+    if not resultados:
+        raise SystemExit(1)
+    
+    resumen = {'modelo': evaluador.modelo_path, 'db': args.db, 'pacientes': n_pacientes,
+               'archivos': resultados.get('archivos'), 'trayectorias': args.trayectorias}
+    if resultados.get('estadisticas'):
+        stats = resultados['estadisticas']
+        resumen['metricas'] = {
+            'tiempo_en_rango': stats['tiempo_en_rango']['mean'],
+            'hipoglucemias': stats['hipoglucemias']['mean'],
+            'hiperglucemias': stats['hiperglucemias']['mean'],
+            'puntuacion_compuesta': stats.get('puntuacion_compuesta', 0)
+        }
+        print(f"\nMETRICAS FINALES:")
+        print(f"  - Tiempo en rango: {stats['tiempo_en_rango']['mean']:.1f}%")
+        print(f"  - Hipoglucemias: {stats['hipoglucemias']['mean']:.1f}%")
+        print(f"  - Hiperglucemias: {stats['hiperglucemias']['mean']:.1f}%")
+        print(f"  - Puntuacion: {stats.get('puntuacion_compuesta', 0):.1f}/100")
+    
+    print("PROCESO FINALIZADO")
+    return resumen
+
+
+def comando_plan(args):
+    from plan_insulina_personalizado import PlanificadorInsulinaPersonalizado
+    
+    print("GENERADOR DE PLANES DE INSULINA PERSONALIZADOS")
+    os.makedirs('Resultados/atencion_personalizada', exist_ok=True)
+    
+    planificador = PlanificadorInsulinaPersonalizado(modelo_path=args.modelo, db_path=args.db)
+    planificador.minutos_paso = args.minutos_paso
+    if args.mpc:
+        planificador.activar_mpc(semilla=args.semilla)
+    if args.trayectorias is not None:
+        from registro_trayectorias import RegistroTrayectorias
+        planificador.registro_trayectorias = RegistroTrayectorias(args.trayectorias, origen='plan')
+    
+    try:
+        return _planificar(planificador, args)
+    finally:
+        if planificador.registro_trayectorias is not None:
+            planificador.registro_trayectorias.cerrar()
+
+
+def _planificar(planificador, args):
+    # Varios pacientes o una cohorte: planificación por lote
+    if args.filtro is not None or (args.paciente_id is not None and len(args.paciente_id) > 1):
+        lote = planificador.generar_planes_lote(
+            paciente_ids=args.paciente_id,
+            filtro=args.filtro,
+            glucosa_inicial=args.glucosa_inicial,
+            semilla=args.semilla,
+            guardar_por_paciente=args.guardar_por_paciente
+        )
+        if lote is None:
+            print("ERROR: Ningún paciente cumple --paciente-id / --filtro")
+            raise SystemExit(2)
+        resumen = lote['resumen']
+        return {
+            'pacientes': len(resumen),
+            'tiempo_en_rango_prom': float(resumen['tiempo_en_rango'].mean()),
+            'hipoglucemias_prom': float(resumen['hipoglucemias'].mean()),
+            'archivos': lote['archivos']
+        }
+    
+    paciente_id = args.paciente_id[0] if args.paciente_id else None
+    resultado, archivos = planificador.ejecutar_planificacion_completa(
+        paciente_id=paciente_id,
+        glucosa_inicial=args.glucosa_inicial,
+        n_realizaciones=args.realizaciones,
+        semilla=args.semilla,
+        visualizar=not args.sin_graficos
+    )
+    print("PROCESO COMPLETADO EXITOSAMENTE")
+    
+    return {
+        'paciente_id': resultado['paciente_data'].get('id'),
+        'metricas': resultado['metricas'],
+        'archivos': archivos
+    }
+
+
+def comando_sweep(args):
+    from barrido_hiperparametros import generar_grilla, ejecutar_barrido
+    
+    if not os.path.exists(args.db):
+        print(f"ERROR: No se encuentra la base de datos: {args.db}")
+        raise SystemExit(2)
+    
+    configuraciones = generar_grilla(
+        alpha=args.alpha,
+        gamma=args.gamma,
+        epsilon=args.epsilon,
+        exponente_epsilon=args.exponente_epsilon,
+        episodios_por_paciente=args.episodios_por_paciente
+    )
+    resultado = ejecutar_barrido(
+        configuraciones,
+        db_path=args.db,
+        total_pacientes=args.pacientes,
+        pacientes_panel=args.pacientes_panel,
+        episodios_panel=args.episodios_panel,
+        n_workers=args.workers,
+        semilla=args.semilla
+    )
+    return resultado
+
+
+def comando_rank(args):
+    from ranking_checkpoints import ejecutar_ranking, rutas_por_defecto
+    
+    rutas = args.modelos or rutas_por_defecto()
+    if not rutas:
+        print("ERROR: No hay checkpoints en Resultados/checkpoints/ (o indica los archivos de modelo)")
+        raise SystemExit(2)
+    if not os.path.exists(args.db):
+        print(f"ERROR: No se encuentra la base de datos: {args.db}")
+        raise SystemExit(2)
+    
+    return ejecutar_ranking(
+        rutas,
+        db_path=args.db,
+        pacientes_panel=args.pacientes,
+        episodios_panel=args.episodios_por_paciente,
+        n_workers=args.workers,
+        tamano_lote=args.lote,
+        semilla=args.semilla,
+        analitico=args.analitico,
+        confirmar=args.confirmar
+    )
+
+
+def comando_fit(args):
+    from iteracion_q_offline import ejecutar_iteracion_offline
+    
+    if not os.path.isdir(args.trayectorias_entrada):
+        print(f"ERROR: No se encuentra el directorio de trayectorias: {args.trayectorias_entrada}")
+        raise SystemExit(2)
+    
+    resultado = ejecutar_iteracion_offline(
+        args.trayectorias_entrada,
+        salida=args.salida,
+        modelo_base=args.modelo_base,
+        gamma=args.gamma,
+        tolerancia=args.tolerancia,
+        max_iteraciones=args.max_iteraciones
+    )
+    if resultado is None:
+        raise SystemExit(1)
+    return resultado
+
+
+def comando_ope(args):
+    from evaluacion_off_policy import ejecutar_evaluacion_off_policy
+    from ranking_checkpoints import rutas_por_defecto
+    
+    if not os.path.isdir(args.trayectorias_entrada):
+        print(f"ERROR: No se encuentra el directorio de trayectorias: {args.trayectorias_entrada}")
+        raise SystemExit(2)
+    
+    resultado = ejecutar_evaluacion_off_policy(
+        args.trayectorias_entrada,
+        args.modelos or rutas_por_defecto(),
+        epsilon_objetivo=args.epsilon_objetivo,
+        pasos=args.pasos
+    )
+    if resultado is None:
+        raise SystemExit(1)
+    return resultado
+
+
+def comando_hypo(args):
+    from muestreo_importancia import ejecutar_estimacion_hipoglucemias
+    
+    if not os.path.exists(args.db):
+        print(f"ERROR: No se encuentra la base de datos: {args.db}")
+        raise SystemExit(2)
+    
+    return ejecutar_estimacion_hipoglucemias(
+        args.modelo,
+        args.db,
+        n_pacientes=args.pacientes,
+        n_episodios=args.episodios_por_paciente,
+        semilla=args.semilla,
+        desplazamiento_ruido=args.desplazamiento_ruido,
+        inclinacion_glucosa=args.inclinacion_glucosa,
+        umbral_inclinacion=args.umbral_inclinacion,
+        fraccion_inclinada=args.fraccion_inclinada
+    )
+
+
+def comando_multiday(args):
+    from simulacion_largo_plazo import ejecutar_simulacion_largo_plazo
+    
+    if not os.path.exists(args.db):
+        print(f"ERROR: No se encuentra la base de datos: {args.db}")
+        raise SystemExit(2)
+    
+    return ejecutar_simulacion_largo_plazo(
+        args.modelo,
+        args.db,
+        n_pacientes=args.pacientes,
+        n_dias=args.dias,
+        tamano_lote=args.lote,
+        semilla=args.semilla,
+        ventana_gmi=args.ventana_gmi,
+        salida=args.salida,
+        minutos_paso=args.minutos_paso
+    )
+
+
+def crear_parser():
+    comun = argparse.ArgumentParser(add_help=False)
+    comun.add_argument('--semilla', type=int, default=None, help="Semilla para resultados reproducibles")
+    comun.add_argument('--formato', choices=['texto', 'json'], default='texto',
+                       help="json: progreso a stderr y un resumen JSON en stdout")
+    comun.add_argument('--sin-graficos', action='store_true', help="No generar gráficos")
+    
+    trayectorias = argparse.ArgumentParser(add_help=False)
+    trayectorias.add_argument('--trayectorias', default=None, metavar='DIRECTORIO',
+                              help="Guardar cada paso simulado en bloques binarios (ver registro_trayectorias.py)")
+    
+    parser = argparse.ArgumentParser(
+        prog='cli.py',
+        description="Control de diabetes tipo 1 con Q-learning: generación, entrenamiento, evaluación y planes"
+    )
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+    
+    p = subparsers.add_parser('generate', parents=[comun], help="Generar la base de datos de pacientes")
+    p.add_argument('--salida', default=DB_DEFECTO, help="Archivo CSV de salida")
+    p.add_argument('--pacientes', type=int, default=50000, help="Número de pacientes")
+    p.set_defaults(funcion=comando_generate)
+    
+    p = subparsers.add_parser('train', parents=[comun, trayectorias], help="Entrenar con checkpoints")
+    p.add_argument('--db', default=DB_DEFECTO, help="Base de datos de pacientes (CSV)")
+    p.add_argument('--pacientes', type=int, default=None, help="Pacientes a usar (por defecto todos)")
+    p.add_argument('--episodios-por-paciente', type=int, default=3)
+    p.add_argument('--intervalo-checkpoint', type=int, default=500, help="Pacientes entre checkpoints")
+    p.add_argument('--pacientes-evaluacion', type=int, default=500, help="Pacientes de la evaluación final")
+    p.add_argument('--instrumentar', action='store_true', help="Medir tiempo por etapa del entrenamiento")
+    p.add_argument('--presupuesto-segundos', type=float, default=None, help="Tiempo máximo de entrenamiento")
+    p.add_argument('--presupuesto-pasos', type=int, default=None, help="Pasos de simulación máximos")
+    p.add_argument('--paciencia-politica', type=int, default=None,
+                   help="Parar tras K checkpoints sin cambios en la acción greedy de ningún estado")
+    p.add_argument('--umbral-delta-q', type=float, default=None,
+                   help="Parar si el mayor |ΔQ| entre checkpoints es menor que este valor")
+    p.add_argument('--paciencia-puntuacion', type=int, default=None,
+                   help="Parar tras K checkpoints sin mejorar la puntuación compuesta")
+    p.add_argument('--repeticiones-por-paso', type=int, default=0,
+                   help="Transiciones del buffer de repetición actualizadas después de cada paso simulado")
+    p.add_argument('--barridos-planificacion', type=int, default=0,
+                   help="Barridos Dyna-Q sobre el modelo aprendido al final de cada episodio")
+    p.add_argument('--capacidad-buffer', type=int, default=100_000, help="Transiciones del buffer de repetición")
+    p.add_argument('--barrido-priorizado', type=int, default=0, metavar='N',
+                   help="Actualizaciones por barrido priorizado (mayor |error TD|) después de cada paso simulado")
+    p.set_defaults(funcion=comando_train)
+    
+    p = subparsers.add_parser('evaluate', parents=[comun, trayectorias], help="Evaluar el mejor modelo")
+    p.add_argument('--modelo', default=MODELO_DEFECTO)
+    p.add_argument('--db', default=DB_DEFECTO)
+    p.add_argument('--pacientes', type=int, default=None, help="Pacientes a evaluar (por defecto todos)")
+    p.add_argument('--episodios-por-paciente', type=int, default=3)
+    p.add_argument('--workers', type=int, default=1, help="Procesos en paralelo")
+    p.add_argument('--lote', type=int, default=250, help="Pacientes por tarea en paralelo")
+    p.set_defaults(funcion=comando_evaluate)
+    
+    p = subparsers.add_parser('plan', parents=[comun, trayectorias], help="Generar planes de insulina personalizados")
+    p.add_argument('--modelo', default=MODELO_DEFECTO)
+    p.add_argument('--db', default=DB_DEFECTO)
+    p.add_argument('--paciente-id', type=int, nargs='+', default=None,
+                   help="Uno o más IDs (por defecto uno aleatorio; varios = plan por lote)")
+    p.add_argument('--filtro', default=None, help="Cohorte para plan por lote, p. ej. \"edad < 18\"")
+    p.add_argument('--glucosa-inicial', type=float, default=None)
+    p.add_argument('--realizaciones', type=int, default=1000, help="Realizaciones Monte Carlo (0 = sin bandas)")
+    p.add_argument('--mpc', action='store_true', help="Refinar cada dosis con rollouts (MPC, solo planes individuales)")
+    p.add_argument('--minutos-paso', type=int, choices=RESOLUCIONES_CGM, default=30,
+                   help="Resolución de la simulación; con menos de 30 se guardan lecturas tipo CGM")
+    p.add_argument('--guardar-por-paciente', action='store_true',
+                   help="En planes por lote, guardar también el JSON/CSV de cada paciente")
+    p.set_defaults(funcion=comando_plan)
+    
+    p = subparsers.add_parser('sweep', parents=[comun],
+                              help="Barrido de hiperparámetros (todas las combinaciones, entrenadas en paralelo)")
+    p.add_argument('--db', default=DB_DEFECTO)
+    p.add_argument('--pacientes', type=int, default=None, help="Pacientes de entrenamiento (por defecto todos)")
+    p.add_argument('--alpha', type=float, nargs='+', default=None)
+    p.add_argument('--gamma', type=float, nargs='+', default=None)
+    p.add_argument('--epsilon', type=float, nargs='+', default=None, help="Exploración inicial")
+    p.add_argument('--exponente-epsilon', type=float, nargs='+', default=None,
+                   help="Exponente del decaimiento de ε")
+    p.add_argument('--episodios-por-paciente', type=int, nargs='+', default=None)
+    p.add_argument('--pacientes-panel', type=int, default=500, help="Pacientes del panel de evaluación común")
+    p.add_argument('--episodios-panel', type=int, default=1, help="Episodios por paciente del panel")
+    p.add_argument('--workers', type=int, default=1, help="Procesos (las configuraciones se reparten entre ellos)")
+    p.set_defaults(funcion=comando_sweep)
+    
+    p = subparsers.add_parser('rank', parents=[comun],
+                              help="Ranking de checkpoints/modelos evaluados en el mismo panel")
+    p.add_argument('modelos', nargs='*',
+                   help="Archivos .pkl/.npy (por defecto Resultados/checkpoints/checkpoint_*.pkl)")
+    p.add_argument('--db', default=DB_DEFECTO)
+    p.add_argument('--pacientes', type=int, default=1000, help="Pacientes del panel")
+    p.add_argument('--episodios-por-paciente', type=int, default=1)
+    p.add_argument('--workers', type=int, default=1, help="Procesos en paralelo")
+    p.add_argument('--lote', type=int, default=250, help="Pacientes por tarea en paralelo")
+    p.add_argument('--analitico', action='store_true',
+                   help="Preseleccionar con el modelo de transiciones (Resultados/modelo_transiciones.npz)")
+    p.add_argument('--confirmar', type=int, default=20,
+                   help="Con --analitico, políticas mejor puntuadas que se simulan en el panel")
+    p.set_defaults(funcion=comando_rank)
+    
+    p = subparsers.add_parser('fit', parents=[comun],
+                              help="Ajustar una Q-table con trayectorias guardadas (iteración Q offline, sin simular)")
+    p.add_argument('trayectorias_entrada', metavar='TRAYECTORIAS', help="Directorio de trayectorias (--trayectorias)")
+    p.add_argument('--salida', default=os.path.join('Resultados', 'offline', 'modelo_offline'),
+                   help="Nombre base del modelo generado (.pkl, .npy, ...)")
+    p.add_argument('--modelo-base', default=None, help="Modelo .pkl/.npy cuya Q-table se refina")
+    p.add_argument('--gamma', type=float, default=0.95)
+    p.add_argument('--tolerancia', type=float, default=1e-4, help="Parar cuando el mayor |ΔQ| sea menor")
+    p.add_argument('--max-iteraciones', type=int, default=2000)
+    p.set_defaults(funcion=comando_fit)
+    
+    p = subparsers.add_parser('ope', parents=[comun],
+                              help="Evaluar modelos con trayectorias guardadas (importancia / doblemente robusto)")
+    p.add_argument('trayectorias_entrada', metavar='TRAYECTORIAS', help="Directorio de trayectorias (--trayectorias)")
+    p.add_argument('modelos', nargs='*',
+                   help="Archivos .pkl/.npy (por defecto Resultados/checkpoints/checkpoint_*.pkl)")
+    p.add_argument('--epsilon-objetivo', type=float, default=0.0, help="ε de las políticas evaluadas (0 = greedy)")
+    p.add_argument('--pasos', type=int, default=48, help="Pasos por episodio")
+    p.set_defaults(funcion=comando_ope)
+    
+    p = subparsers.add_parser('hypo', parents=[comun],
+                              help="Estimar tasas de hipoglucemia con muestreo por importancia (eventos raros)")
+    p.add_argument('--modelo', default=MODELO_DEFECTO)
+    p.add_argument('--db', default=DB_DEFECTO)
+    p.add_argument('--pacientes', type=int, default=None, help="Pacientes a simular (por defecto todos)")
+    p.add_argument('--episodios-por-paciente', type=int, default=1)
+    p.add_argument('--desplazamiento-ruido', type=float, default=-3.0,
+                   help="Media del ruido inclinado en mg/dL por paso (0 = Monte Carlo simple)")
+    p.add_argument('--inclinacion-glucosa', type=float, default=0.03,
+                   help="Tasa de la exponencial de la glucosa inicial inclinada (0 = uniforme)")
+    p.add_argument('--umbral-inclinacion', type=float, default=110, help="El ruido se inclina bajo esta glucosa")
+    p.add_argument('--fraccion-inclinada', type=float, default=0.5, help="Fracción de episodios inclinados")
+    p.set_defaults(funcion=comando_hypo)
+    
+    p = subparsers.add_parser('multiday', parents=[comun],
+                              help="Simular varios días seguidos por paciente (agregados diarios, GMI)")
+    p.add_argument('--modelo', default=MODELO_DEFECTO)
+    p.add_argument('--db', default=DB_DEFECTO)
+    p.add_argument('--pacientes', type=int, default=None, help="Pacientes a simular (por defecto todos)")
+    p.add_argument('--dias', type=int, default=90, help="Días seguidos por paciente")
+    p.add_argument('--lote', type=int, default=10_000, help="Pacientes simulados a la vez (memoria de trabajo)")
+    p.add_argument('--ventana-gmi', type=int, default=14, help="Días de las ventanas inicial y final del GMI")
+    p.add_argument('--minutos-paso', type=int, choices=RESOLUCIONES_CGM, default=30,
+                   help="Resolución de la simulación y de las lecturas de glucosa (decisiones cada 30 min)")
+    p.add_argument('--salida', default=None, help="CSV con las métricas por paciente")
+    p.set_defaults(funcion=comando_multiday)
+    
+    return parser
+
+
+def main(argv=None):
+    args = crear_parser().parse_args(argv)
+    
+    if args.formato == 'json':
+        with contextlib.redirect_stdout(sys.stderr):
+            resumen = args.funcion(args)
+        print(json.dumps({'comando': args.comando, **resumen}, default=_convertir_json, ensure_ascii=False))
+    else:
+        args.funcion(args)
+    
+    return 0
+
+
+if __name__ == "__main__":
+    comando = sys.argv[1] if len(sys.argv) > 1 and not sys.argv[1].startswith('-') else 'cli'
+    sys.exit(perfilado.ejecutar(main, f"cli_{comando}"))
@@ -0,0 +1,119 @@
+import time
+import numpy as np
+from simulador_vectorizado import SimuladorDiabetesVectorizado
+
+class ControladorMPC:
+    """
+    Refinamiento de dosis por anticipación (MPC) sobre la Q-table
+    
+    En cada decisión evalúa cada una de las dosis con muchos rollouts cortos del
+    simulador vectorizado (horizonte H, continuando con la política greedy) y usa
+    max Q(s_H) como valor terminal. Las dosis se comparan con los mismos números
+    aleatorios (ruido común) para reducir la varianza de la comparación.
+    """
+    
+    def __init__(self, q_table, gamma=0.95, horizonte=6, rollouts_por_lote=64, max_rollouts=512,
+                 presupuesto_ms=20.0, criterio='recompensa', semilla=None):
+        """
+        Args:
+            q_table: Q-table del agente (política de rollout y valor terminal)
+            gamma: Factor de descuento
+            horizonte: Pasos de 30 minutos simulados por rollout
+            rollouts_por_lote: Rollouts por dosis en cada lote vectorizado
+            max_rollouts: Máximo de rollouts por dosis en una decisión
+            presupuesto_ms: Tiempo máximo por decisión (se completa al menos un lote)
+            criterio: "recompensa" (mayor retorno esperado) o "hipoglucemia"
+                      (menor probabilidad de glucosa <70, desempate por retorno)
+            semilla: Semilla del generador de los rollouts
+        """
+        if criterio not in ("recompensa", "hipoglucemia"):
+            raise ValueError(f"Criterio no válido: {criterio}")
+        
+        self.q_table = q_table
+        self.gamma = gamma
+        self.horizonte = horizonte
+        self.rollouts_por_lote = rollouts_por_lote
+        self.max_rollouts = max_rollouts
+        self.presupuesto_ms = presupuesto_ms
+        self.criterio = criterio
+        self.rng = np.random.default_rng(semilla)
+        
+        # Política greedy y valor terminal precalculados
+        self.politica = np.argmax(q_table, axis=1)
+        self.valor_terminal = np.max(q_table, axis=1)
+        self.n_acciones = q_table.shape[1]
+    
+    def seleccionar_accion(self, simulador):
+        """
+        Elige la dosis para el estado actual de un SimuladorDiabetesRL
+        
+        Returns:
+            (accion_idx, detalle) donde detalle tiene el retorno esperado, el riesgo
+            de hipoglucemia por dosis y el número de rollouts usados
+        """
+        inicio = time.perf_counter()
+        m = self.rollouts_por_lote
+        horizonte = min(self.horizonte, simulador.pasos_por_episodio - simulador.pasos)
+        
+        # Episodio terminado: no quedan pasos que simular, se usa la acción greedy
+        if horizonte <= 0:
+            q_estado = self.q_table[simulador._estado_a_indice(simulador.get_estado_actual())]
+            return int(np.argmax(q_estado)), {
+                'retorno_esperado': np.asarray(q_estado, dtype=float),
+                'riesgo_hipoglucemia': np.zeros(self.n_acciones),
+                'rollouts_por_dosis': 0,
+                'tiempo_ms': (time.perf_counter() - inicio) * 1000
+            }
+        
+        rollout = SimuladorDiabetesVectorizado.desde_simulador(simulador, self.n_acciones * m, rng=self.rng)
+        acciones_iniciales = np.repeat(np.arange(self.n_acciones), m)
+        descuentos = self.gamma ** np.arange(horizonte)
+        
+        suma_retorno = np.zeros(self.n_acciones)
+        suma_hipo = np.zeros(self.n_acciones)
+        n_rollouts = 0
+        
+        while True:
+            rollout.fijar_estado(simulador.glucosa, simulador.insulina_activa,
+                                 simulador.tiempo_desde_dosis, simulador.tiempo_actual, simulador.pasos)
+            
+            # Mismo ruido para las m trayectorias de cada dosis (por sub-paso si minutos_paso < 30)
+            ruido = self.rng.normal(0, 5 * rollout.fraccion_paso ** 0.5, size=(horizonte, rollout.sub_pasos, m))
+            ruido = np.tile(ruido, (1, 1, self.n_acciones))
+            
+            retorno = np.zeros(self.n_acciones * m)
+            hipo = np.zeros(self.n_acciones * m, dtype=bool)
+            acciones = acciones_iniciales
+            
+            for h in range(horizonte):
+                estados, recompensas, _ = rollout.step(acciones, ruido=ruido[h])
+                retorno += descuentos[h] * recompensas
+                hipo |= np.any(rollout.lecturas_cgm < 70, axis=0)
+                acciones = self.politica[estados]
+            
+            # Valor terminal de la Q-table (solo si el episodio no terminó dentro del horizonte)
+            if rollout.pasos < rollout.pasos_por_episodio:
+                retorno += self.gamma ** horizonte * self.valor_terminal[estados]
+            
+            suma_retorno += retorno.reshape(self.n_acciones, m).sum(axis=1)
+            suma_hipo += hipo.reshape(self.n_acciones, m).sum(axis=1)
+            n_rollouts += m
+            
+            transcurrido_ms = (time.perf_counter() - inicio) * 1000
+            if n_rollouts >= self.max_rollouts or transcurrido_ms >= self.presupuesto_ms:
+                break
+        
+        retorno_esperado = suma_retorno / n_rollouts
+        riesgo_hipo = suma_hipo / n_rollouts
+        
+        if self.criterio == "hipoglucemia":
+            accion = int(np.lexsort((-retorno_esperado, riesgo_hipo))[0])
+        else:
+            accion = int(np.argmax(retorno_esperado))
+        
+        return accion, {
+            'retorno_esperado': retorno_esperado,
+            'riesgo_hipoglucemia': riesgo_hipo,
+            'rollouts_por_dosis': n_rollouts,
+            'tiempo_ms': transcurrido_ms
+        }
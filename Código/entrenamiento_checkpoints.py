@@ -1,21 +1,33 @@
 import numpy as np
-import pandas as pd
-import matplotlib.pyplot as plt
 from tqdm import tqdm
 import pickle
 import os
+import sys
 import json
+import time
 from datetime import datetime
-from simulador_diabetes_rl import SimuladorDiabetesRL
+from simulador_diabetes_rl import SimuladorDiabetesRL, generador_derivado
 from agente_q_learning import AgenteQLearning
+from instrumentacion import Cronometro
+from registro_trayectorias import RegistroTrayectorias
+from evaluacion_panel import huella_politica, puntuacion_compuesta
+import perfilado
+import graficos
 
 class EntrenadorInteligente:
-    def __init__(self, db_path="db_diabetes_50k.csv"):
+    def __init__(self, db_path="db_diabetes_50k.csv", semilla=None):
         self.db_path = db_path
         self.df_pacientes = None
         
+        # Semilla opcional (entrenamiento y muestras de evaluación reproducibles). El agente
+        # y cada simulador usan su propio generador derivado de ella (generador_derivado):
+        #   (0,)                          agente
+        #   (1, posición)                 paciente de entrenamiento
+        #   (2, checkpoint, posición)     paciente de la evaluación de un checkpoint
+        self.semilla = semilla
+        
         # USAR DIRECTAMENTE EL AGENTE IMPLEMENTADO
-        self.agente = AgenteQLearning(n_estados=240, n_acciones=4)
+        self.agente = AgenteQLearning(n_estados=240, n_acciones=4, rng=generador_derivado(semilla, 0))
         
         # Configuración de checkpoints
         self.checkpoint_interval = 500
@@ -23,15 +35,41 @@ class EntrenadorInteligente:
         self.mejor_agente = None
         self.mejor_puntuacion = -float('inf')
         self.mejor_checkpoint_numero = 0
+        self.mejor_huella = None
+        self.mejor_resultados = None
+        
+        # Evaluación escalonada de checkpoints: pacientes de las etapas previas a la
+        # evaluación completa (None = evaluar siempre con el panel completo)
+        self.etapas_evaluacion = (25, 50, 100)
+        
+        # Evaluaciones ya hechas por política greedy (huella del argmax -> (checkpoint, resultados)):
+        # si la política no cambió entre checkpoints no se vuelve a simular. Solo se
+        # guardan evaluaciones completas: una descartada en una etapa temprana depende del
+        # mejor agente de ese momento y con pocos pacientes es demasiado ruidosa
+        self.reutilizar_evaluaciones = True
+        self.cache_evaluaciones = {}
         
         # Hiperparámetros ajustables
         self.episodios_por_paciente = 3
         self.nombre_modelo_base = "best_model"
+        
+        # Presupuesto y parada anticipada (None = desactivado)
+        self.presupuesto_segundos = None   # tiempo de pared máximo del entrenamiento
+        self.presupuesto_pasos = None      # pasos de simulación máximos
+        self.paciencia_politica = None     # checkpoints seguidos sin cambios en la acción greedy
+        self.umbral_delta_q = None         # parar si max |ΔQ| entre checkpoints es menor
+        self.paciencia_puntuacion = None   # checkpoints seguidos sin mejorar la puntuación
+        self.motivo_parada = None
+        
+        # Registro de cada paso simulado (RegistroTrayectorias; None = desactivado)
+        self.registro_trayectorias = None
     
     def cargar_y_validar(self):
 
         print("\nCARGANDO Y VALIDANDO BASE DE DATOS...")
         
+        import pandas as pd
+        
         try:
             self.df_pacientes = pd.read_csv(self.db_path)
             
@@ -57,7 +95,7 @@ class EntrenadorInteligente:
             print(f"   Error: {e}")
             return False
     
-    def crear_simulador_personalizado(self, paciente_data):
+    def crear_simulador_personalizado(self, paciente_data, rng=None):
 
         factor_sens = paciente_data.get('factor_sensibilidad', 50)
         if factor_sens < 40:
@@ -69,7 +107,8 @@ class EntrenadorInteligente:
         
         simulador = SimuladorDiabetesRL(
             paciente_id=paciente_data.get('id', 1),
-            tipo_sensibilidad=sensibilidad
+            tipo_sensibilidad=sensibilidad,
+            rng=rng
         )
         
         # Ajustar parámetros según paciente
@@ -86,10 +125,32 @@ class EntrenadorInteligente:
     def evaluar_checkpoint(self, n_pacientes=100):
         print(f"\n   CHECKPOINT: Evaluando con {n_pacientes} pacientes...")
         
-        if n_pacientes > len(self.df_pacientes):
-            n_pacientes = len(self.df_pacientes)
+        pacientes_eval = self._muestra_evaluacion(n_pacientes)
+        
+        metricas = {
+            'tiempo_en_rango': [],
+            'hipoglucemias': [],
+            'hiperglucemias': [],
+            'recompensas': [],
+            'glucosa_promedio': []
+        }
+        self._evaluar_pacientes(pacientes_eval, metricas)
         
-        pacientes_eval = self.df_pacientes.sample(n=n_pacientes, random_state=int(datetime.now().timestamp()))
+        return self._resumir_evaluacion(metricas)
+    
+    def evaluar_checkpoint_escalonado(self, n_pacientes=200):
+        """
+        Evaluación por etapas (successive halving) de la Q-table actual
+        
+        Se evalúa primero con pocos pacientes y se amplía el panel (etapas_evaluacion y
+        finalmente n_pacientes, reutilizando los pacientes ya simulados) solo mientras el
+        intervalo de confianza de la puntuación se superponga con el del mejor agente.
+        Un candidato descartado queda con evaluacion_completa=False y no puede
+        reemplazar a mejor_agente.
+        """
+        pacientes_eval = self._muestra_evaluacion(n_pacientes)
+        n_pacientes = len(pacientes_eval)
+        etapas = [etapa for etapa in self.etapas_evaluacion if etapa < n_pacientes] + [n_pacientes]
         
         metricas = {
             'tiempo_en_rango': [],
@@ -98,9 +159,46 @@ class EntrenadorInteligente:
             'recompensas': [],
             'glucosa_promedio': []
         }
+        evaluados = 0
+        for etapa in etapas:
+            print(f"\n   CHECKPOINT: Evaluando con {etapa} pacientes...")
+            self._evaluar_pacientes(pacientes_eval.iloc[evaluados:etapa], metricas, inicio=evaluados)
+            evaluados = etapa
+            resultados = self._resumir_evaluacion(metricas)
+            
+            # Descartar si todo su intervalo queda por debajo del intervalo del mejor
+            if (etapa < n_pacientes and self.mejor_resultados is not None and
+                    resultados['puntuacion_ic_sup'] < self.mejor_resultados['puntuacion_ic_inf']):
+                print(f"   Descartado en la etapa de {etapa} pacientes "
+                      f"(IC {resultados['puntuacion_ic_inf']:.1f}-{resultados['puntuacion_ic_sup']:.1f} < "
+                      f"mejor {self.mejor_resultados['puntuacion_ic_inf']:.1f}-"
+                      f"{self.mejor_resultados['puntuacion_ic_sup']:.1f})")
+                break
+        
+        resultados['etapas'] = etapas[:etapas.index(evaluados) + 1]
+        resultados['evaluacion_completa'] = evaluados == n_pacientes
+        
+        return resultados
+    
+    def _muestra_evaluacion(self, n_pacientes):
+        if n_pacientes > len(self.df_pacientes):
+            n_pacientes = len(self.df_pacientes)
         
-        for _, paciente in pacientes_eval.iterrows():
-            simulador = self.crear_simulador_personalizado(paciente.to_dict())
+        if self.semilla is None:
+            random_state = int(datetime.now().timestamp())
+        else:
+            random_state = self.semilla + len(self.historial_checkpoints)
+        return self.df_pacientes.sample(n=n_pacientes, random_state=random_state)
+    
+    def _evaluar_pacientes(self, pacientes_eval, metricas, inicio=0):
+        """
+        Simula un día por paciente con la política greedy y agrega sus métricas a las listas
+        (inicio: posición del primer paciente en la muestra, que fija su generador)
+        """
+        checkpoint = len(self.historial_checkpoints)
+        for posicion, (_, paciente) in enumerate(pacientes_eval.iterrows(), start=inicio):
+            rng = generador_derivado(self.semilla, 2, checkpoint, posicion)
+            simulador = self.crear_simulador_personalizado(paciente.to_dict(), rng=rng)
             
             estado = simulador.reset()
             estado_idx = self.agente.estado_a_indice(estado, simulador)
@@ -130,6 +228,9 @@ class EntrenadorInteligente:
             metricas['hiperglucemias'].append(hiperglucemias)
             metricas['recompensas'].append(recompensa_total)
             metricas['glucosa_promedio'].append(np.mean(glucosas_array))
+    
+    def _resumir_evaluacion(self, metricas):
+        n_pacientes = len(metricas['tiempo_en_rango'])
         
         # Calcular resultados
         resultados = {
@@ -151,8 +252,22 @@ class EntrenadorInteligente:
         
         resultados['puntuacion_compuesta'] = puntuacion
         
+        # Intervalo de confianza (95%) a partir de la puntuación de cada paciente
+        puntuaciones = puntuacion_compuesta(np.array(metricas['tiempo_en_rango']),
+                                            np.array(metricas['hipoglucemias']),
+                                            np.array(metricas['hiperglucemias']))
+        error = 1.96 * np.std(puntuaciones, ddof=1) / np.sqrt(n_pacientes) if n_pacientes > 1 else 0.0
+        resultados['puntuacion_ic_inf'] = puntuacion - error
+        resultados['puntuacion_ic_sup'] = puntuacion + error
+        
         return resultados
     
+    def _pacientes_en_checkpoint(self, checkpoint_numero):
+        # El último lote puede quedar incompleto (fin de datos o presupuesto agotado)
+        if 0 < checkpoint_numero <= len(self.historial_checkpoints):
+            return self.historial_checkpoints[checkpoint_numero - 1]['pacientes_procesados']
+        return checkpoint_numero * self.checkpoint_interval
+    
     def guardar_mejor_modelo(self, checkpoint_numero):
         if self.mejor_agente is not None:
             try:
@@ -167,7 +282,7 @@ class EntrenadorInteligente:
                     'mejor_checkpoint': checkpoint_numero,
                     'mejor_puntuacion': self.mejor_puntuacion,
                     'fecha_guardado': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                    'pacientes_procesados': checkpoint_numero * self.checkpoint_interval,
+                    'pacientes_procesados': self._pacientes_en_checkpoint(checkpoint_numero),
                     'tipo_entrenamiento': 'checkpoints_personalizados'
                 })
                 
@@ -188,7 +303,21 @@ class EntrenadorInteligente:
         
         return False
     
-    def entrenar_con_checkpoints(self, total_pacientes=None):
+    def entrenar_con_checkpoints(self, total_pacientes=None, instrumentar=False):
+        """
+        Entrena por lotes de pacientes, evaluando y guardando un checkpoint por lote
+        
+        Args:
+            instrumentar: Si True, mide tiempo y llamadas por etapa (simulación, indexado,
+                          selección, actualización, evaluación, pickle, I/O) y agrega
+                          pasos/seg y pacientes/seg de cada checkpoint al log JSONL
+                          Resultados/instrumentacion_entrenamiento.jsonl
+        
+        El entrenamiento termina antes de recorrer todos los pacientes si se agota
+        presupuesto_segundos/presupuesto_pasos (se evalúa el lote parcial como último
+        checkpoint) o si se cumple un criterio de parada anticipada (ver criterio_parada).
+        El motivo queda en self.motivo_parada y en los metadatos del modelo.
+        """
         if total_pacientes is None:
             total_pacientes = len(self.df_pacientes)
         
@@ -206,58 +335,129 @@ class EntrenadorInteligente:
         pacientes_procesados = 0
         checkpoints_completados = 0
         
-        while pacientes_procesados < total_pacientes:
+        # Presupuestos (solo se consulta el reloj si hay presupuesto de tiempo)
+        inicio = time.perf_counter()
+        limite_tiempo = inicio + self.presupuesto_segundos if self.presupuesto_segundos is not None else None
+        pasos_entrenados = 0
+        self.motivo_parada = None
+        self._estado_parada = {'politica': None, 'politica_estable': 0, 'q_table': None,
+                               'delta_q': None, 'sin_mejora': 0}
+        
+        # Funciones del bucle (envueltas con contadores solo si se instrumenta;
+        # desactivada, el bucle ejecuta exactamente las mismas llamadas)
+        crear_simulador = self.crear_simulador_personalizado
+        estado_a_indice = self.agente.estado_a_indice
+        seleccionar_accion = self.agente.seleccionar_accion
+        if self.agente.repeticion_activa:
+            actualizar_q_table = self.agente.actualizar_con_repeticion
+        else:
+            actualizar_q_table = self.agente.actualizar_q_table
+        actualizar_barra = pbar.update
+        evaluar_checkpoint = self.evaluar_checkpoint_escalonado if self.etapas_evaluacion else self.evaluar_checkpoint
+        guardar_mejor_modelo = self.guardar_mejor_modelo
+        guardar_checkpoint_individual = self.guardar_checkpoint_individual
+        registro = self.registro_trayectorias
+        cronometro = None
+        if instrumentar:
+            cronometro = Cronometro()
+            crear_simulador = cronometro.envolver(crear_simulador, 'creacion_simulador')
+            estado_a_indice = cronometro.envolver(estado_a_indice, 'indice_estado')
+            seleccionar_accion = cronometro.envolver(seleccionar_accion, 'seleccion_accion')
+            actualizar_q_table = cronometro.envolver(actualizar_q_table, 'actualizacion_q')
+            actualizar_barra = cronometro.envolver(actualizar_barra, 'io')
+            evaluar_checkpoint = cronometro.envolver(evaluar_checkpoint, 'evaluacion_checkpoint')
+            guardar_mejor_modelo = cronometro.envolver(guardar_mejor_modelo, 'pickle')
+            guardar_checkpoint_individual = cronometro.envolver(guardar_checkpoint_individual, 'pickle')
+            pasos_previos = 0
+        
+        while pacientes_procesados < total_pacientes and self.motivo_parada is None:
             pacientes_en_lote = min(self.checkpoint_interval, total_pacientes - pacientes_procesados)
             
             print(f"\nLOTE {checkpoints_completados + 1}: {pacientes_en_lote} pacientes")
             
             # Entrenar con el lote actual
+            pacientes_lote = 0
             for i in range(pacientes_en_lote):
                 idx = pacientes_procesados + i
                 if idx >= len(self.df_pacientes):
                     break
                 
                 paciente = self.df_pacientes.iloc[idx]
-                simulador = self.crear_simulador_personalizado(paciente.to_dict())
+                paciente_id = paciente.get('id', idx)
+                simulador = crear_simulador(paciente.to_dict(), rng=generador_derivado(self.semilla, 1, idx))
+                reset = simulador.reset
+                step = simulador.step
+                if cronometro is not None:
+                    reset = cronometro.envolver(reset, 'reset')
+                    step = cronometro.envolver(step, 'simulacion')
                 
                 # Entrenar episodios con este paciente
-                for _ in range(self.episodios_por_paciente):
-                    estado = simulador.reset()
-                    estado_idx = self.agente.estado_a_indice(estado, simulador)
+                for episodio in range(self.episodios_por_paciente):
+                    estado = reset()
+                    estado_idx = estado_a_indice(estado, simulador)
                     terminado = False
                     
                     while not terminado:
                         # USAR EL MÉTODO DEL AGENTE para selección de acción
-                        accion = self.agente.seleccionar_accion(
+                        accion = seleccionar_accion(
                             estado_idx, 
                             episodio=pacientes_procesados, 
                             total_episodios=total_pacientes
                         )
                         
                         # Ejecutar acción
-                        nuevo_estado, recompensa, terminado = simulador.step(accion)
-                        nuevo_estado_idx = self.agente.estado_a_indice(nuevo_estado, simulador)
+                        nuevo_estado, recompensa, terminado = step(accion)
+                        nuevo_estado_idx = estado_a_indice(nuevo_estado, simulador)
+                        
+                        # Registrar el paso (con la probabilidad de la acción antes de actualizar la Q-table)
+                        if registro is not None:
+                            registro.agregar(paciente_id, episodio, simulador.pasos - 1, estado_idx, accion,
+                                             recompensa, simulador.glucosa, simulador.insulina_activa,
+                                             self.agente.probabilidad_accion(estado_idx, accion))
                         
                         # USAR EL MÉTODO DEL AGENTE para actualizar Q-table
-                        self.agente.actualizar_q_table(
+                        actualizar_q_table(
                             estado_idx, accion, recompensa, nuevo_estado_idx
                         )
                         
                         # Actualizar estado
                         estado_idx = nuevo_estado_idx
+                    
+                    pasos_entrenados += simulador.pasos
+                
+                actualizar_barra(1)
+                pacientes_lote += 1
                 
-                pbar.update(1)
+                # Presupuestos: se cierra el lote con lo entrenado hasta aquí
+                if limite_tiempo is not None and time.perf_counter() >= limite_tiempo:
+                    self.motivo_parada = 'presupuesto_tiempo'
+                    break
+                if self.presupuesto_pasos is not None and pasos_entrenados >= self.presupuesto_pasos:
+                    self.motivo_parada = 'presupuesto_pasos'
+                    break
             
+            if self.motivo_parada is not None:
+                pacientes_en_lote = pacientes_lote
             pacientes_procesados += pacientes_en_lote
             checkpoints_completados += 1
             
-            # Evaluar checkpoint
-            resultados = self.evaluar_checkpoint(n_pacientes=min(200, len(self.df_pacientes)//10))
+            # Evaluar checkpoint (o reutilizar la evaluación de la misma política greedy)
+            huella = huella_politica(self.agente.q_table)
+            if self.reutilizar_evaluaciones and huella in self.cache_evaluaciones:
+                checkpoint_origen, resultados_cache = self.cache_evaluaciones[huella]
+                resultados = dict(resultados_cache, evaluacion_de_checkpoint=checkpoint_origen)
+                print(f"\n   CHECKPOINT: política greedy sin cambios ({huella}), "
+                      f"se reutiliza la evaluación del checkpoint {checkpoint_origen}")
+            else:
+                resultados = evaluar_checkpoint(n_pacientes=min(200, len(self.df_pacientes)//10))
+                if resultados.get('evaluacion_completa', True):
+                    self.cache_evaluaciones[huella] = (checkpoints_completados, resultados)
             
             # Guardar datos del checkpoint
             checkpoint_data = {
                 'checkpoint_numero': checkpoints_completados,
                 'pacientes_procesados': pacientes_procesados,
+                'politica': huella,
                 'resultados': resultados,
                 'q_table_mean': float(np.mean(self.agente.q_table)),
                 'q_table_std': float(np.std(self.agente.q_table))
@@ -274,33 +474,118 @@ class EntrenadorInteligente:
             print(f"   - Glucosa promedio: {resultados['glucosa_prom']:.1f} mg/dL")
             print(f"   - Puntuación: {resultados['puntuacion_compuesta']:.1f}")
             
-            # Actualizar mejor agente si corresponde
-            if resultados['puntuacion_compuesta'] > self.mejor_puntuacion:
+            # Actualizar mejor agente si corresponde (la misma política greedy que el
+            # mejor actual no cuenta como mejora: la diferencia sería solo ruido; un
+            # candidato descartado en una etapa temprana tampoco puede reemplazarlo)
+            if (resultados['puntuacion_compuesta'] > self.mejor_puntuacion and huella != self.mejor_huella
+                    and resultados.get('evaluacion_completa', True)):
                 self.mejor_puntuacion = resultados['puntuacion_compuesta']
                 self.mejor_agente = self.agente.q_table.copy()
                 self.mejor_checkpoint_numero = checkpoints_completados
+                self.mejor_huella = huella
+                self.mejor_resultados = resultados
                 print(f"   NUEVO MEJOR AGENTE! Puntuación: {self.mejor_puntuacion:.1f}")
                 
                 # Guardar mejor modelo
-                self.guardar_mejor_modelo(checkpoints_completados)
+                guardar_mejor_modelo(checkpoints_completados)
             
             # Guardar checkpoint individual
-            self.guardar_checkpoint_individual(checkpoints_completados, resultados)
+            guardar_checkpoint_individual(checkpoints_completados, resultados)
+            
+            # Criterios de parada anticipada
+            if self.motivo_parada is None:
+                self.motivo_parada = self.criterio_parada(checkpoints_completados)
+                if self.motivo_parada is not None:
+                    print(f"   PARADA ANTICIPADA: {self.motivo_parada}")
             
             # Ajustar hiperparámetros dinámicamente
             self.ajustar_hiperparametros(resultados)
+            
+            # Snapshot de memoria (solo con el perfilado de memoria activo)
+            perfilado.snapshot_memoria(f"checkpoint_{checkpoints_completados:03d}")
+            
+            if cronometro is not None:
+                pasos_totales = cronometro.llamadas('simulacion')
+                reporte_instrumentacion = cronometro.reporte(
+                    unidades={'pasos': pasos_totales - pasos_previos, 'pacientes': pacientes_en_lote},
+                    extra={
+                        'origen': 'entrenar_con_checkpoints',
+                        'checkpoint_numero': checkpoints_completados,
+                        'pacientes_procesados': pacientes_procesados
+                    }
+                )
+                pasos_previos = pasos_totales
+                cronometro.registrar(reporte_instrumentacion)
+                cronometro.imprimir(reporte_instrumentacion)
         
         pbar.close()
         
+        if self.motivo_parada is None:
+            self.motivo_parada = 'pacientes_completados'
+        
+        parada = {
+            'motivo': self.motivo_parada,
+            'checkpoint': checkpoints_completados,
+            'pacientes_procesados': pacientes_procesados,
+            'pasos_entrenados': pasos_entrenados,
+            'tiempo_s': round(time.perf_counter() - inicio, 2),
+            'delta_q_max': self._estado_parada['delta_q'],
+            'checkpoints_politica_estable': self._estado_parada['politica_estable'],
+            'checkpoints_sin_mejora': self._estado_parada['sin_mejora']
+        }
+        self.agente.metadata['parada'] = parada
+        
         print("\nENTRENAMIENTO COMPLETADO")
+        print(f"   Motivo de término: {self.motivo_parada} ({pacientes_procesados:,} pacientes, "
+              f"{pasos_entrenados:,} pasos, {parada['tiempo_s']:.1f} s)")
         
         # Restaurar mejor agente al final
         if self.mejor_agente is not None:
             self.agente.q_table = self.mejor_agente
             print(f"Mejor agente restaurado (checkpoint {self.mejor_checkpoint_numero}, puntuación: {self.mejor_puntuacion:.1f})")
+            
+            # Reescribir el mejor modelo para que sus metadatos incluyan el motivo de término
+            guardar_mejor_modelo(self.mejor_checkpoint_numero)
         
         return self.historial_checkpoints
     
+    def criterio_parada(self, checkpoint_numero):
+        """
+        Revisa los criterios de parada anticipada tras un checkpoint
+        
+        Returns:
+            'politica_estable', 'convergencia_q', 'sin_mejora' o None si debe seguir
+        """
+        estado = self._estado_parada
+        q_table = self.agente.q_table
+        
+        # Acción greedy por estado sin cambios durante K checkpoints
+        politica = np.argmax(q_table, axis=1)
+        if estado['politica'] is not None and np.array_equal(politica, estado['politica']):
+            estado['politica_estable'] += 1
+        else:
+            estado['politica_estable'] = 0
+        estado['politica'] = politica
+        
+        # Mayor cambio absoluto de un valor Q respecto al checkpoint anterior
+        if estado['q_table'] is not None:
+            estado['delta_q'] = float(np.max(np.abs(q_table - estado['q_table'])))
+        estado['q_table'] = q_table.copy()
+        
+        # Checkpoints sin mejorar la mejor puntuación compuesta
+        if self.mejor_checkpoint_numero == checkpoint_numero:
+            estado['sin_mejora'] = 0
+        else:
+            estado['sin_mejora'] += 1
+        
+        if self.paciencia_politica is not None and estado['politica_estable'] >= self.paciencia_politica:
+            return 'politica_estable'
+        if self.umbral_delta_q is not None and estado['delta_q'] is not None and estado['delta_q'] < self.umbral_delta_q:
+            return 'convergencia_q'
+        if self.paciencia_puntuacion is not None and estado['sin_mejora'] >= self.paciencia_puntuacion:
+            return 'sin_mejora'
+        return None
+    
     def ajustar_hiperparametros(self, resultados):
         # Ajustar exploración si hay muchas hipoglucemias
         if resultados['hipoglucemias_prom'] > 3:
@@ -318,7 +603,7 @@ class EntrenadorInteligente:
             
             checkpoint_data = {
                 'checkpoint_numero': checkpoint_numero,
-                'pacientes_procesados': checkpoint_numero * self.checkpoint_interval,
+                'pacientes_procesados': self._pacientes_en_checkpoint(checkpoint_numero),
                 'q_table': self.agente.q_table.copy(),
                 'resultados': resultados,
                 'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
@@ -358,8 +643,9 @@ class EntrenadorInteligente:
         # Guardar resumen
         resumen = {
             'total_pacientes': len(self.df_pacientes),
-            'pacientes_entrenados': len(self.df_pacientes),
+            'pacientes_entrenados': self.historial_checkpoints[-1]['pacientes_procesados'] if self.historial_checkpoints else 0,
             'checkpoints_completados': len(self.historial_checkpoints),
+            'motivo_parada': self.motivo_parada,
             'mejor_puntuacion': self.mejor_puntuacion,
             'mejor_checkpoint': self.mejor_checkpoint_numero,
             'hiperparametros_finales': {
@@ -386,6 +672,7 @@ class EntrenadorInteligente:
             print("No hay datos de checkpoints para visualizar")
             return
         
+        plt = graficos.pyplot()
         fig, axes = plt.subplots(2, 3, figsize=(15, 10))
         fig.suptitle('Progreso del Entrenamiento con Checkpoints', fontsize=14)
         
@@ -458,47 +745,90 @@ class EntrenadorInteligente:
         # Guardar gráfico
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         plt.savefig(f'Resultados/progreso_entrenamiento_{timestamp}.png', dpi=300, bbox_inches='tight')
-        plt.show()
+        graficos.mostrar(plt)
         
         return fig
 
 
-def main():
-    # Corregir la ruta con raw string
-    entrenador = EntrenadorInteligente(db_path=r"Base de datos\db_diabetes_50k.csv")
+def ejecutar_entrenamiento(db_path=os.path.join("Base de datos", "db_diabetes_50k.csv"), total_pacientes=None,
+                           episodios_por_paciente=3, checkpoint_interval=500, pacientes_evaluacion_final=500,
+                           semilla=None, instrumentar=False, visualizar=True, presupuesto_segundos=None,
+                           presupuesto_pasos=None, paciencia_politica=None, umbral_delta_q=None,
+                           paciencia_puntuacion=None, actualizaciones_por_paso=0, barridos_planificacion=0,
+                           capacidad_buffer=100_000, presupuesto_priorizado=0, directorio_trayectorias=None):
+    """
+    Flujo completo de entrenamiento sin interacción (usado por "python cli.py train")
+    
+    Los presupuestos y criterios de parada (None = desactivados) se describen en
+    EntrenadorInteligente.__init__. Con actualizaciones_por_paso, barridos_planificacion o
+    presupuesto_priorizado mayores que 0 se activa la repetición de experiencia / Dyna-Q /
+    barrido priorizado del agente (ver AgenteQLearning.configurar_repeticion). Con
+    directorio_trayectorias se guarda cada paso de entrenamiento (ver registro_trayectorias.py).
+    
+    Returns:
+        dict con el resumen del entrenamiento, o None si no se pudo cargar la base de datos
+    """
+    entrenador = EntrenadorInteligente(db_path=db_path, semilla=semilla)
+    entrenador.episodios_por_paciente = episodios_por_paciente
+    entrenador.checkpoint_interval = checkpoint_interval
+    entrenador.presupuesto_segundos = presupuesto_segundos
+    entrenador.presupuesto_pasos = presupuesto_pasos
+    entrenador.paciencia_politica = paciencia_politica
+    entrenador.umbral_delta_q = umbral_delta_q
+    entrenador.paciencia_puntuacion = paciencia_puntuacion
+    if actualizaciones_por_paso or barridos_planificacion or presupuesto_priorizado:
+        entrenador.agente.configurar_repeticion(capacidad=capacidad_buffer,
+                                                actualizaciones_por_paso=actualizaciones_por_paso,
+                                                barridos_planificacion=barridos_planificacion,
+                                                presupuesto_priorizado=presupuesto_priorizado)
     
     # Cargar y validar base de datos
     if not entrenador.cargar_y_validar():
-        print("No se pudo cargar la base de datos. Verifica que db_diabetes_50k.csv exista.")
-        return
+        print(f"No se pudo cargar la base de datos. Verifica que {db_path} exista.")
+        return None
+    
+    if total_pacientes is None:
+        total_pacientes = len(entrenador.df_pacientes)
+    
+    if directorio_trayectorias is not None:
+        entrenador.registro_trayectorias = RegistroTrayectorias(directorio_trayectorias, origen='entrenamiento')
     
     print("\nCONFIGURACIÓN DEL ENTRENAMIENTO:")
-    print(f"   - Pacientes totales: {len(entrenador.df_pacientes):,}")
+    print(f"   - Pacientes totales: {total_pacientes:,}")
     print(f"   - Checkpoints cada: {entrenador.checkpoint_interval} pacientes")
     print(f"   - Episodios por paciente: {entrenador.episodios_por_paciente}")
     print(f"   - Tasa aprendizaje inicial: α={entrenador.agente.alpha}")
     print(f"   - Exploración inicial: ε={entrenador.agente.epsilon}")
     print(f"   - Factor descuento: γ={entrenador.agente.gamma}")
+    if entrenador.agente.repeticion_activa:
+        print(f"   - Repetición: {actualizaciones_por_paso} actualizaciones por paso, "
+              f"{barridos_planificacion} barridos Dyna-Q por episodio (buffer de {capacidad_buffer:,})")
+        if presupuesto_priorizado:
+            print(f"   - Barrido priorizado: hasta {presupuesto_priorizado} actualizaciones por paso")
+    if directorio_trayectorias is not None:
+        print(f"   - Trayectorias: {directorio_trayectorias}")
     
-    input("\nPresiona Enter para comenzar el entrenamiento...")
+    resumen = {'db_path': db_path, 'total_pacientes': total_pacientes, 'semilla': semilla}
     
     try:
         # Entrenar
         historial = entrenador.entrenar_con_checkpoints(
-            total_pacientes=len(entrenador.df_pacientes)
+            total_pacientes=total_pacientes,
+            instrumentar=instrumentar
         )
         
         # Guardar resultados
         entrenador.guardar_resultados()
         
         # Visualizar progreso
-        entrenador.visualizar_progreso()
+        if visualizar:
+            entrenador.visualizar_progreso()
         
         # Evaluación final
         print("\nEVALUACIÓN FINAL EXHAUSTIVA")
-        resultados_finales = entrenador.evaluar_checkpoint(n_pacientes=500)
+        resultados_finales = entrenador.evaluar_checkpoint(n_pacientes=pacientes_evaluacion_final)
         
-        print(f"\nRESULTADOS FINALES (500 pacientes):")
+        print(f"\nRESULTADOS FINALES ({resultados_finales['pacientes_evaluados']} pacientes):")
         print(f"   Tiempo en rango: {resultados_finales['tiempo_en_rango_prom']:.1f}%")
         print(f"   Hipoglucemias: {resultados_finales['hipoglucemias_prom']:.1f}%")
         print(f"   Hiperglucemias: {resultados_finales['hiperglucemias_prom']:.1f}%")
@@ -512,16 +842,40 @@ def main():
         
         print("\nENTRENAMIENTO COMPLETADO EXITOSAMENTE!")
         
+        resumen.update({
+            'estado': 'completado',
+            'checkpoints': len(historial),
+            'motivo_parada': entrenador.motivo_parada,
+            'parada': entrenador.agente.metadata.get('parada'),
+            'mejor_checkpoint': entrenador.mejor_checkpoint_numero,
+            'mejor_puntuacion': entrenador.mejor_puntuacion,
+            'resultados_finales': resultados_finales
+        })
+    
     except KeyboardInterrupt:
         print("\nEntrenamiento interrumpido por el usuario.")
         print("Guardando resultados parciales...")
         entrenador.guardar_resultados(nombre_archivo="entrenamiento_interrumpido")
-        
-    except Exception as e:
-        print(f"\nError durante el entrenamiento: {e}")
-        import traceback
-        traceback.print_exc()
+        resumen.update({
+            'estado': 'interrumpido',
+            'checkpoints': len(entrenador.historial_checkpoints),
+            'mejor_checkpoint': entrenador.mejor_checkpoint_numero,
+            'mejor_puntuacion': entrenador.mejor_puntuacion
+        })
+    
+    finally:
+        if entrenador.registro_trayectorias is not None:
+            entrenador.registro_trayectorias.cerrar()
+            resumen['trayectorias'] = directorio_trayectorias
+    
+    return resumen
+
+
+def main(argv=None):
+    # Mismo flujo que "python cli.py train" (sin pausas interactivas)
+    from cli import main as cli_main
+    return cli_main(['train'] + list(sys.argv[1:] if argv is None else argv))
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(perfilado.ejecutar(main, 'entrenamiento'))
\ No newline at end of file
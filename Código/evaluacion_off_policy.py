@@ -0,0 +1,264 @@
+import sys
+import time
+import numpy as np
+from registro_trayectorias import leer_episodios
+import perfilado
+
+# Evaluación off-policy: puntuar Q-tables candidatas con trayectorias ya guardadas,
+# sin simular.
+#
+# Las trayectorias de entrenamiento guardan la probabilidad con que la política
+# ε-greedy eligió cada acción (campo 'probabilidad' de registro_trayectorias.py). Con
+# la razón π(a|s) / probabilidad de cada paso se reponderan los episodios registrados
+# para estimar lo que habría obtenido cada política candidata:
+#   is    importancia por trayectoria: peso = producto de las razones del episodio
+#   wis   la misma, normalizada por la suma de los pesos (sesgada, menos varianza)
+#   pdis  importancia por decisión: cada recompensa usa el producto hasta su paso
+#   dr    doblemente robusto: pdis con un modelo tabular de control (estimado con las
+#         mismas trayectorias) que se resta y se suma para reducir la varianza
+# Se estiman la recompensa total por episodio y el tiempo en rango (70-180 mg/dL),
+# con intervalo de confianza normal. Los episodios se procesan por bloques y los
+# estimadores se acumulan como sumas, así que el costo es lineal en el registro.
+
+ESTIMADORES = ('is', 'wis', 'pdis', 'dr')
+METRICAS_OPE = ('recompensas', 'tiempo_en_rango')
+
+
+def probabilidades_politica(q_tables, epsilon=0.0):
+    """π(a|s) de la política ε-greedy de cada Q-table: arreglo (K, n_estados, n_acciones)"""
+    q_tables = np.asarray(q_tables, dtype=float)
+    if q_tables.ndim == 2:
+        q_tables = q_tables[None]
+    k, n_estados, n_acciones = q_tables.shape
+    
+    politica = np.full(q_tables.shape, epsilon / n_acciones)
+    greedy = np.argmax(q_tables, axis=2)
+    politica[np.arange(k)[:, None], np.arange(n_estados)[None, :], greedy] += 1 - epsilon
+    return politica
+
+
+def _recompensas_episodio(episodios, pasos):
+    """Recompensa por paso de cada métrica: arreglo (M, E, pasos)"""
+    glucosa = episodios['glucosa']
+    en_rango = ((glucosa >= 70) & (glucosa <= 180)) * (100.0 / pasos)
+    return np.stack([episodios['recompensa'].astype(float), en_rango])
+
+
+def _modelo_empirico(directorio, pasos, n_estados, n_acciones):
+    """Visitas, recompensa media por métrica y probabilidades de transición por estado-acción"""
+    n_celdas = n_estados * n_acciones
+    visitas = np.zeros(n_celdas)
+    sumas = np.zeros((len(METRICAS_OPE), n_celdas))
+    sucesores = np.zeros(n_celdas * n_estados)
+    
+    for episodios in leer_episodios(directorio, pasos):
+        celdas = episodios['estado'].astype(np.intp) * n_acciones + episodios['accion']
+        visitas += np.bincount(celdas.ravel(), minlength=n_celdas)
+        for m, recompensas in enumerate(_recompensas_episodio(episodios, pasos)):
+            sumas[m] += np.bincount(celdas.ravel(), weights=recompensas.ravel(), minlength=n_celdas)
+        # El último paso de cada episodio es terminal
+        destino = celdas[:, :-1] * n_estados + episodios['estado'][:, 1:]
+        sucesores += np.bincount(destino.ravel(), minlength=n_celdas * n_estados)
+    
+    vistos = visitas > 0
+    recompensa_media = np.zeros_like(sumas)
+    recompensa_media[:, vistos] = sumas[:, vistos] / visitas[vistos]
+    probabilidades = np.zeros((n_celdas, n_estados))
+    probabilidades[vistos] = sucesores.reshape(n_celdas, n_estados)[vistos] / visitas[vistos][:, None]
+    
+    return {
+        'visitas': visitas.reshape(n_estados, n_acciones),
+        'recompensa_media': recompensa_media.reshape(len(METRICAS_OPE), n_estados, n_acciones),
+        'probabilidades': probabilidades.reshape(n_estados, n_acciones, n_estados)
+    }
+
+
+def _valores_modelo(modelo, politica, pasos):
+    """
+    Q y V del modelo para cada política y pasos restantes (inducción hacia atrás)
+    
+    Returns:
+        q (pasos, M, K, n_estados, n_acciones) y v (pasos, M, K, n_estados), indexados
+        por paso del episodio (paso t = pasos - t pasos restantes)
+    """
+    recompensa_media = modelo['recompensa_media'][:, None]        # (M, 1, S, A)
+    probabilidades = modelo['probabilidades']                     # (S, A, S)
+    m, k = recompensa_media.shape[0], politica.shape[0]
+    n_estados, n_acciones = probabilidades.shape[:2]
+    
+    q = np.zeros((pasos, m, k, n_estados, n_acciones))
+    v = np.zeros((pasos, m, k, n_estados))
+    v_siguiente = np.zeros((m, k, n_estados))
+    for t in range(pasos - 1, -1, -1):
+        q[t] = recompensa_media + np.einsum('sap,mkp->mksa', probabilidades, v_siguiente)
+        v[t] = np.sum(politica[None] * q[t], axis=3)
+        v_siguiente = v[t]
+    return q, v
+
+
+def evaluar_off_policy(directorio, q_tables, epsilon_objetivo=0.0, pasos=48, z=1.96):
+    """
+    Estima recompensa y tiempo en rango de cada Q-table con las trayectorias registradas
+    
+    Args:
+        q_tables: Arreglo (K, n_estados, n_acciones) o una Q-table
+        epsilon_objetivo: ε de las políticas candidatas (0 = greedy)
+        pasos: Pasos por episodio (los episodios incompletos se descartan)
+    
+    Returns:
+        dict con 'estimaciones' {métrica: {estimador: {'valor', 'ic_inf', 'ic_sup'} de (K,)}},
+        'muestra_efectiva' (K,), 'episodios', 'registros_descartados' y 'comportamiento'
+        (valor observado de las métricas en las trayectorias)
+    """
+    politica = probabilidades_politica(q_tables, epsilon_objetivo)
+    k, n_estados, n_acciones = politica.shape
+    m = len(METRICAS_OPE)
+    
+    modelo = _modelo_empirico(directorio, pasos, n_estados, n_acciones)
+    q_modelo, v_modelo = _valores_modelo(modelo, politica, pasos)
+    # Tablas planas para indexar con un solo índice por paso: (M*K, H*S*A) y (M*K, H*S)
+    q_modelo = np.moveaxis(q_modelo, 0, 2).reshape(m * k, -1)
+    v_modelo = np.moveaxis(v_modelo, 0, 2).reshape(m * k, -1)
+    politica_plana = politica.reshape(k, -1)
+    paso_estado = np.arange(pasos) * n_estados
+    
+    # Sumas acumuladas por estimador: valores por episodio (x) y su cuadrado
+    suma = {estimador: np.zeros((m, k)) for estimador in ('is', 'pdis', 'dr')}
+    suma_cuadrados = {estimador: np.zeros((m, k)) for estimador in ('is', 'pdis', 'dr')}
+    # WIS (estimador de razón): Σw, Σw², Σw·G, Σw²·G, Σw²·G²
+    pesos = np.zeros(k)
+    pesos_cuadrados = np.zeros(k)
+    wg = np.zeros((m, k))
+    w2g = np.zeros((m, k))
+    w2g2 = np.zeros((m, k))
+    comportamiento = np.zeros(m)
+    descartados = {}
+    n_episodios = 0
+    
+    for episodios in leer_episodios(directorio, pasos, descartados):
+        estados = episodios['estado'].astype(np.intp)
+        celdas = estados * n_acciones + episodios['accion']                     # (E, H)
+        recompensas = _recompensas_episodio(episodios, pasos)                    # (M, E, H)
+        retorno = recompensas.sum(axis=2)                                        # (M, E)
+        forma = (m, k) + celdas.shape
+        
+        # Pesos de importancia acumulados por paso: (K, E, H)
+        razones = politica_plana[:, celdas] / episodios['probabilidad'].astype(float)
+        w = np.cumprod(razones, axis=2)
+        w_previo = np.concatenate([np.ones(w.shape[:2] + (1,)), w[:, :, :-1]], axis=2)
+        w_final = w[:, :, -1]                                                    # (K, E)
+        
+        valores = {
+            'is': w_final[None] * retorno[:, None],
+            'pdis': np.sum(w[None] * recompensas[:, None], axis=3)
+        }
+        # DR por decisión: Σ_t w_t (r_t - Q̂_t(s_t,a_t)) + w_{t-1} V̂_t(s_t)
+        q_visto = q_modelo[:, paso_estado * n_acciones + celdas].reshape(forma)   # (M, K, E, H)
+        v_visto = v_modelo[:, paso_estado + estados].reshape(forma)
+        valores['dr'] = np.sum(w[None] * (recompensas[:, None] - q_visto) + w_previo[None] * v_visto, axis=3)
+        
+        for estimador, valor in valores.items():
+            suma[estimador] += valor.sum(axis=2)
+            suma_cuadrados[estimador] += (valor ** 2).sum(axis=2)
+        
+        pesos += w_final.sum(axis=1)
+        pesos_cuadrados += (w_final ** 2).sum(axis=1)
+        wg += np.einsum('ke,me->mk', w_final, retorno)
+        w2g += np.einsum('ke,me->mk', w_final ** 2, retorno)
+        w2g2 += np.einsum('ke,me->mk', w_final ** 2, retorno ** 2)
+        comportamiento += retorno.sum(axis=1)
+        n_episodios += len(episodios)
+    
+    if n_episodios == 0:
+        return None
+    
+    estimaciones = {metrica: {} for metrica in METRICAS_OPE}
+    for estimador in ('is', 'pdis', 'dr'):
+        media = suma[estimador] / n_episodios
+        varianza = np.maximum(suma_cuadrados[estimador] / n_episodios - media ** 2, 0) * n_episodios / max(n_episodios - 1, 1)
+        error = z * np.sqrt(varianza / n_episodios)
+        for i, metrica in enumerate(METRICAS_OPE):
+            estimaciones[metrica][estimador] = {'valor': media[i], 'ic_inf': media[i] - error[i],
+                                                'ic_sup': media[i] + error[i]}
+    
+    # WIS: varianza del estimador de razón (método delta)
+    con_peso = pesos > 0
+    valor_wis = np.where(con_peso, wg / np.where(con_peso, pesos, 1), np.nan)
+    varianza_wis = (w2g2 - 2 * valor_wis * w2g + valor_wis ** 2 * pesos_cuadrados) / np.where(con_peso, pesos, 1) ** 2
+    error_wis = z * np.sqrt(np.maximum(varianza_wis, 0))
+    for i, metrica in enumerate(METRICAS_OPE):
+        estimaciones[metrica]['wis'] = {'valor': valor_wis[i], 'ic_inf': valor_wis[i] - error_wis[i],
+                                        'ic_sup': valor_wis[i] + error_wis[i]}
+    
+    return {
+        'estimaciones': estimaciones,
+        'muestra_efectiva': np.where(pesos_cuadrados > 0, pesos ** 2 / np.where(pesos_cuadrados > 0, pesos_cuadrados, 1), 0.0),
+        'episodios': n_episodios,
+        'registros_descartados': descartados['registros'],
+        'comportamiento': dict(zip(METRICAS_OPE, comportamiento / n_episodios))
+    }
+
+
+def ejecutar_evaluacion_off_policy(directorio, rutas, epsilon_objetivo=0.0, pasos=48):
+    """
+    Evalúa off-policy los modelos de una lista de archivos (.pkl/.npy, ver ranking_checkpoints)
+    
+    Returns:
+        dict con una fila por modelo (estimaciones de cada métrica y estimador) y el resumen
+    """
+    from ranking_checkpoints import cargar_q_tables
+    
+    modelos = cargar_q_tables(rutas)
+    if not modelos:
+        print("No se encontraron modelos para evaluar")
+        return None
+    
+    inicio = time.perf_counter()
+    resultado = evaluar_off_policy(directorio, np.stack([modelo['q_table'] for modelo in modelos]),
+                                   epsilon_objetivo=epsilon_objetivo, pasos=pasos)
+    tiempo = time.perf_counter() - inicio
+    if resultado is None:
+        print(f"No hay episodios completos en {directorio}")
+        return None
+    
+    print(f"\nEVALUACIÓN OFF-POLICY: {len(modelos)} modelos, {resultado['episodios']:,} episodios ({tiempo:.2f} s)")
+    comportamiento = resultado['comportamiento']
+    print(f"   - Política registrada: recompensa {comportamiento['recompensas']:.1f}, "
+          f"TIR {comportamiento['tiempo_en_rango']:.1f}%")
+    if resultado['registros_descartados']:
+        print(f"   - Registros descartados (episodios incompletos): {resultado['registros_descartados']:,}")
+    
+    filas = []
+    for i, modelo in enumerate(modelos):
+        fila = {'modelo': modelo['modelo'], 'archivo': modelo['archivo'],
+                'muestra_efectiva': float(resultado['muestra_efectiva'][i])}
+        for metrica, por_estimador in resultado['estimaciones'].items():
+            for estimador, estimacion in por_estimador.items():
+                for clave, valores in estimacion.items():
+                    fila[f"{metrica}_{estimador}_{clave}"] = float(valores[i])
+        filas.append(fila)
+    
+    print(f"\n   {'modelo':<28} {'ESS':>9} {'TIR dr (IC95)':>22} {'TIR wis':>8} {'recompensa dr':>14}")
+    for fila in filas:
+        print(f"   {fila['modelo']:<28} {fila['muestra_efectiva']:>9.1f} "
+              f"{fila['tiempo_en_rango_dr_valor']:>7.1f}% ({fila['tiempo_en_rango_dr_ic_inf']:.1f}-"
+              f"{fila['tiempo_en_rango_dr_ic_sup']:.1f}) {fila['tiempo_en_rango_wis_valor']:>7.1f}% "
+              f"{fila['recompensas_dr_valor']:>14.1f}")
+    
+    return {
+        'trayectorias': directorio,
+        'episodios': resultado['episodios'],
+        'tiempo_s': tiempo,
+        'comportamiento': comportamiento,
+        'modelos': filas
+    }
+
+
+def main(argv=None):
+    # Mismo flujo que "python cli.py ope"
+    from cli import main as cli_main
+    return cli_main(['ope'] + list(sys.argv[1:] if argv is None else argv))
+
+
+if __name__ == "__main__":
+    sys.exit(perfilado.ejecutar(main, 'evaluacion_off_policy'))
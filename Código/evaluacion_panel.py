@@ -0,0 +1,112 @@
+import hashlib
+import numpy as np
+from simulador_vectorizado import crear_simulador_vectorizado
+
+# Evaluación de varias Q-tables sobre un mismo panel de pacientes.
+#
+# Todas las políticas ven los mismos pacientes, la misma glucosa inicial y el mismo
+# ruido en cada paso (números aleatorios comunes), así que las diferencias entre
+# ellas se deben a la política y no al sorteo. Las métricas son las de
+# evaluar_checkpoint (glucosa después de cada paso de 30 minutos).
+
+METRICAS = ('tiempo_en_rango', 'hipoglucemias', 'hiperglucemias', 'glucosa_promedio', 'recompensas', 'puntuacion')
+
+
+def seleccionar_panel(df_pacientes, n_pacientes, semilla=0):
+    """Muestra fija de pacientes (misma semilla = mismo panel)"""
+    n_pacientes = min(n_pacientes, len(df_pacientes))
+    return df_pacientes.sample(n=n_pacientes, random_state=semilla).reset_index(drop=True)
+
+
+def huella_politica(q_table):
+    """Hash corto de la política greedy (argmax por estado) de una Q-table"""
+    politica = np.argmax(np.asarray(q_table), axis=1).astype(np.int8)
+    return hashlib.sha1(politica.tobytes()).hexdigest()[:16]
+
+
+def puntuacion_compuesta(tiempo_en_rango, hipoglucemias, hiperglucemias):
+    """Misma ponderación que la puntuación de los checkpoints"""
+    return tiempo_en_rango * 0.5 + (100 - hipoglucemias * 10) * 0.3 + (100 - hiperglucemias * 2) * 0.2
+
+
+def evaluar_politicas(q_tables, df_panel, n_episodios=1, semilla=0):
+    """
+    Simula la política greedy de cada Q-table sobre todos los pacientes del panel
+    
+    Args:
+        q_tables: Arreglo (K, n_estados, n_acciones) o lista de K Q-tables
+        df_panel: DataFrame de pacientes (ver seleccionar_panel)
+        n_episodios: Días simulados por paciente (se promedian)
+        semilla: Semilla de la glucosa inicial y del ruido (compartidos por las K políticas)
+    
+    Returns:
+        dict métrica -> arreglo (K, n_pacientes) con el valor por política y paciente
+    """
+    politicas = np.argmax(np.asarray(q_tables), axis=2)
+    k = len(politicas)
+    n = len(df_panel)
+    rng = np.random.default_rng(semilla)
+    
+    # Filas ordenadas por paciente: fila = paciente * K + política
+    simulador = crear_simulador_vectorizado(df_panel, rng=rng).repetir(k)
+    fila_politica = np.tile(np.arange(k), n)
+    
+    acumulado = {metrica: np.zeros(n * k) for metrica in METRICAS}
+    for _ in range(n_episodios):
+        glucosa_inicial = rng.uniform(80, 160, size=n)
+        tiempo_desde_dosis = rng.integers(120, 300, size=n)
+        estados = simulador.fijar_estado(np.repeat(glucosa_inicial, k), 0, np.repeat(tiempo_desde_dosis, k), 0, 0)
+        
+        en_rango = np.zeros(n * k)
+        hipo = np.zeros(n * k)
+        hiper = np.zeros(n * k)
+        suma_glucosa = np.zeros(n * k)
+        recompensa = np.zeros(n * k)
+        
+        for _ in range(48):
+            acciones = politicas[fila_politica, estados]
+            ruido = np.repeat(rng.normal(0, 5, size=n), k)
+            estados, recompensas, _ = simulador.step(acciones, ruido=ruido)
+            
+            glucosa = simulador.glucosa
+            en_rango += (glucosa >= 70) & (glucosa <= 180)
+            hipo += glucosa < 70
+            hiper += glucosa > 180
+            suma_glucosa += glucosa
+            recompensa += recompensas
+        
+        acumulado['tiempo_en_rango'] += en_rango / 48 * 100
+        acumulado['hipoglucemias'] += hipo / 48 * 100
+        acumulado['hiperglucemias'] += hiper / 48 * 100
+        acumulado['glucosa_promedio'] += suma_glucosa / 48
+        acumulado['recompensas'] += recompensa
+    
+    metricas = {}
+    for metrica in METRICAS[:-1]:
+        metricas[metrica] = (acumulado[metrica] / n_episodios).reshape(n, k).T
+    metricas['puntuacion'] = puntuacion_compuesta(
+        metricas['tiempo_en_rango'], metricas['hipoglucemias'], metricas['hiperglucemias']
+    )
+    
+    return metricas
+
+
+def resumir_metricas(metricas, z=1.96):
+    """
+    Promedio por política e intervalo de confianza de la puntuación compuesta
+    
+    Returns:
+        lista de K dicts con el promedio de cada métrica y puntuacion_ic_inf/puntuacion_ic_sup
+    """
+    puntuacion = metricas['puntuacion']
+    n = puntuacion.shape[1]
+    error = z * puntuacion.std(axis=1, ddof=1) / np.sqrt(n) if n > 1 else np.zeros(len(puntuacion))
+    
+    resumen = []
+    for i in range(len(puntuacion)):
+        fila = {metrica: float(metricas[metrica][i].mean()) for metrica in METRICAS}
+        fila['puntuacion_ic_inf'] = fila['puntuacion'] - float(error[i])
+        fila['puntuacion_ic_sup'] = fila['puntuacion'] + float(error[i])
+        resumen.append(fila)
+    
+    return resumen
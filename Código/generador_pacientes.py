@@ -2,16 +2,22 @@ import pandas as pd
 import numpy as np
 import random
 from datetime import datetime
-import os
+import sys
+import perfilado
 
-def generar_dataset_antropometrico_coherente(nombre_archivo="db_try_50k.csv"):
+def generar_dataset_antropometrico_coherente(nombre_archivo="db_try_50k.csv", total_pacientes=50000, semilla=None):
     
-    # Tamaño del dataset: 50,000 pacientes, todos con diabetes tipo 1
-    TOTAL_PACIENTES = 50000
+    # Semilla opcional para generar siempre el mismo dataset
+    if semilla is not None:
+        random.seed(semilla)
+        np.random.seed(semilla)
+    
+    # Tamaño del dataset: 50,000 pacientes por defecto, todos con diabetes tipo 1
+    TOTAL_PACIENTES = total_pacientes
     
     # Distribución por género en diabetes tipo 1
-    DIABETES_HOMBRES = 25000
-    DIABETES_MUJERES = 25000
+    DIABETES_HOMBRES = TOTAL_PACIENTES // 2
+    DIABETES_MUJERES = TOTAL_PACIENTES - DIABETES_HOMBRES
     
     # Límite de desviaciones estándar para valores antropométricos: ±2 desviaciones (95% de la población)
     # Esto evita valores extremos no realistas
@@ -573,7 +579,7 @@ def generar_dataset_antropometrico_coherente(nombre_archivo="db_try_50k.csv"):
     datos_totales = []
     contador_id = 1
     
-    print(f"Generando dataset de 50,000 registros (todos con diabetes tipo 1)...")
+    print(f"Generando dataset de {TOTAL_PACIENTES:,} registros (todos con diabetes tipo 1)...")
     
     # 1. HOMBRES CON DIABETES TIPO 1 (22,000 pacientes)
     print(f"Generando {DIABETES_HOMBRES} hombres con diabetes...")
@@ -694,16 +700,10 @@ def validar_dataset(df):
     
     return df
 
-if __name__ == "__main__":
-    try:
-        print("GENERADOR DE DATASET DE DIABETES TIPO 1 - 50,000 REGISTROS")
+def main(argv=None):
+    # Mismo flujo que "python cli.py generate"
+    from cli import main as cli_main
+    return cli_main(['generate'] + list(sys.argv[1:] if argv is None else argv))
 
-        # Generar dataset principal
-        os.makedirs("Base de datos", exist_ok=True)
-        df_50k = generar_dataset_antropometrico_coherente("Base de datos/db_diabetes_50k.csv")
-        validar_dataset(df_50k)
-        
-    except Exception as e:
-        print(f"Error durante la generación del dataset: {e}")
-        import traceback
-        traceback.print_exc()
\ No newline at end of file
+if __name__ == "__main__":
+    sys.exit(perfilado.ejecutar(main, 'generador_pacientes'))
\ No newline at end of file
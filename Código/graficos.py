@@ -0,0 +1,40 @@
+import os
+import sys
+
+# Importación diferida de matplotlib para los módulos que grafican.
+#
+# matplotlib (y seaborn) tardan cientos de ms en importarse, así que solo se cargan
+# cuando una función realmente dibuja. En modo headless (HEADLESS=1, o Linux sin
+# pantalla) se usa el backend no interactivo Agg y plt.show() no bloquea.
+
+
+def modo_headless():
+    """True si no hay pantalla disponible o se pidió explícitamente con HEADLESS=1"""
+    valor = os.environ.get('HEADLESS', '').strip().lower()
+    if valor in ('1', 'true', 'si', 'sí', 'yes'):
+        return True
+    if valor in ('0', 'false', 'no'):
+        return False
+    if os.environ.get('MPLBACKEND'):
+        return False  # el usuario ya eligió backend
+    if sys.platform.startswith('win') or sys.platform == 'darwin':
+        return False
+    return not (os.environ.get('DISPLAY') or os.environ.get('WAYLAND_DISPLAY'))
+
+
+def pyplot():
+    """Retorna matplotlib.pyplot, configurando el backend Agg si corre en modo headless"""
+    if 'matplotlib.pyplot' not in sys.modules and modo_headless():
+        import matplotlib
+        matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def mostrar(plt):
+    """plt.show() si hay pantalla; en modo headless solo libera las figuras (ya guardadas)"""
+    import matplotlib
+    if modo_headless() or matplotlib.get_backend().lower() == 'agg':
+        plt.close('all')
+    else:
+        plt.show()
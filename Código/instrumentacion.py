@@ -0,0 +1,128 @@
+import time
+import os
+from datetime import datetime
+
+RUTA_LOG_DEFECTO = 'Resultados/instrumentacion_entrenamiento.jsonl'
+
+class Cronometro:
+    """
+    Acumula tiempo de pared y número de llamadas por etapa del entrenamiento
+    
+    Se usa envolviendo las funciones del bucle (envolver) o bloques gruesos (bloque).
+    Los bucles solo envuelven sus funciones cuando la instrumentación está activa,
+    así que desactivada no agrega ningún costo.
+    """
+    
+    def __init__(self, ruta_log=RUTA_LOG_DEFECTO):
+        self.ruta_log = ruta_log
+        self.etapas = {}  # etapa -> [tiempo_acumulado, llamadas]
+        self.inicio = time.perf_counter()
+        self._ultimo_reporte = {'tiempo': self.inicio, 'etapas': {}}
+    
+    def _acumulador(self, etapa):
+        if etapa not in self.etapas:
+            self.etapas[etapa] = [0.0, 0]
+        return self.etapas[etapa]
+    
+    def envolver(self, funcion, etapa):
+        """Retorna la función envuelta con un contador de tiempo para la etapa"""
+        acumulador = self._acumulador(etapa)
+        reloj = time.perf_counter
+        
+        def envuelta(*args, **kwargs):
+            inicio = reloj()
+            resultado = funcion(*args, **kwargs)
+            acumulador[0] += reloj() - inicio
+            acumulador[1] += 1
+            return resultado
+        
+        return envuelta
+    
+    def bloque(self, etapa):
+        """Context manager para medir un bloque de código como una llamada de la etapa"""
+        return _Bloque(self._acumulador(etapa))
+    
+    def llamadas(self, etapa):
+        return self.etapas.get(etapa, [0.0, 0])[1]
+    
+    def reporte(self, unidades=None, extra=None):
+        """
+        Resumen del intervalo desde el último reporte (y acumulado total)
+        
+        Args:
+            unidades: dict nombre -> cantidad procesada en el intervalo
+                      (p. ej. {'pasos': 72000, 'pacientes': 500}); se reporta cada una por segundo
+            extra: dict con datos adicionales para el registro
+        """
+        ahora = time.perf_counter()
+        tiempo_intervalo = ahora - self._ultimo_reporte['tiempo']
+        anteriores = self._ultimo_reporte['etapas']
+        
+        etapas = {}
+        for etapa, (tiempo, llamadas) in self.etapas.items():
+            tiempo_prev, llamadas_prev = anteriores.get(etapa, (0.0, 0))
+            etapas[etapa] = {
+                'tiempo_s': tiempo - tiempo_prev,
+                'llamadas': llamadas - llamadas_prev,
+                'porcentaje': (tiempo - tiempo_prev) / tiempo_intervalo * 100 if tiempo_intervalo > 0 else 0.0
+            }
+        
+        tiempo_medido = sum(e['tiempo_s'] for e in etapas.values())
+        registro = {
+            'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'tiempo_intervalo_s': tiempo_intervalo,
+            'tiempo_total_s': ahora - self.inicio,
+            'tiempo_sin_medir_s': max(0.0, tiempo_intervalo - tiempo_medido),
+            'etapas': etapas
+        }
+        
+        for nombre, cantidad in (unidades or {}).items():
+            registro[nombre] = cantidad
+            registro[f'{nombre}_por_seg'] = cantidad / tiempo_intervalo if tiempo_intervalo > 0 else 0.0
+        
+        if extra:
+            registro.update(extra)
+        
+        self._ultimo_reporte = {
+            'tiempo': ahora,
+            'etapas': {etapa: tuple(valores) for etapa, valores in self.etapas.items()}
+        }
+        
+        return registro
+    
+    def registrar(self, registro):
+        """Agrega un registro al log JSONL"""
+        import json
+        
+        directorio = os.path.dirname(self.ruta_log)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        with open(self.ruta_log, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(registro, default=float) + '\n')
+    
+    def imprimir(self, registro):
+        """Muestra el desglose por etapa de un registro"""
+        print(f"   INSTRUMENTACIÓN ({registro['tiempo_intervalo_s']:.2f} s):")
+        for nombre in ('pasos', 'pacientes', 'episodios'):
+            if f'{nombre}_por_seg' in registro:
+                print(f"      {nombre}/seg: {registro[f'{nombre}_por_seg']:,.1f}")
+        etapas = sorted(registro['etapas'].items(), key=lambda x: x[1]['tiempo_s'], reverse=True)
+        for etapa, datos in etapas:
+            print(f"      {etapa:<22} {datos['tiempo_s']:8.3f} s  {datos['porcentaje']:5.1f}%  "
+                  f"({datos['llamadas']:,} llamadas)")
+        print(f"      {'sin medir':<22} {registro['tiempo_sin_medir_s']:8.3f} s")
+
+
+class _Bloque:
+    
+    def __init__(self, acumulador):
+        self.acumulador = acumulador
+    
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+    
+    def __exit__(self, *exc):
+        self.acumulador[0] += time.perf_counter() - self.inicio
+        self.acumulador[1] += 1
+        return False
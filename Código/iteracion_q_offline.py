@@ -0,0 +1,187 @@
+import os
+import sys
+import time
+import numpy as np
+from registro_trayectorias import abrir_trayectorias
+import perfilado
+
+# Iteración Q ajustada (fitted-Q) sobre trayectorias guardadas, sin simular.
+#
+# Se recorren una sola vez los bloques de registro_trayectorias.py (np.memmap, bloque
+# a bloque) y se reconstruyen las transiciones (s, a, r, s'): el sucesor de un registro
+# es el paso siguiente del mismo paciente y episodio. Como la Q-table es tabular, las
+# transiciones se resumen con bincount en estadísticos suficientes por estado-acción
+# (visitas, suma de recompensas y conteos de sucesores); cada iteración
+#   Q(s,a) = r̄(s,a) + γ Σ P(s'|s,a) max Q(s')
+# usa solo esos arreglos, así que el costo por iteración no depende de cuántos pasos
+# haya en el registro. El último paso de cada episodio no tiene sucesor y se trata
+# como terminal.
+
+
+def estadisticas_transiciones(directorio, n_estados=240, n_acciones=4):
+    """
+    Estadísticos suficientes de las transiciones registradas en un directorio
+    
+    Un episodio que quedó repartido entre dos bloques seguidos se une: los registros
+    sin sucesor en su bloque se reintentan una vez con el bloque siguiente.
+    
+    Returns:
+        dict con 'visitas' y 'recompensas' (n_estados, n_acciones), 'sucesores'
+        (n_estados, n_acciones, n_estados), 'terminales', 'registros' y 'bloques'
+    """
+    n_celdas = n_estados * n_acciones
+    visitas = np.zeros(n_celdas)
+    recompensas = np.zeros(n_celdas)
+    sucesores = np.zeros(n_celdas * n_estados)
+    terminales = 0
+    registros = 0
+    
+    bloques = abrir_trayectorias(directorio)
+    pendientes = None
+    for bloque in bloques + [None]:
+        if bloque is None:
+            if pendientes is None or len(pendientes) == 0:
+                break
+            datos = pendientes
+            arrastrado = np.ones(len(datos), dtype=bool)
+        else:
+            datos = np.asarray(bloque)
+            registros += len(datos)
+            arrastrado = np.zeros(len(datos), dtype=bool)
+            if pendientes is not None and len(pendientes):
+                datos = np.concatenate([pendientes, datos])
+                arrastrado = np.concatenate([np.ones(len(pendientes), dtype=bool), arrastrado])
+        
+        orden = np.lexsort((datos['paso'], datos['episodio'], datos['paciente']))
+        datos = datos[orden]
+        arrastrado = arrastrado[orden]
+        
+        # Sucesor = registro siguiente del mismo paciente y episodio, con paso + 1
+        continua = ((datos['paciente'][1:] == datos['paciente'][:-1])
+                    & (datos['episodio'][1:] == datos['episodio'][:-1])
+                    & (datos['paso'][1:] == datos['paso'][:-1] + 1))
+        tiene_sucesor = np.append(continua, False)
+        # Sin sucesor: se reintenta con el bloque siguiente, salvo que ya venga arrastrado
+        pendiente = ~tiene_sucesor & ~arrastrado & (bloque is not None)
+        usar = ~pendiente
+        
+        celdas = datos['estado'].astype(np.intp) * n_acciones + datos['accion']
+        visitas += np.bincount(celdas[usar], minlength=n_celdas)
+        recompensas += np.bincount(celdas[usar], weights=datos['recompensa'][usar].astype(float), minlength=n_celdas)
+        nuevos_estados = datos['estado'][1:][continua].astype(np.intp)
+        sucesores += np.bincount(celdas[:-1][continua] * n_estados + nuevos_estados, minlength=n_celdas * n_estados)
+        terminales += int(np.sum(usar & ~tiene_sucesor))
+        
+        pendientes = datos[pendiente]
+    
+    return {
+        'visitas': visitas.reshape(n_estados, n_acciones),
+        'recompensas': recompensas.reshape(n_estados, n_acciones),
+        'sucesores': sucesores.reshape(n_estados, n_acciones, n_estados),
+        'terminales': terminales,
+        'registros': registros,
+        'bloques': len(bloques)
+    }
+
+
+def iteracion_q(estadisticas, gamma=0.95, q_inicial=None, tolerancia=1e-4, max_iteraciones=2000):
+    """
+    Iteración Q con el modelo empírico hasta que el mayor |ΔQ| baje de la tolerancia
+    
+    Los estado-acción que no aparecen en el registro conservan el valor de q_inicial
+    (ceros si no se indica), así se puede refinar una Q-table ya entrenada.
+    
+    Returns:
+        (q_table, dict con iteraciones, delta_final y cobertura)
+    """
+    visitas = estadisticas['visitas']
+    n_estados, n_acciones = visitas.shape
+    q = np.zeros((n_estados, n_acciones)) if q_inicial is None else np.array(q_inicial, dtype=float)
+    
+    vistos = visitas > 0
+    recompensa_media = estadisticas['recompensas'][vistos] / visitas[vistos]
+    probabilidades = estadisticas['sucesores'][vistos] / visitas[vistos][:, None]
+    
+    delta = np.inf
+    iteraciones = 0
+    while iteraciones < max_iteraciones and delta > tolerancia:
+        objetivo = recompensa_media + gamma * probabilidades @ q.max(axis=1)
+        delta = float(np.max(np.abs(objetivo - q[vistos]))) if vistos.any() else 0.0
+        q[vistos] = objetivo
+        iteraciones += 1
+    
+    return q, {'iteraciones': iteraciones, 'delta_final': delta, 'cobertura': float(vistos.mean())}
+
+
+def ejecutar_iteracion_offline(directorio, salida='Resultados/offline/modelo_offline', modelo_base=None,
+                               gamma=0.95, tolerancia=1e-4, max_iteraciones=2000):
+    """
+    Ajusta una Q-table con las trayectorias de un directorio y la guarda como AgenteQLearning
+    
+    Args:
+        salida: Nombre base de los archivos (.pkl/.npy/... de guardar_modelo_completo)
+        modelo_base: .pkl/.npy con la Q-table inicial (ver ranking_checkpoints.cargar_q_tables)
+    
+    Returns:
+        dict con el resumen y los archivos generados, o None si no hay trayectorias
+    """
+    from agente_q_learning import AgenteQLearning
+    
+    inicio = time.perf_counter()
+    estadisticas = estadisticas_transiciones(directorio)
+    if estadisticas['registros'] == 0:
+        print(f"No hay trayectorias en {directorio}")
+        return None
+    tiempo_lectura = time.perf_counter() - inicio
+    
+    q_inicial = None
+    if modelo_base is not None:
+        from ranking_checkpoints import cargar_q_tables
+        q_inicial = cargar_q_tables([modelo_base])[0]['q_table']
+    
+    inicio = time.perf_counter()
+    q_table, info = iteracion_q(estadisticas, gamma=gamma, q_inicial=q_inicial, tolerancia=tolerancia,
+                                max_iteraciones=max_iteraciones)
+    tiempo_iteracion = time.perf_counter() - inicio
+    
+    print(f"\nITERACIÓN Q OFFLINE: {directorio}")
+    print(f"   - Registros: {estadisticas['registros']:,} en {estadisticas['bloques']} bloques "
+          f"({tiempo_lectura:.2f} s, {estadisticas['registros'] / max(tiempo_lectura, 1e-9):,.0f} registros/s)")
+    print(f"   - Estado-acción cubiertos: {info['cobertura'] * 100:.1f}%")
+    print(f"   - Iteraciones: {info['iteraciones']} (max |ΔQ| = {info['delta_final']:.2e}, {tiempo_iteracion:.2f} s)")
+    
+    agente = AgenteQLearning(n_estados=q_table.shape[0], n_acciones=q_table.shape[1])
+    agente.gamma = gamma
+    agente.q_table = q_table
+    agente.metadata.update({
+        'tipo_entrenamiento': 'iteracion_q_offline',
+        'trayectorias': directorio,
+        'registros': estadisticas['registros'],
+        'modelo_base': modelo_base,
+        **info
+    })
+    
+    directorio_salida = os.path.dirname(salida)
+    if directorio_salida:
+        os.makedirs(directorio_salida, exist_ok=True)
+    archivos = agente.guardar_modelo_completo(salida, usar_timestamp=False)
+    print(f"   - Modelo: {archivos['pkl']}")
+    
+    return {
+        'trayectorias': directorio,
+        'registros': estadisticas['registros'],
+        'tiempo_lectura_s': tiempo_lectura,
+        'tiempo_iteracion_s': tiempo_iteracion,
+        **info,
+        'archivos': archivos
+    }
+
+
+def main(argv=None):
+    # Mismo flujo que "python cli.py fit"
+    from cli import main as cli_main
+    return cli_main(['fit'] + list(sys.argv[1:] if argv is None else argv))
+
+
+if __name__ == "__main__":
+    sys.exit(perfilado.ejecutar(main, 'iteracion_q_offline'))
@@ -0,0 +1,355 @@
+import os
+import numpy as np
+from simulador_vectorizado import crear_simulador_vectorizado
+from evaluacion_panel import puntuacion_compuesta
+
+# Evaluación analítica de políticas con un modelo de transiciones tabulado.
+#
+# Con simulación masiva se estima, por sensibilidad, la probabilidad de pasar de cada
+# estado a otro con cada acción, junto con la recompensa y la fracción en rango / hipo /
+# hiper esperadas. La política greedy de cualquier Q-table se evalúa propagando la
+# distribución de estados durante los 48 pasos del día, sin episodios Monte Carlo (y
+# por lo tanto sin ruido de muestreo).
+#
+# El estado del modelo es más fino que el de la Q-table: con las 240 categorías la
+# glucosa e insulina "escondidas" dentro de cada categoría dependen de la política, y
+# el modelo queda muy sesgado. Aquí se usa:
+#   - glucosa en tramos de ancho_glucosa mg/dL,
+#   - insulina activa en BORDES_INSULINA (incluye los bordes de redondeo de la Q-table),
+#   - pasos de 30 minutos desde la última dosis (hasta 9).
+# La hora del día solo influye a través de las comidas, cuya progresión en los pasos de
+# 30 minutos toma 3 valores; las transiciones se estiman por esos 3 regímenes.
+#
+# Sigue siendo una aproximación (los parámetros de los pacientes se promedian dentro
+# de su sensibilidad): sirve para ordenar muchas políticas sin ruido; la confirmación
+# final se hace simulando.
+
+RUTA_CACHE_DEFECTO = os.path.join('Resultados', 'modelo_transiciones.npz')
+
+N_SENSIBILIDADES = 3
+N_ACCIONES = 4
+N_PASOS = 48
+N_INSULINA = 5  # categorías de insulina activa de la Q-table
+BORDES_INSULINA = np.array([0.25, 1.25, 2.5, 3.75, 5, 6.25, 7.5, 10, 12.5, 15, 17.5, 22.5, 30])
+# Pasos desde la dosis (ceil(minutos / 30), máximo 9) -> categoría de la Q-table (<=60, <=120, <=240, más)
+TIEMPO_CATEGORIA = np.array([0, 0, 0, 1, 1, 2, 2, 2, 2, 3])
+# Probabilidades de acción de cada episodio de la simulación masiva (Dirichlet): la
+# mayoría de los episodios dosifica poco, como las políticas entrenadas, y así se
+# cubren los estados que esas políticas visitan
+CONCENTRACION_ACCIONES = np.array([2.0, 0.2, 0.2, 0.2])
+# Probabilidad por debajo de la cual un estado deja de propagarse (cambia los resultados
+# en menos de 0.01 puntos y reduce a la mitad el tiempo)
+MASA_MINIMA = 1e-6
+TABLAS = ('recompensa', 'en_rango', 'hipo', 'hiper', 'glucosa')
+
+
+class ModeloTransiciones:
+    """
+    Transiciones por sensibilidad y régimen de comida entre estados finos
+    (tramo de glucosa, tramo de insulina activa, pasos desde la dosis), con las
+    métricas esperadas de cada (estado, acción)
+    """
+    
+    def __init__(self, sucesores, probabilidades, tablas, distribucion_inicial, pesos_sensibilidad,
+                 visitas, regimen_paso, ancho_glucosa, info=None):
+        """
+        Args:
+            sucesores: (3, R, n_finos, 4, max_sucesores) estados destino
+            probabilidades: (3, R, n_finos, 4, max_sucesores) probabilidad de cada destino
+            tablas: dict nombre -> (3, R, n_finos, 4) valor esperado después del paso
+            distribucion_inicial: (3, n_finos) distribución del estado inicial por sensibilidad
+            pesos_sensibilidad: (3,) fracción de pacientes de cada sensibilidad
+            visitas: (3, R, n_finos, 4) transiciones observadas por celda
+            regimen_paso: (48,) régimen de comida de cada paso del día
+        """
+        self.sucesores = sucesores
+        self.probabilidades = probabilidades
+        self.tablas = tablas
+        self.distribucion_inicial = distribucion_inicial
+        self.pesos_sensibilidad = pesos_sensibilidad
+        self.visitas = visitas
+        self.regimen_paso = regimen_paso
+        self.ancho_glucosa = ancho_glucosa
+        self.info = info or {}
+        self._preparar_indices()
+    
+    def _preparar_indices(self):
+        """Estado de la Q-table de cada estado fino y tablas aplanadas para propagar"""
+        inferiores = np.concatenate([[40], _bordes_glucosa(self.ancho_glucosa)])
+        glucosa_cat = np.searchsorted([70, 180, 250], inferiores, side='right')
+        medios = (np.concatenate([[0], BORDES_INSULINA]) + np.concatenate([BORDES_INSULINA, [60]])) / 2
+        insulina_cat = np.minimum(N_INSULINA - 1, np.round(medios / 5)).astype(np.int64)
+        
+        g, i, t = np.meshgrid(np.arange(len(inferiores)), np.arange(len(medios)),
+                              np.arange(len(TIEMPO_CATEGORIA)), indexing='ij')
+        self.n_finos = g.size
+        local = (glucosa_cat[g] * 20 + insulina_cat[i] * 4 + TIEMPO_CATEGORIA[t]).ravel()
+        
+        # Índice global de la Q-table (local*3 + sensibilidad) de cada (sensibilidad, estado fino)
+        self.estado_q = (local[None, :] * N_SENSIBILIDADES + np.arange(N_SENSIBILIDADES)[:, None]).ravel()
+        
+        # Celdas aplanadas: ((sensibilidad * R + régimen) * n_finos + estado) * 4 + acción
+        max_sucesores = self.sucesores.shape[-1]
+        self._sucesores_planos = self.sucesores.reshape(-1, max_sucesores)
+        self._probabilidades_planas = self.probabilidades.reshape(-1, max_sucesores)
+        self._tablas_planas = [self.tablas[nombre].ravel() for nombre in TABLAS] + [(self.visitas > 0).ravel()]
+    
+    @classmethod
+    def construir(cls, df_pacientes, episodios_por_paciente=60, ancho_glucosa=10, max_sucesores=8, semilla=0):
+        """
+        Estima el modelo simulando días completos de todos los pacientes del DataFrame;
+        cada episodio sortea sus propias probabilidades de acción (ver CONCENTRACION_ACCIONES)
+        """
+        rng = np.random.default_rng(semilla)
+        simulador = crear_simulador_vectorizado(df_pacientes, rng=rng)
+        pesos = np.bincount(simulador.sensibilidad_idx, minlength=N_SENSIBILIDADES) / simulador.n
+        
+        simulador = simulador.repetir(episodios_por_paciente)
+        sensibilidad = simulador.sensibilidad_idx
+        n = simulador.n
+        
+        # Régimen de comida de cada paso (la progresión solo toma unos pocos valores)
+        ultimo = len(simulador._progresion_comida) - 1
+        progresion = simulador._progresion_comida[np.minimum(np.arange(N_PASOS) * 30, ultimo)]
+        _, regimen_paso = np.unique(progresion, return_inverse=True)
+        n_regimenes = regimen_paso.max() + 1
+        
+        bordes = _bordes_glucosa(ancho_glucosa)
+        n_insulina = len(BORDES_INSULINA) + 1
+        n_tiempo = len(TIEMPO_CATEGORIA)
+        n_finos = (len(bordes) + 1) * n_insulina * n_tiempo
+        
+        def estado_fino():
+            g = np.searchsorted(bordes, simulador.glucosa, side='right')
+            i = np.searchsorted(BORDES_INSULINA, simulador.insulina_activa, side='right')
+            t = np.minimum(n_tiempo - 1, -(-simulador.tiempo_desde_dosis // 30))
+            return (g * n_insulina + i) * n_tiempo + t
+        
+        probabilidades_accion = np.cumsum(rng.dirichlet(CONCENTRACION_ACCIONES, size=n), axis=1)
+        
+        simulador.reset()
+        finos = estado_fino()
+        iniciales = np.bincount(sensibilidad * n_finos + finos, minlength=N_SENSIBILIDADES * n_finos)
+        
+        claves_celda = np.empty((N_PASOS, n), dtype=np.int64)
+        destinos = np.empty((N_PASOS, n), dtype=np.int64)
+        valores = {nombre: np.empty((N_PASOS, n)) for nombre in TABLAS}
+        
+        for paso in range(N_PASOS):
+            sorteo = rng.random(n)[:, None]
+            acciones = (sorteo > probabilidades_accion[:, :-1]).sum(axis=1)
+            
+            _, recompensas, _ = simulador.step(acciones)
+            nuevos_finos = estado_fino()
+            glucosa = simulador.glucosa
+            
+            claves_celda[paso] = ((sensibilidad * n_regimenes + regimen_paso[paso]) * n_finos + finos) * N_ACCIONES + acciones
+            destinos[paso] = nuevos_finos
+            valores['recompensa'][paso] = recompensas
+            valores['en_rango'][paso] = (glucosa >= 70) & (glucosa <= 180)
+            valores['hipo'][paso] = glucosa < 70
+            valores['hiper'][paso] = glucosa > 180
+            valores['glucosa'][paso] = glucosa
+            
+            finos = nuevos_finos
+        
+        forma = (N_SENSIBILIDADES, n_regimenes, n_finos, N_ACCIONES)
+        n_celdas = int(np.prod(forma))
+        celdas = claves_celda.ravel()
+        visitas = np.bincount(celdas, minlength=n_celdas)
+        sumas = {nombre: np.bincount(celdas, weights=valores[nombre].ravel(), minlength=n_celdas)
+                 for nombre in TABLAS}
+        
+        sucesores, probabilidades = _sucesores_mas_probables(celdas, destinos.ravel(), n_celdas, n_finos,
+                                                             max_sucesores)
+        sucesores, probabilidades, tablas = _completar_celdas_sin_visitas(
+            sucesores.reshape(*forma, max_sucesores), probabilidades.reshape(*forma, max_sucesores),
+            visitas.reshape(forma), {nombre: suma.reshape(forma) for nombre, suma in sumas.items()}
+        )
+        
+        iniciales = iniciales.reshape(N_SENSIBILIDADES, n_finos).astype(float)
+        distribucion_inicial = iniciales / np.maximum(iniciales.sum(axis=1, keepdims=True), 1)
+        
+        info = {'pacientes': len(df_pacientes), 'episodios_por_paciente': episodios_por_paciente,
+                'semilla': semilla, 'transiciones_simuladas': n * N_PASOS}
+        
+        return cls(sucesores, probabilidades, tablas, distribucion_inicial, pesos,
+                   visitas.reshape(forma), regimen_paso, ancho_glucosa, info)
+    
+    def guardar(self, ruta=RUTA_CACHE_DEFECTO):
+        directorio = os.path.dirname(ruta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        np.savez_compressed(
+            ruta,
+            sucesores=self.sucesores.astype(np.int16),
+            probabilidades=self.probabilidades.astype(np.float32),
+            distribucion_inicial=self.distribucion_inicial,
+            pesos_sensibilidad=self.pesos_sensibilidad,
+            visitas=self.visitas.astype(np.int32),
+            regimen_paso=self.regimen_paso,
+            ancho_glucosa=self.ancho_glucosa,
+            info_claves=np.array(list(self.info)),
+            info_valores=np.array([str(v) for v in self.info.values()]),
+            **{f'tabla_{nombre}': tabla for nombre, tabla in self.tablas.items()}
+        )
+        return ruta
+    
+    @classmethod
+    def cargar(cls, ruta=RUTA_CACHE_DEFECTO):
+        with np.load(ruta) as datos:
+            return cls(
+                datos['sucesores'].astype(np.int64),
+                datos['probabilidades'].astype(float),
+                {nombre: datos[f'tabla_{nombre}'] for nombre in TABLAS},
+                datos['distribucion_inicial'],
+                datos['pesos_sensibilidad'],
+                datos['visitas'],
+                datos['regimen_paso'],
+                int(datos['ancho_glucosa']),
+                dict(zip(datos['info_claves'].tolist(), datos['info_valores'].tolist()))
+            )
+    
+    @classmethod
+    def obtener(cls, df_pacientes, ruta=RUTA_CACHE_DEFECTO, **kwargs):
+        """Carga el modelo cacheado o lo construye y lo guarda si no existe"""
+        if os.path.exists(ruta):
+            return cls.cargar(ruta)
+        print(f"   Construyendo modelo de transiciones (se guarda en {ruta})...")
+        modelo = cls.construir(df_pacientes, **kwargs)
+        modelo.guardar(ruta)
+        return modelo
+    
+    def evaluar_politicas(self, q_tables, tamano_bloque=256):
+        """
+        Evalúa analíticamente la política greedy de cada Q-table
+        
+        Args:
+            q_tables: (K, 240, 4) o una sola Q-table (240, 4)
+        
+        Returns:
+            dict métrica -> arreglo (K,) con las mismas métricas que evaluar_checkpoint
+            (tiempo_en_rango_prom, hipoglucemias_prom, hiperglucemias_prom, recompensa_prom,
+            glucosa_prom, puntuacion_compuesta) y cobertura (fracción de la probabilidad
+            que pasó por celdas observadas en la simulación)
+        """
+        q_tables = np.asarray(q_tables)
+        if q_tables.ndim == 2:
+            q_tables = q_tables[None]
+        
+        # Acción de cada (sensibilidad, estado fino): (K, 3 * n_finos)
+        politicas = np.argmax(q_tables, axis=2)[:, self.estado_q]
+        
+        partes = [self._propagar(politicas[i:i + tamano_bloque]) for i in range(0, len(politicas), tamano_bloque)]
+        esperados = dict(zip((*TABLAS, 'cobertura'), np.concatenate(partes).T / N_PASOS))
+        
+        resultados = {
+            'tiempo_en_rango_prom': esperados['en_rango'] * 100,
+            'hipoglucemias_prom': esperados['hipo'] * 100,
+            'hiperglucemias_prom': esperados['hiper'] * 100,
+            'recompensa_prom': esperados['recompensa'] * N_PASOS,
+            'glucosa_prom': esperados['glucosa'],
+            'cobertura': esperados['cobertura']
+        }
+        resultados['puntuacion_compuesta'] = puntuacion_compuesta(
+            resultados['tiempo_en_rango_prom'], resultados['hipoglucemias_prom'], resultados['hiperglucemias_prom']
+        )
+        return resultados
+    
+    def evaluar(self, q_table):
+        """Evaluación analítica de una Q-table (dict de floats)"""
+        return {nombre: float(valor[0]) for nombre, valor in self.evaluar_politicas(q_table).items()}
+    
+    def _propagar(self, politicas):
+        """
+        Suma sobre el día de los valores esperados (en el orden de TABLAS, más la
+        cobertura), ponderados por el peso de cada sensibilidad
+        
+        La distribución es un vector plano de K * 3 * n_finos; en cada paso solo se
+        recorren los estados con probabilidad mayor que MASA_MINIMA.
+        
+        Returns:
+            arreglo (K, len(TABLAS) + 1)
+        """
+        k = len(politicas)
+        n_finos = self.n_finos
+        n_regimenes = self.visitas.shape[1]
+        por_politica = N_SENSIBILIDADES * n_finos
+        
+        inicial = (self.distribucion_inicial * self.pesos_sensibilidad[:, None]).ravel()
+        distribucion = np.tile(inicial, k)
+        acumulado = np.zeros((k, len(self._tablas_planas)))
+        
+        for paso in range(N_PASOS):
+            indices = np.flatnonzero(distribucion > MASA_MINIMA)
+            masa = distribucion[indices]
+            politica, resto = np.divmod(indices, por_politica)
+            sensibilidad, estado = np.divmod(resto, n_finos)
+            
+            acciones = politicas[politica, resto]
+            celda = ((sensibilidad * n_regimenes + self.regimen_paso[paso]) * n_finos + estado) * N_ACCIONES + acciones
+            
+            for columna, tabla in enumerate(self._tablas_planas):
+                acumulado[:, columna] += np.bincount(politica, weights=masa * tabla[celda], minlength=k)
+            
+            destinos = self._sucesores_planos[celda] + (indices - estado)[:, None]
+            pesos = masa[:, None] * self._probabilidades_planas[celda]
+            distribucion = np.bincount(destinos.ravel(), weights=pesos.ravel(), minlength=k * por_politica)
+        
+        return acumulado
+
+
+def _bordes_glucosa(ancho_glucosa):
+    """Bordes de los tramos de glucosa (40-400); 60, 70, 180, 250 y 260 deben ser bordes"""
+    bordes = np.arange(40 + ancho_glucosa, 400, ancho_glucosa)
+    if not all(np.isin([60, 70, 180, 250, 260], bordes)):
+        raise ValueError("ancho_glucosa debe dividir 10 (p. ej. 5 o 10 mg/dL)")
+    return bordes
+
+
+def _sucesores_mas_probables(celdas, destinos, n_celdas, n_finos, max_sucesores):
+    """Top-k de destinos por celda con sus probabilidades (renormalizadas)"""
+    claves, conteos = np.unique(celdas * n_finos + destinos, return_counts=True)
+    celda, destino = claves // n_finos, claves % n_finos
+    
+    # Orden por celda y conteo descendente; posición de cada destino dentro de su celda
+    orden = np.lexsort((-conteos, celda))
+    celda, destino, conteos = celda[orden], destino[orden], conteos[orden]
+    rango = np.arange(len(celda)) - np.searchsorted(celda, celda, side='left')
+    guardar = rango < max_sucesores
+    
+    sucesores = np.zeros((n_celdas, max_sucesores), dtype=np.int64)
+    probabilidades = np.zeros((n_celdas, max_sucesores))
+    sucesores[celda[guardar], rango[guardar]] = destino[guardar]
+    probabilidades[celda[guardar], rango[guardar]] = conteos[guardar]
+    
+    total = probabilidades.sum(axis=1, keepdims=True)
+    return sucesores, np.divide(probabilidades, total, out=np.zeros_like(probabilidades), where=total > 0)
+
+
+def _completar_celdas_sin_visitas(sucesores, probabilidades, visitas, sumas):
+    """
+    Celdas sin datos en un régimen usan las del régimen sin comida (el más frecuente);
+    si tampoco hay datos, el estado se mantiene con los valores promedio de su sensibilidad
+    """
+    sin_visitas = visitas == 0
+    regimen_base = np.argmax(visitas.sum(axis=(0, 2, 3)))
+    base = (slice(None), slice(regimen_base, regimen_base + 1))
+    
+    usar_base = sin_visitas & ~sin_visitas[base]
+    sucesores = np.where(usar_base[..., None], sucesores[base], sucesores)
+    probabilidades = np.where(usar_base[..., None], probabilidades[base], probabilidades)
+    
+    sin_datos = sin_visitas & sin_visitas[base]
+    propio = np.broadcast_to(np.arange(visitas.shape[2])[None, None, :, None], visitas.shape)
+    sucesores[..., 0] = np.where(sin_datos, propio, sucesores[..., 0])
+    probabilidades = np.where(sin_datos[..., None], np.eye(1, probabilidades.shape[-1])[0], probabilidades)
+    
+    denominador = np.where(usar_base, visitas[base], visitas).astype(float)
+    tablas = {}
+    for nombre, suma in sumas.items():
+        suma = np.where(usar_base, suma[base], suma)
+        promedio = suma.sum(axis=(1, 2, 3), keepdims=True) / np.maximum(denominador.sum(axis=(1, 2, 3), keepdims=True), 1)
+        tablas[nombre] = np.where(sin_datos, promedio, suma / np.maximum(denominador, 1))
+    
+    return sucesores, probabilidades, tablas
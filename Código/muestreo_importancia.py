@@ -0,0 +1,192 @@
+import sys
+import time
+import numpy as np
+from evaluacion_panel import seleccionar_panel
+from simulador_vectorizado import crear_simulador_vectorizado
+import perfilado
+
+# Estimación de hipoglucemias (eventos raros) con muestreo por importancia.
+#
+# Con una buena política las glucosas bajo 70 y sobre todo bajo 60 mg/dL aparecen en
+# pocos episodios, y acotar su tasa con Monte Carlo simple exige muchos episodios. Aquí
+# una fracción de los episodios se simula con un sorteo inclinado hacia glucosas bajas:
+#   glucosa inicial  exponencial truncada en [80, 160] (más peso cerca de 80) en lugar
+#                    de uniforme
+#   ruido por paso   N(desplazamiento_ruido, 5) en lugar de N(0, 5) mientras la glucosa
+#                    está bajo umbral_inclinacion y el episodio aún no tuvo hipoglucemia
+# y el resto con el sorteo original. Cada evento se pondera con la razón de
+# verosimilitud p/q de la trayectoria hasta su paso, con q la mezcla de los dos sorteos
+# (así el peso nunca supera 1 / (1 - fraccion_inclinada)); las estimaciones son
+# insesgadas para la dinámica original. La política y la fisiología no cambian, solo el
+# sorteo, sobre SimuladorDiabetesVectorizado.
+#
+# Métricas (glucosa después de cada paso, como evaluar_checkpoint):
+#   hipoglucemias            % de pasos < 70
+#   hipoglucemias_severas    % de pasos < 60
+#   episodios_hipo_severa    % de episodios con algún paso < 60
+
+METRICAS_HIPO = ('hipoglucemias', 'hipoglucemias_severas', 'episodios_hipo_severa')
+SIGMA_RUIDO = 5.0
+
+
+def _sortear_glucosa_inicial(rng, inclinado, inclinacion):
+    """
+    Glucosa inicial uniforme en [80, 160], o con densidad ∝ exp(-inclinacion·(g-80)) en
+    las filas inclinadas. Devuelve también log(q/p) del sorteo inclinado en todas las filas
+    """
+    n = len(inclinado)
+    glucosa = rng.uniform(80, 160, size=n)
+    if inclinacion <= 0:
+        return glucosa, np.zeros(n)
+    masa = -np.expm1(-80 * inclinacion)
+    glucosa[inclinado] = 80 - np.log1p(-rng.uniform(size=int(inclinado.sum())) * masa) / inclinacion
+    # p = 1/80; q = inclinacion·exp(-inclinacion·(g-80)) / masa
+    return glucosa, np.log(80 * inclinacion / masa) - inclinacion * (glucosa - 80)
+
+
+def estimar_hipoglucemias(q_table, df_pacientes, n_episodios=1, desplazamiento_ruido=-3.0,
+                          inclinacion_glucosa=0.03, umbral_inclinacion=110, fraccion_inclinada=0.5,
+                          semilla=0, z=1.96):
+    """
+    Tasas de hipoglucemia de la política greedy con muestreo por importancia
+    
+    Args:
+        n_episodios: Días simulados por paciente
+        desplazamiento_ruido: Media del ruido inclinado (mg/dL por paso; 0 = sin inclinar)
+        inclinacion_glucosa: Tasa de la exponencial de la glucosa inicial (1/(mg/dL); 0 = uniforme)
+        umbral_inclinacion: El ruido solo se inclina con la glucosa bajo este valor (mg/dL)
+        fraccion_inclinada: Fracción de episodios simulados con el sorteo inclinado
+    
+    Returns:
+        dict con 'estimaciones' {métrica: {'valor', 'error_estandar', 'ic_inf', 'ic_sup',
+        'factor_episodios'}}, 'episodios' y 'muestra_efectiva'. factor_episodios es la
+        razón entre la varianza por episodio de Monte Carlo simple (estimada con los mismos
+        pesos) y la obtenida: cuántos episodios simples equivale cada episodio simulado
+    """
+    politica = np.argmax(q_table, axis=1)
+    n = len(df_pacientes)
+    rng = np.random.default_rng(semilla)
+    simulador = crear_simulador_vectorizado(df_pacientes, rng=rng)
+    mu = desplazamiento_ruido
+    alfa = fraccion_inclinada
+    escala = np.array([100 / 48, 100 / 48, 100])[:, None]
+    
+    # Por métrica: Σ x, Σ x² de las contribuciones ponderadas y Σ w·f² (para E_p[f²])
+    suma = np.zeros(len(METRICAS_HIPO))
+    suma_cuadrados = np.zeros(len(METRICAS_HIPO))
+    segundo_momento = np.zeros(len(METRICAS_HIPO))
+    pesos = 0.0
+    pesos_cuadrados = 0.0
+    
+    for _ in range(n_episodios):
+        inclinado = rng.uniform(size=n) < alfa
+        glucosa_inicial, log_q_p = _sortear_glucosa_inicial(rng, inclinado, inclinacion_glucosa)
+        estados = simulador.fijar_estado(glucosa_inicial, 0, rng.integers(120, 300, size=n), 0, 0)
+        
+        ponderado = np.zeros((len(METRICAS_HIPO), n))
+        conteo = np.zeros((len(METRICAS_HIPO), n))
+        con_hipo = np.zeros(n, dtype=bool)
+        con_severa = np.zeros(n, dtype=bool)
+        for _ in range(48):
+            mu_inclinado = np.where((simulador.glucosa < umbral_inclinacion) & ~con_hipo, mu, 0.0)
+            ruido = rng.normal(np.where(inclinado, mu_inclinado, 0.0), SIGMA_RUIDO)
+            # log N(x; μ, σ) - log N(x; 0, σ)
+            log_q_p += (2 * mu_inclinado * ruido - mu_inclinado ** 2) / (2 * SIGMA_RUIDO ** 2)
+            estados, _, _ = simulador.step(politica[estados], ruido=ruido)
+            
+            # p / (α·q + (1-α)·p) de la trayectoria hasta este paso
+            peso = 1 / (alfa * np.exp(log_q_p) + (1 - alfa))
+            bajo_70 = simulador.glucosa < 70
+            bajo_60 = simulador.glucosa < 60
+            eventos = np.stack([bajo_70, bajo_60, bajo_60 & ~con_severa])
+            ponderado += peso * eventos
+            conteo += eventos
+            con_hipo |= bajo_70
+            con_severa |= bajo_60
+        
+        valores = ponderado * escala
+        suma += valores.sum(axis=1)
+        suma_cuadrados += (valores ** 2).sum(axis=1)
+        segundo_momento += (peso * (conteo * escala) ** 2).sum(axis=1)
+        pesos += peso.sum()
+        pesos_cuadrados += (peso ** 2).sum()
+    
+    total = n * n_episodios
+    media = suma / total
+    varianza = np.maximum(suma_cuadrados / total - media ** 2, 0) * total / max(total - 1, 1)
+    error_estandar = np.sqrt(varianza / total)
+    varianza_simple = np.maximum(segundo_momento / total - media ** 2, 0)
+    
+    estimaciones = {}
+    for i, metrica in enumerate(METRICAS_HIPO):
+        estimaciones[metrica] = {
+            'valor': float(media[i]),
+            'error_estandar': float(error_estandar[i]),
+            'ic_inf': float(media[i] - z * error_estandar[i]),
+            'ic_sup': float(media[i] + z * error_estandar[i]),
+            'factor_episodios': float(varianza_simple[i] / varianza[i]) if varianza[i] > 0 else float('nan')
+        }
+    
+    return {
+        'estimaciones': estimaciones,
+        'episodios': total,
+        'muestra_efectiva': float(pesos ** 2 / pesos_cuadrados) if pesos_cuadrados > 0 else 0.0
+    }
+
+
+def ejecutar_estimacion_hipoglucemias(modelo_path, db_path, n_pacientes=None, n_episodios=1, semilla=None,
+                                      **inclinacion):
+    """
+    Estima las tasas de hipoglucemia de un modelo (.pkl/.npy) y muestra el resumen
+    
+    Args:
+        n_pacientes: Pacientes de la base (muestra con la semilla; None = todos)
+        inclinacion: desplazamiento_ruido, inclinacion_glucosa, umbral_inclinacion y
+                     fraccion_inclinada de estimar_hipoglucemias
+    
+    Returns:
+        dict con las estimaciones y el resumen de la corrida
+    """
+    import pandas as pd
+    from ranking_checkpoints import cargar_q_tables
+    
+    if semilla is None:
+        semilla = 0
+    q_table = cargar_q_tables([modelo_path])[0]['q_table']
+    df_pacientes = pd.read_csv(db_path)
+    if n_pacientes is not None:
+        df_pacientes = seleccionar_panel(df_pacientes, n_pacientes, semilla=semilla)
+    
+    inicio = time.perf_counter()
+    resultado = estimar_hipoglucemias(q_table, df_pacientes, n_episodios=n_episodios, semilla=semilla,
+                                      **inclinacion)
+    tiempo = time.perf_counter() - inicio
+    
+    print(f"\nHIPOGLUCEMIAS CON MUESTREO POR IMPORTANCIA: {modelo_path}")
+    print(f"   - {len(df_pacientes)} pacientes x {n_episodios} episodios = {resultado['episodios']:,} "
+          f"episodios ({tiempo:.2f} s, semilla {semilla})")
+    print(f"   - Muestra efectiva: {resultado['muestra_efectiva']:,.0f}")
+    print(f"\n   {'métrica':<24} {'estimación (IC95)':>24} {'error est.':>10} {'equivale a':>22}")
+    for metrica, estimacion in resultado['estimaciones'].items():
+        equivalentes = estimacion['factor_episodios'] * resultado['episodios']
+        equivale = f"{equivalentes:,.0f} episodios MC" if np.isfinite(equivalentes) else "sin eventos"
+        print(f"   {metrica:<24} {estimacion['valor']:>7.3f}% ({estimacion['ic_inf']:.3f}-{estimacion['ic_sup']:.3f}) "
+              f"{estimacion['error_estandar']:>10.4f} {equivale:>22}")
+    
+    return {
+        'modelo': modelo_path,
+        'pacientes': len(df_pacientes),
+        'tiempo_s': tiempo,
+        'semilla': semilla,
+        **resultado
+    }
+
+
+def main(argv=None):
+    # Mismo flujo que "python cli.py hypo"
+    from cli import main as cli_main
+    return cli_main(['hypo'] + list(sys.argv[1:] if argv is None else argv))
+
+
+if __name__ == "__main__":
+    sys.exit(perfilado.ejecutar(main, 'muestreo_importancia'))
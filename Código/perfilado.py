@@ -0,0 +1,131 @@
+import cProfile
+import io
+import os
+import pstats
+import sys
+import tracemalloc
+from datetime import datetime
+
+# Modo de perfilado para los scripts principales.
+#
+# Se activa con la variable de entorno PERFILAR=1 o el flag --perfilar; PERFILAR_MEMORIA=1
+# o --perfilar-memoria agregan snapshots de tracemalloc en cada checkpoint.
+# Los resultados quedan en Resultados/perf/: un .prof (abrible con pstats/snakeviz)
+# y un resumen de texto con las N funciones de mayor tiempo acumulado.
+
+DIRECTORIO_PERF = 'Resultados/perf'
+TOP_N_DEFECTO = 40
+
+# Estado del perfilado de memoria de la ejecución actual
+_memoria = {'activa': False, 'archivo': None, 'snapshot_previo': None}
+
+
+def _flag_activo(flag, variable_entorno):
+    """True si el flag está en la línea de comandos (y lo consume) o la variable de entorno está activa"""
+    activo = os.environ.get(variable_entorno, '').strip().lower() in ('1', 'true', 'si', 'sí', 'yes')
+    if flag in sys.argv:
+        sys.argv.remove(flag)
+        activo = True
+    return activo
+
+
+def ejecutar(funcion, nombre, top_n=None):
+    """
+    Ejecuta el punto de entrada `funcion`, bajo cProfile si el perfilado está activo
+    
+    Args:
+        nombre: Prefijo de los archivos generados en Resultados/perf/
+        top_n: Funciones listadas en el resumen (o variable PERFILAR_TOP_N)
+    """
+    perfilar = _flag_activo('--perfilar', 'PERFILAR')
+    perfilar_memoria = _flag_activo('--perfilar-memoria', 'PERFILAR_MEMORIA')
+    
+    if not perfilar and not perfilar_memoria:
+        return funcion()
+    
+    if top_n is None:
+        top_n = int(os.environ.get('PERFILAR_TOP_N', TOP_N_DEFECTO))
+    
+    os.makedirs(DIRECTORIO_PERF, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    base = os.path.join(DIRECTORIO_PERF, f"{nombre}_{timestamp}")
+    
+    if perfilar_memoria:
+        iniciar_memoria(f"{base}_memoria.txt")
+    
+    perfil = cProfile.Profile() if perfilar else None
+    try:
+        if perfil is not None:
+            perfil.enable()
+        return funcion()
+    finally:
+        if perfil is not None:
+            perfil.disable()
+        if perfilar_memoria:
+            snapshot_memoria('fin')
+        if perfil is not None:
+            _guardar_perfil(perfil, base, top_n)
+        if perfilar_memoria:
+            detener_memoria()
+
+
+def _guardar_perfil(perfil, base, top_n):
+    """Guarda el .prof y el resumen por tiempo acumulado"""
+    archivo_prof = f"{base}.prof"
+    perfil.dump_stats(archivo_prof)
+    
+    salida = io.StringIO()
+    estadisticas = pstats.Stats(perfil, stream=salida)
+    estadisticas.strip_dirs().sort_stats('cumulative').print_stats(top_n)
+    salida.write("\n")
+    estadisticas.sort_stats('tottime').print_stats(top_n)
+    
+    archivo_txt = f"{base}_top{top_n}.txt"
+    with open(archivo_txt, 'w', encoding='utf-8') as f:
+        f.write(salida.getvalue())
+    
+    print(f"\nPERFILADO:")
+    print(f"  - Perfil: {archivo_prof}")
+    print(f"  - Resumen: {archivo_txt}")
+
+
+def iniciar_memoria(archivo):
+    """Activa tracemalloc; los snapshots posteriores se comparan contra el anterior"""
+    tracemalloc.start()
+    _memoria.update({
+        'activa': True,
+        'archivo': archivo,
+        'snapshot_previo': tracemalloc.take_snapshot()
+    })
+    with open(archivo, 'w', encoding='utf-8') as f:
+        f.write(f"CRECIMIENTO DE MEMORIA (tracemalloc) - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+
+
+def snapshot_memoria(etiqueta, top_n=15):
+    """
+    Registra en el archivo de memoria las líneas que más crecieron desde el snapshot anterior.
+    No hace nada si el perfilado de memoria no está activo
+    """
+    if not _memoria['activa']:
+        return
+    
+    snapshot = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ))
+    actual, pico = tracemalloc.get_traced_memory()
+    diferencias = snapshot.compare_to(_memoria['snapshot_previo'], 'lineno')
+    
+    with open(_memoria['archivo'], 'a', encoding='utf-8') as f:
+        f.write(f"\n[{etiqueta}] actual: {actual/1024/1024:.1f} MB | pico: {pico/1024/1024:.1f} MB\n")
+        for diferencia in diferencias[:top_n]:
+            f.write(f"  {diferencia}\n")
+    
+    _memoria['snapshot_previo'] = snapshot
+
+
+def detener_memoria():
+    if _memoria['activa']:
+        print(f"  - Memoria: {_memoria['archivo']}")
+    tracemalloc.stop()
+    _memoria.update({'activa': False, 'archivo': None, 'snapshot_previo': None})
@@ -1,16 +1,20 @@
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
 import pickle
 from datetime import datetime, timedelta
 import json
-import random
 import warnings
 warnings.filterwarnings('ignore')
 import os
+import sys
+import perfilado
+import graficos
 
 class PlanificadorInsulinaPersonalizado:
     
+    # Glucosa inicial por defecto de generar_plan_24h y generar_planes_lote (entera, mg/dL)
+    GLUCOSA_INICIAL_DEFECTO = (120, 180)
+    
     def __init__(self, modelo_path='Resultados/best_model/best_model.pkl', db_path='Base de datos/db_diabetes_50k.csv'):
         self.modelo_path = modelo_path
         self.db_path = db_path
@@ -27,6 +31,48 @@ class PlanificadorInsulinaPersonalizado:
         print(f"Modelo cargado: {modelo_path}")
         print(f"Base de datos: {db_path} ({len(self.df_pacientes)} pacientes)")
         print(f"Dimensiones Q-table: {self.agente.q_table.shape}")
+        
+        # Modo de planificación con anticipación (desactivado por defecto)
+        self.controlador_mpc = None
+        
+        # Registro de cada paso de los planes (RegistroTrayectorias; None = desactivado)
+        self.registro_trayectorias = None
+        
+        # Generador del planificador: paciente y glucosa aleatorios y ruido de los simuladores
+        self.rng = np.random.default_rng()
+        
+        # Resolución de los simuladores (5, 10, 15 o 30 minutos; las dosis siguen cada 30).
+        # Con menos de 30 los planes incluyen las lecturas tipo CGM de cada sub-paso
+        self.minutos_paso = 30
+    
+    def activar_mpc(self, horizonte=6, rollouts_por_lote=64, max_rollouts=512, presupuesto_ms=20.0,
+                    criterio='recompensa', semilla=None):
+        """
+        Activa el refinamiento de dosis con rollouts vectorizados (ver ControladorMPC).
+        Las decisiones de los planes siguientes se toman evaluando cada dosis por anticipación
+        """
+        from control_mpc import ControladorMPC
+        
+        self.controlador_mpc = ControladorMPC(
+            self.agente.q_table,
+            gamma=self.agente.gamma,
+            horizonte=horizonte,
+            rollouts_por_lote=rollouts_por_lote,
+            max_rollouts=max_rollouts,
+            presupuesto_ms=presupuesto_ms,
+            criterio=criterio,
+            semilla=semilla
+        )
+        print(f"Modo MPC activado (H={horizonte}, presupuesto={presupuesto_ms} ms/decisión, criterio={criterio})")
+    
+    def desactivar_mpc(self):
+        """Vuelve a la política greedy de la Q-table"""
+        self.controlador_mpc = None
+    
+    def sortear_glucosa_inicial(self, rng, n=None):
+        """Glucosa inicial por defecto (GLUCOSA_INICIAL_DEFECTO; n valores si n no es None)"""
+        minima, maxima = self.GLUCOSA_INICIAL_DEFECTO
+        return rng.integers(minima, maxima + 1, size=n)
     
     def seleccionar_paciente_aleatorio(self, paciente_id=None):
         
@@ -35,10 +81,10 @@ class PlanificadorInsulinaPersonalizado:
                 paciente = self.df_pacientes.iloc[paciente_id].copy()
             else:
                 print(f"ID {paciente_id} fuera de rango. Seleccionando aleatorio.")
-                paciente_id = random.randint(0, len(self.df_pacientes) - 1)
+                paciente_id = int(self.rng.integers(len(self.df_pacientes)))
                 paciente = self.df_pacientes.iloc[paciente_id].copy()
         else:
-            paciente_id = random.randint(0, len(self.df_pacientes) - 1)
+            paciente_id = int(self.rng.integers(len(self.df_pacientes)))
             paciente = self.df_pacientes.iloc[paciente_id].copy()
         
         return paciente.to_dict(), paciente_id
@@ -58,7 +104,9 @@ class PlanificadorInsulinaPersonalizado:
         
         simulador = SimuladorDiabetesRL(
             paciente_id=paciente_data.get('id', 1),
-            tipo_sensibilidad=sensibilidad
+            tipo_sensibilidad=sensibilidad,
+            rng=self.rng,
+            minutos_paso=self.minutos_paso
         )
         
         peso = paciente_data.get('peso_kg', 70)
@@ -132,12 +180,12 @@ class PlanificadorInsulinaPersonalizado:
     def simular_dia_completo(self, paciente_data, glucosa_inicial=None, horario_comidas=None):
                 
         if glucosa_inicial is None:
-            glucosa_inicial = random.randint(100, 200)
+            glucosa_inicial = int(self.rng.integers(100, 201))
         
         simulador = self.crear_simulador_personalizado(paciente_data)
-        simulador.glucosa = glucosa_inicial
         
         # Reiniciar simulador para comenzar desde estado inicial
+        # (antes de fijar la glucosa inicial, para que reset() no la sobrescriba)
         try:
             if hasattr(simulador, 'reset'):
                 simulador.reset()
@@ -146,6 +194,8 @@ class PlanificadorInsulinaPersonalizado:
         except:
             pass  # Continuar si no tiene método reset
         
+        simulador.glucosa = glucosa_inicial
+        
         # Configurar horario de comidas si se proporciona
         if horario_comidas and hasattr(simulador, 'horario_comidas'):
             simulador.horario_comidas = horario_comidas
@@ -157,19 +207,36 @@ class PlanificadorInsulinaPersonalizado:
             'dosis_recomendada': [],
             'accion_idx': [],
             'insulina_activa': [],
-            'estado_descripcion': []
+            'estado_descripcion': [],
+            'glucosa_cgm': [],
+            'snapshot': []
         }
         
         # Obtener estado inicial usando método adaptativo
         estado = self.obtener_estado_simulador(simulador)
-        estado_idx = self.agente.estado_a_indice(estado, simulador)
         
         # Simular 24 horas con pasos de 30 minutos
-        for paso in range(48):  # 24 horas * 2 pasos por hora
+        self._simular_pasos(simulador, estado, datos_dia, paciente_data, paso_inicial=0)
+        
+        return datos_dia, simulador
+    
+    def _simular_pasos(self, simulador, estado, datos_dia, paciente_data, paso_inicial=0, n_pasos=48):
+        """Simula con la política aprendida desde paso_inicial hasta el final del día, registrando en datos_dia"""
+        estado_idx = self.agente.estado_a_indice(estado, simulador)
+        
+        for paso in range(paso_inicial, n_pasos):  # 24 horas * 2 pasos por hora
             hora_actual = paso * 0.5  # Horas desde inicio (cada 30 minutos)
             
+            # Guardar estado del simulador antes del paso (permite replanificar desde aquí)
+            if hasattr(simulador, 'snapshot'):
+                datos_dia['snapshot'].append(simulador.snapshot())
+            
             # Seleccionar acción usando la política aprendida
-            accion_idx = np.argmax(self.agente.q_table[estado_idx])
+            # (o refinada con rollouts si el modo MPC está activo)
+            if self.controlador_mpc is not None:
+                accion_idx, _ = self.controlador_mpc.seleccionar_accion(simulador)
+            else:
+                accion_idx = np.argmax(self.agente.q_table[estado_idx])
             dosis = simulador.acciones[accion_idx]
             
             # Registrar datos
@@ -185,7 +252,11 @@ class PlanificadorInsulinaPersonalizado:
             
             # Aplicar acción y avanzar en el tiempo
             try:
-                nuevo_estado, _, _ = simulador.step(accion_idx)
+                nuevo_estado, recompensa, _ = simulador.step(accion_idx)
+                if self.registro_trayectorias is not None:
+                    self.registro_trayectorias.agregar(paciente_data.get('id', 0), 0, paso, estado_idx, accion_idx,
+                                                       recompensa, simulador.glucosa,
+                                                       getattr(simulador, 'insulina_activa', 0))
             except:
                 # Si falla step, simular manualmente
                 nuevo_estado = estado  # Mantener mismo estado
@@ -194,7 +265,10 @@ class PlanificadorInsulinaPersonalizado:
                 reduccion = dosis * (50 / max(20, factor_sens))
                 simulador.glucosa = max(50, simulador.glucosa - reduccion)
                 # Añadir variabilidad
-                simulador.glucosa += random.uniform(-5, 5)
+                simulador.glucosa += self.rng.uniform(-5, 5)
+            
+            # Lecturas tipo CGM durante el paso (una sola con pasos de 30 minutos)
+            datos_dia['glucosa_cgm'].append(list(getattr(simulador, 'lecturas_cgm', [simulador.glucosa])))
             
             nuevo_estado_idx = self.agente.estado_a_indice(nuevo_estado, simulador)
             
@@ -202,9 +276,119 @@ class PlanificadorInsulinaPersonalizado:
             estado = nuevo_estado
             estado_idx = nuevo_estado_idx
         
-        return datos_dia, simulador
+        return datos_dia
+    
+    def _calcular_metricas(self, datos_dia):
+        """Calcula las métricas de control glucémico de un día simulado"""
+        glucosas = np.array(datos_dia['glucosa'])
+        dosis = np.array(datos_dia['dosis_recomendada'])
+        
+        return {
+            'tiempo_en_rango': np.mean((glucosas >= 70) & (glucosas <= 180)) * 100,
+            'hipoglucemias': np.mean(glucosas < 70) * 100,
+            'hiperglucemias': np.mean(glucosas > 180) * 100,
+            'glucosa_promedio': np.mean(glucosas),
+            'dosis_total': np.sum(dosis)
+        }
+    
+    def _lecturas_cgm(self, datos_dia):
+        """Horas y glucosas de las lecturas tipo CGM de un plan (None si los pasos son de 30 minutos)"""
+        lecturas = datos_dia.get('glucosa_cgm')
+        if not lecturas or len(lecturas[0]) == 1:
+            return None
+        
+        sub_pasos = len(lecturas[0])
+        horas = [hora + (i + 1) * 0.5 / sub_pasos for hora in datos_dia['hora'] for i in range(sub_pasos)]
+        return horas, [glucosa for paso in lecturas for glucosa in paso]
+    
+    def replanificar(self, resultado, desde=None, glucosa_observada=None, hora=None):
+        """
+        Recalcula el resto del día a partir de un estado intermedio del plan
+        
+        Solo se simulan los pasos restantes; el tramo ya calculado (antes del snapshot)
+        se reutiliza tal cual. Se simula sobre una copia del simulador, así que el
+        resultado original no cambia.
+        
+        Args:
+            resultado: Resultado de generar_plan_24h (o de un replanificar anterior)
+            desde: Snapshot del simulador desde el que continuar (ver datos_dia['snapshot'])
+            glucosa_observada: Nueva lectura de glucosa (mg/dL) a aplicar en ese momento
+            hora: Alternativa a desde: hora del día (ej. 14 o 14.5) para tomar el snapshot del plan
+        
+        Returns:
+            Nuevo resultado con el mismo formato que generar_plan_24h (sin bandas de
+            robustez: las del plan original parten de las 00:00 con otra glucosa)
+        """
+        datos_previos = resultado['datos_dia']
+        simulador = resultado['simulador'].clonar()
+        
+        if desde is None:
+            if hora is None:
+                raise ValueError("Se debe indicar 'desde' (snapshot) o 'hora'")
+            paso = int(round(hora * 2))
+            if not 0 <= paso < len(datos_previos['snapshot']):
+                raise ValueError(f"hora debe estar entre 0 y {(len(datos_previos['snapshot']) - 1) / 2:g} "
+                                 f"(recibido {hora})")
+            desde = datos_previos['snapshot'][paso]
+        
+        # 1. Restaurar el estado y aplicar la lectura observada
+        estado = simulador.restore(desde)
+        if glucosa_observada is not None:
+            simulador.glucosa = glucosa_observada
+            estado = simulador.get_estado_actual()
+        
+        # 2. Reutilizar el tramo ya calculado
+        paso_inicial = desde.pasos
+        datos_dia = {clave: list(valores[:paso_inicial]) for clave, valores in datos_previos.items()}
+        
+        # 3. Simular solo los pasos restantes
+        self._simular_pasos(simulador, estado, datos_dia, resultado['paciente_data'], paso_inicial=paso_inicial)
+        
+        return {
+            'paciente_data': resultado['paciente_data'],
+            'datos_dia': datos_dia,
+            'simulador': simulador,
+            'metricas': self._calcular_metricas(datos_dia),
+            'robustez': None,
+            'replanificado_desde_paso': paso_inicial
+        }
     
-    def generar_plan_24h(self, paciente_id=None, glucosa_inicial=None, mostrar_detalles=True):
+    def simular_monte_carlo(self, paciente_data, n_realizaciones=1000, glucosa_inicial=None, semilla=None):
+        """
+        Simula K realizaciones de ruido del mismo paciente en una sola pasada vectorizada
+        
+        Returns:
+            dict con bandas de glucosa por paso (P5/P50/P95), probabilidad de cualquier
+            hipoglucemia y la distribución del tiempo en rango entre realizaciones
+            (por lectura de minutos_paso minutos si es menor que 30)
+        """
+        from simulador_vectorizado import crear_simulador_vectorizado
+        
+        simulador = crear_simulador_vectorizado(pd.DataFrame([paciente_data]), minutos_paso=self.minutos_paso)
+        simulador = simulador.repetir(n_realizaciones, rng=np.random.default_rng(semilla))
+        datos = simulador.simular_dia(self.agente.q_table, glucosa_inicial=glucosa_inicial)
+        
+        # Glucosa inicial y lecturas después de cada sub-paso salvo la última (con pasos de
+        # 30 minutos es la glucosa antes de cada paso, datos['glucosa'])
+        glucosas = np.concatenate([datos['glucosa'][:, :1], datos['glucosa_cgm'][:, :-1]], axis=1)
+        tiempo_en_rango = np.mean((glucosas >= 70) & (glucosas <= 180), axis=1) * 100
+        p5, p50, p95 = np.percentile(glucosas, [5, 50, 95], axis=0)
+        
+        return {
+            'n_realizaciones': n_realizaciones,
+            'hora': np.arange(glucosas.shape[1]) * self.minutos_paso / 60,
+            'glucosa_p5': p5,
+            'glucosa_p50': p50,
+            'glucosa_p95': p95,
+            'prob_hipoglucemia': float(np.mean(np.any(glucosas < 70, axis=1))),
+            'prob_hipoglucemia_severa': float(np.mean(np.any(glucosas < 60, axis=1))),
+            'tiempo_en_rango': tiempo_en_rango,
+            'tiempo_en_rango_percentiles': dict(zip(['p5', 'p50', 'p95'],
+                                                    np.percentile(tiempo_en_rango, [5, 50, 95]).tolist()))
+        }
+    
+    def generar_plan_24h(self, paciente_id=None, glucosa_inicial=None, mostrar_detalles=True, n_realizaciones=1000,
+                         semilla=None):
 
         print("GENERANDO PLAN DE INSULINA PERSONALIZADO")
 
@@ -224,20 +408,20 @@ class PlanificadorInsulinaPersonalizado:
         
         # 2. Simular día completo
         if glucosa_inicial is None:
-            glucosa_inicial = random.randint(120, 180)
+            glucosa_inicial = int(self.sortear_glucosa_inicial(self.rng))
         
         datos_dia, simulador = self.simular_dia_completo(paciente_data, glucosa_inicial)
         
         # 3. Analizar resultados
-        glucosas = np.array(datos_dia['glucosa'])
         dosis = np.array(datos_dia['dosis_recomendada'])
         
         # Calcular métricas
-        tiempo_en_rango = np.mean((glucosas >= 70) & (glucosas <= 180)) * 100
-        hipoglucemias = np.mean(glucosas < 70) * 100
-        hiperglucemias = np.mean(glucosas > 180) * 100
-        glucosa_promedio = np.mean(glucosas)
-        dosis_total = np.sum(dosis)
+        metricas = self._calcular_metricas(datos_dia)
+        tiempo_en_rango = metricas['tiempo_en_rango']
+        hipoglucemias = metricas['hipoglucemias']
+        hiperglucemias = metricas['hiperglucemias']
+        glucosa_promedio = metricas['glucosa_promedio']
+        dosis_total = metricas['dosis_total']
         
         if mostrar_detalles:
             print(f"\nRESULTADOS DE LA SIMULACIÓN (24 horas):")
@@ -249,6 +433,18 @@ class PlanificadorInsulinaPersonalizado:
             print(f"  Dosis total recomendada: {dosis_total:.1f} U")
             print(f"  Dosis promedio por paso: {np.mean(dosis):.2f} U")
         
+        # Robustez del plan frente al ruido (Monte Carlo vectorizado)
+        robustez = None
+        if n_realizaciones:
+            robustez = self.simular_monte_carlo(paciente_data, n_realizaciones, glucosa_inicial, semilla=semilla)
+            
+            if mostrar_detalles:
+                tir = robustez['tiempo_en_rango_percentiles']
+                print(f"\nROBUSTEZ DEL PLAN ({n_realizaciones} realizaciones):")
+                print(f"  Tiempo en rango P5/P50/P95: {tir['p5']:.1f}% / {tir['p50']:.1f}% / {tir['p95']:.1f}%")
+                print(f"  Probabilidad de hipoglucemia (<70): {robustez['prob_hipoglucemia']*100:.1f}%")
+                print(f"  Probabilidad de hipoglucemia severa (<60): {robustez['prob_hipoglucemia_severa']*100:.1f}%")
+        
         # 4. Generar plan horario resumido
         print(f"\nPLAN DE INSULINA RECOMENDADO:")
         print(f"Hora  | Dosis | Glucosa | Estado")
@@ -318,7 +514,8 @@ class PlanificadorInsulinaPersonalizado:
                 'hiperglucemias': hiperglucemias,
                 'glucosa_promedio': glucosa_promedio,
                 'dosis_total': dosis_total
-            }
+            },
+            'robustez': robustez
         }
     
     def visualizar_plan(self, resultado, save_figure=True):
@@ -326,13 +523,22 @@ class PlanificadorInsulinaPersonalizado:
         datos_dia = resultado['datos_dia']
         paciente_data = resultado['paciente_data']
         metricas = resultado['metricas']
+        robustez = resultado.get('robustez')
         
+        plt = graficos.pyplot()
         fig, axes = plt.subplots(2, 2, figsize=(15, 10))
         fig.suptitle(f'Plan de Insulina Personalizado - Paciente ID: {paciente_data.get("id", "N/A")}', 
                     fontsize=14, fontweight='bold')
         
         # 1. Evolución de glucosa
+        if robustez is not None:
+            axes[0, 0].fill_between(robustez['hora'], robustez['glucosa_p5'], robustez['glucosa_p95'],
+                                    alpha=0.2, color='blue', label='Banda P5-P95')
+            axes[0, 0].plot(robustez['hora'], robustez['glucosa_p50'], 'b:', linewidth=1, label='Mediana')
         axes[0, 0].plot(datos_dia['hora'], datos_dia['glucosa'], 'b-', linewidth=2, label='Glucosa')
+        lecturas_cgm = self._lecturas_cgm(datos_dia)
+        if lecturas_cgm is not None:
+            axes[0, 0].plot(*lecturas_cgm, color='navy', linewidth=0.8, alpha=0.7, label='Lecturas CGM')
         axes[0, 0].axhline(y=70, color='r', linestyle='--', alpha=0.5, label='Límite bajo (70)')
         axes[0, 0].axhline(y=180, color='r', linestyle='--', alpha=0.5, label='Límite alto (180)')
         axes[0, 0].fill_between(datos_dia['hora'], 70, 180, alpha=0.2, color='green', label='Rango objetivo')
@@ -404,7 +610,7 @@ class PlanificadorInsulinaPersonalizado:
             plt.savefig(filename, dpi=300, bbox_inches='tight')
             print(f"\nGráfico guardado como: {filename}")
         
-        plt.show()
+        graficos.mostrar(plt)
         return fig
     
     def guardar_plan(self, resultado, nombre_base='plan_insulina'):
@@ -434,6 +640,14 @@ class PlanificadorInsulinaPersonalizado:
         
         df_detallado.to_csv(nombre_csv, index=False, encoding='utf-8')
         
+        # Lecturas tipo CGM (solo con pasos de menos de 30 minutos)
+        nombre_cgm = None
+        lecturas_cgm = self._lecturas_cgm(datos_dia)
+        if lecturas_cgm is not None:
+            nombre_cgm = f"Resultados/atencion_personalizada/{nombre_base}_cgm_paciente_{paciente_id}_{timestamp}.csv"
+            pd.DataFrame({'hora': lecturas_cgm[0], 'glucosa_mg_dL': lecturas_cgm[1]}).to_csv(
+                nombre_cgm, index=False, encoding='utf-8')
+        
         # 2. Función para convertir todos los tipos de numpy/pandas a Python nativo
         def convert_to_python_types(obj):
             # Si es un tipo de numpy
@@ -516,6 +730,18 @@ class PlanificadorInsulinaPersonalizado:
             },
             'fecha_generacion': timestamp
         }
+        if nombre_cgm is not None:
+            resumen['archivos_generados']['cgm'] = nombre_cgm
+        
+        # Robustez frente al ruido (si se calculó)
+        robustez = resultado.get('robustez')
+        if robustez is not None:
+            resumen['robustez'] = {
+                'n_realizaciones': robustez['n_realizaciones'],
+                'prob_hipoglucemia': robustez['prob_hipoglucemia'],
+                'prob_hipoglucemia_severa': robustez['prob_hipoglucemia_severa'],
+                'tiempo_en_rango_percentiles': robustez['tiempo_en_rango_percentiles']
+            }
         
         # 4. Guardar como JSON usando un encoder personalizado
         nombre_json = resumen['archivos_generados']['resumen']
@@ -549,92 +775,203 @@ class PlanificadorInsulinaPersonalizado:
         print(f"\nPLAN GUARDADO:")
         print(f"  • {nombre_csv} - Plan detallado (cada 30 minutos)")
         print(f"  • {nombre_json} - Resumen y recomendaciones")
+        if nombre_cgm is not None:
+            print(f"  • {nombre_cgm} - Lecturas tipo CGM")
         
-        return {
+        archivos = {
             'csv': nombre_csv,
             'json': nombre_json
         }
+        if nombre_cgm is not None:
+            archivos['cgm'] = nombre_cgm
+        return archivos
     
-    def ejecutar_planificacion_completa(self, paciente_id=None, glucosa_inicial=None):
+    def ejecutar_planificacion_completa(self, paciente_id=None, glucosa_inicial=None, n_realizaciones=1000,
+                                        semilla=None, visualizar=True):
+        
+        if semilla is not None:
+            self.rng = np.random.default_rng(semilla)
         
         # Generar plan
-        resultado = self.generar_plan_24h(paciente_id, glucosa_inicial)
+        resultado = self.generar_plan_24h(paciente_id, glucosa_inicial, n_realizaciones=n_realizaciones,
+                                          semilla=semilla)
         
         # Visualizar resultados
-        self.visualizar_plan(resultado)
+        if visualizar:
+            self.visualizar_plan(resultado)
         
         # Guardar plan
         archivos = self.guardar_plan(resultado)
         
         return resultado, archivos
 
-def main():
-    print("GENERADOR DE PLANES DE INSULINA PERSONALIZADOS")
-    print("Basado en modelo RL entrenado")
-    
-    # Configuración
-    MODELO_PATH = "Resultados/best_model/best_model.pkl"
-    DB_PATH = "Base de datos/db_diabetes_50k.csv"
-    
-    # Crear directorio para atención personalizada si no existe
-    os.makedirs('Resultados/atencion_personalizada', exist_ok=True)
-    
-    # Crear planificador
-    planificador = PlanificadorInsulinaPersonalizado(
-        modelo_path=MODELO_PATH,
-        db_path=DB_PATH
-    )
-    
-    # Opciones de ejecución
-    print("\nOpciones:")
-    print("1. Plan para paciente aleatorio")
-    print("2. Plan para paciente específico (por ID)")
-    print("3. Salir")
+    def seleccionar_cohorte(self, paciente_ids=None, filtro=None):
+        """
+        Selecciona los pacientes de un lote
+        
+        Args:
+            paciente_ids: Lista de IDs (posición en la base de datos, igual que generar_plan_24h)
+            filtro: Consulta de pandas (str) o función df -> máscara booleana
+        """
+        df = self.df_pacientes
+        
+        if paciente_ids is not None:
+            paciente_ids = np.asarray(paciente_ids, dtype=int)
+            fuera_rango = (paciente_ids < 0) | (paciente_ids >= len(df))
+            if np.any(fuera_rango):
+                print(f"Ignorando {int(np.sum(fuera_rango))} IDs fuera de rango")
+                paciente_ids = paciente_ids[~fuera_rango]
+            df = df.iloc[paciente_ids]
+        else:
+            paciente_ids = np.arange(len(df))
+        
+        if filtro is not None:
+            mascara = df.eval(filtro) if isinstance(filtro, str) else filtro(df)
+            mascara = np.asarray(mascara, dtype=bool)
+            df = df[mascara]
+            paciente_ids = paciente_ids[mascara]
+        
+        return df, paciente_ids
     
-    try:
-        opcion = input("\nSeleccione opción (1-3): ").strip()
+    def generar_planes_lote(self, paciente_ids=None, filtro=None, glucosa_inicial=None, semilla=None,
+                            nombre_base='planes_lote', guardar_por_paciente=False, visualizar=False):
+        """
+        Genera el plan de 24 horas de un lote completo de pacientes en una sola llamada
+        
+        Todos los pacientes se simulan juntos en SimuladorDiabetesVectorizado con la política
+        congelada (argmax de la Q-table). Se escribe un único archivo columnar .npz
+        (pacientes x 48 pasos de glucosa, dosis e insulina activa) y una tabla resumen CSV.
+        Los gráficos y archivos por paciente son opcionales y están desactivados por defecto.
+        
+        Args:
+            paciente_ids: Lista de IDs (None = todos los pacientes)
+            filtro: Consulta de pandas o función para filtrar la cohorte
+            glucosa_inicial: Escalar o arreglo por paciente (None = aleatoria como en generar_plan_24h)
+            semilla: Semilla del generador aleatorio del lote
+            nombre_base: Prefijo de los archivos generados
+            guardar_por_paciente: Si True, guarda además CSV/JSON de cada paciente
+            visualizar: Si True, genera además el gráfico de cada paciente
+        """
+        from simulador_vectorizado import crear_simulador_vectorizado
+        
+        print("GENERANDO PLANES DE INSULINA EN LOTE")
+        
+        df_lote, indices = self.seleccionar_cohorte(paciente_ids, filtro)
+        if len(df_lote) == 0:
+            print("No hay pacientes que cumplan los criterios")
+            return None
+        
+        print(f"  Pacientes en el lote: {len(df_lote):,}")
+        
+        # 1. Simular todos los pacientes a la vez
+        rng = np.random.default_rng(semilla)
+        if glucosa_inicial is None:
+            glucosa_inicial = self.sortear_glucosa_inicial(rng, len(df_lote))
+        simulador = crear_simulador_vectorizado(df_lote, rng=rng, minutos_paso=self.minutos_paso)
+        datos = simulador.simular_dia(self.agente.q_table, glucosa_inicial=glucosa_inicial,
+                                      registro=self.registro_trayectorias)
+        
+        # 2. Métricas por paciente (vectorizadas)
+        glucosas = datos['glucosa']
+        resumen = pd.DataFrame({
+            'paciente_idx': indices,
+            'id': simulador.paciente_ids,
+            'glucosa_inicial': glucosas[:, 0],
+            'tiempo_en_rango': np.mean((glucosas >= 70) & (glucosas <= 180), axis=1) * 100,
+            'hipoglucemias': np.mean(glucosas < 70, axis=1) * 100,
+            'hiperglucemias': np.mean(glucosas > 180, axis=1) * 100,
+            'glucosa_promedio': np.mean(glucosas, axis=1),
+            'dosis_total': np.sum(datos['dosis'], axis=1, dtype=np.int64),
+            'recompensa_total': datos['recompensa_total']
+        })
         
-        if opcion == '1':
-            # Paciente aleatorio
-            resultado, archivos = planificador.ejecutar_planificacion_completa()
-            
-        elif opcion == '2':
-            # Paciente específico
-            try:
-                paciente_id = int(input("Ingrese ID del paciente (0-49999): "))
-                if 0 <= paciente_id < 50000:
-                    glucosa_inicial = input("Glucosa inicial (dejar vacío para aleatoria): ").strip()
-                    if glucosa_inicial:
-                        glucosa_inicial = float(glucosa_inicial)
-                    else:
-                        glucosa_inicial = None
-                    
-                    resultado, archivos = planificador.ejecutar_planificacion_completa(
-                        paciente_id=paciente_id,
-                        glucosa_inicial=glucosa_inicial
-                    )
-                else:
-                    print("ID fuera de rango. Usando paciente aleatorio.")
-                    resultado, archivos = planificador.ejecutar_planificacion_completa()
-            except ValueError:
-                print("Entrada inválida. Usando paciente aleatorio.")
-                resultado, archivos = planificador.ejecutar_planificacion_completa()
+        print(f"  Tiempo en rango promedio: {resumen['tiempo_en_rango'].mean():.1f}%")
+        print(f"  Hipoglucemias promedio: {resumen['hipoglucemias'].mean():.1f}%")
+        print(f"  Hiperglucemias promedio: {resumen['hiperglucemias'].mean():.1f}%")
         
-        elif opcion == '3':
-            print("Saliendo...")
-            return
+        # 3. Guardar salida columnar y resumen
+        os.makedirs('Resultados/atencion_personalizada', exist_ok=True)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         
-        else:
-            print("Opción no válida. Usando paciente aleatorio.")
-            resultado, archivos = planificador.ejecutar_planificacion_completa()
+        nombre_npz = f"Resultados/atencion_personalizada/{nombre_base}_{timestamp}.npz"
+        # Con pasos de menos de 30 minutos se agregan las lecturas tipo CGM (después de cada sub-paso)
+        lecturas_cgm = {'glucosa_cgm': datos['glucosa_cgm']} if simulador.sub_pasos > 1 else {}
+        np.savez_compressed(
+            nombre_npz,
+            paciente_idx=indices,
+            id=simulador.paciente_ids,
+            hora=np.arange(glucosas.shape[1]) * 0.5,
+            glucosa=glucosas,
+            dosis=datos['dosis'],
+            insulina_activa=datos['insulina_activa'],
+            **lecturas_cgm
+        )
+        
+        nombre_csv = f"Resultados/atencion_personalizada/{nombre_base}_resumen_{timestamp}.csv"
+        resumen.to_csv(nombre_csv, index=False, encoding='utf-8')
+        
+        print(f"\nPLANES GUARDADOS:")
+        print(f"  • {nombre_npz} - Trayectorias (pacientes x 48 pasos)")
+        print(f"  • {nombre_csv} - Resumen por paciente")
+        
+        # 4. Archivos y gráficos por paciente (opcionales)
+        if guardar_por_paciente or visualizar:
+            for fila in range(len(df_lote)):
+                resultado = self._resultado_individual_lote(df_lote.iloc[fila].to_dict(), datos, resumen, fila)
+                if visualizar:
+                    self.visualizar_plan(resultado)
+                if guardar_por_paciente:
+                    self.guardar_plan(resultado)
+        
+        return {
+            'resumen': resumen,
+            'datos': datos,
+            'archivos': {'npz': nombre_npz, 'csv': nombre_csv}
+        }
+    
+    def _resultado_individual_lote(self, paciente_data, datos, resumen, fila):
+        """Construye el resultado de un paciente del lote con el formato de generar_plan_24h"""
+        estados = datos['estado_idx'][fila]
+        
+        # Decodificar índice de estado: g*60 + i*12 + t*3 + s
+        categorias_glucosa = ["<70", "70-180", "180-250", ">250"]
+        categorias_tiempo = ["0-60", "60-120", "120-240", ">240"]
+        categorias_sensibilidad = ["baja", "normal", "alta"]
+        descripciones = [
+            f"G:{categorias_glucosa[e // 60]}, I:{(e % 60) // 12 * 5}U, "
+            f"T:{categorias_tiempo[(e % 12) // 3]}, S:{categorias_sensibilidad[e % 3]}"
+            for e in estados.tolist()
+        ]
         
-        print("PROCESO COMPLETADO EXITOSAMENTE")
+        datos_dia = {
+            'hora': (np.arange(len(estados)) * 0.5).tolist(),
+            'glucosa': datos['glucosa'][fila].tolist(),
+            'dosis_recomendada': datos['dosis'][fila].tolist(),
+            'accion_idx': datos['accion_idx'][fila].tolist(),
+            'insulina_activa': datos['insulina_activa'][fila].tolist(),
+            'estado_descripcion': descripciones,
+            'glucosa_cgm': datos['glucosa_cgm'][fila].reshape(len(estados), -1).tolist()
+        }
         
-    except Exception as e:
-        print(f"\nError durante la planificación: {e}")
-        import traceback
-        traceback.print_exc()
+        metricas = resumen.iloc[fila]
+        return {
+            'paciente_data': paciente_data,
+            'datos_dia': datos_dia,
+            'simulador': None,
+            'metricas': {
+                'tiempo_en_rango': metricas['tiempo_en_rango'],
+                'hipoglucemias': metricas['hipoglucemias'],
+                'hiperglucemias': metricas['hiperglucemias'],
+                'glucosa_promedio': metricas['glucosa_promedio'],
+                'dosis_total': metricas['dosis_total']
+            }
+        }
+
+def main(argv=None):
+    # Mismo flujo que "python cli.py plan" (sin menú interactivo)
+    from cli import main as cli_main
+    return cli_main(['plan'] + list(sys.argv[1:] if argv is None else argv))
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(perfilado.ejecutar(main, 'plan_insulina'))
\ No newline at end of file
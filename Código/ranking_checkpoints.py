@@ -0,0 +1,225 @@
+import glob
+import os
+import pickle
+import sys
+from datetime import datetime
+import numpy as np
+from evaluacion_panel import seleccionar_panel, evaluar_politicas, resumir_metricas, huella_politica, METRICAS
+import perfilado
+
+# Ranking de checkpoints y modelos guardados.
+#
+# Carga todos los checkpoints (o cualquier conjunto de archivos de modelo), agrupa los
+# que tienen la misma política greedy y simula cada política distinta una sola vez,
+# sobre el mismo panel de pacientes y con el mismo ruido. El panel se divide en lotes
+# con semilla fija por lote, así el resultado no depende del número de procesos.
+#
+# Con analitico=True todas las políticas se puntúan primero con el modelo de
+# transiciones (modelo_transiciones.py, sin simulación) y solo las `confirmar` mejores
+# se simulan en el panel; el resto queda ordenado por la puntuación analítica.
+
+PATRON_CHECKPOINTS = os.path.join('Resultados', 'checkpoints', 'checkpoint_*.pkl')
+
+
+def cargar_q_tables(rutas):
+    """
+    Lee las Q-tables de una lista de archivos
+    
+    Acepta .pkl de AgenteQLearning (best_model.pkl), .pkl de checkpoint (dict con
+    'q_table') y .npy con una Q-table (240, 4) o varias apiladas (K, 240, 4),
+    como las del barrido de hiperparámetros.
+    
+    Returns:
+        lista de dicts con 'modelo' (etiqueta), 'archivo', 'checkpoint_numero' y 'q_table'
+    """
+    modelos = []
+    for ruta in rutas:
+        if ruta.endswith('.npy'):
+            datos = np.load(ruta)
+            if datos.ndim == 2:
+                modelos.append({'modelo': os.path.basename(ruta), 'archivo': ruta,
+                                'checkpoint_numero': None, 'q_table': datos})
+            else:
+                for i, q_table in enumerate(datos):
+                    modelos.append({'modelo': f"{os.path.basename(ruta)}[{i}]", 'archivo': ruta,
+                                    'checkpoint_numero': None, 'q_table': q_table})
+            continue
+        
+        with open(ruta, 'rb') as f:
+            datos = pickle.load(f)
+        if isinstance(datos, dict):
+            q_table = datos['q_table']
+            checkpoint_numero = datos.get('checkpoint_numero')
+        else:
+            q_table = datos.q_table
+            checkpoint_numero = datos.metadata.get('mejor_checkpoint')
+        modelos.append({'modelo': os.path.basename(ruta), 'archivo': ruta,
+                        'checkpoint_numero': checkpoint_numero, 'q_table': np.asarray(q_table)})
+    
+    return modelos
+
+
+def _evaluar_lote_proceso(q_tables, lote, n_episodios, semilla):
+    """Evalúa todas las políticas sobre un lote del panel (en un proceso aparte)"""
+    return evaluar_politicas(q_tables, lote, n_episodios=n_episodios, semilla=semilla)
+
+
+def evaluar_en_panel(q_tables, panel, n_episodios=1, n_workers=1, tamano_lote=250, semilla=0):
+    """
+    Evalúa las Q-tables sobre el panel por lotes de pacientes (lote i usa semilla + i)
+    
+    Returns:
+        dict métrica -> arreglo (K, n_pacientes), igual que evaluar_politicas
+    """
+    lotes = [panel.iloc[i:i + tamano_lote] for i in range(0, len(panel), tamano_lote)]
+    
+    if n_workers <= 1 or len(lotes) == 1:
+        partes = [evaluar_politicas(q_tables, lote, n_episodios=n_episodios, semilla=semilla + i)
+                  for i, lote in enumerate(lotes)]
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            futuros = [executor.submit(_evaluar_lote_proceso, q_tables, lote, n_episodios, semilla + i)
+                       for i, lote in enumerate(lotes)]
+            partes = [futuro.result() for futuro in futuros]
+    
+    return {metrica: np.concatenate([parte[metrica] for parte in partes], axis=1) for metrica in METRICAS}
+
+
+def ejecutar_ranking(rutas, db_path, pacientes_panel=1000, episodios_panel=1, n_workers=1, tamano_lote=250,
+                     semilla=0, directorio='Resultados/ranking', analitico=False, confirmar=20):
+    """
+    Evalúa los modelos en un panel común y guarda una tabla ordenada por puntuación
+    
+    Args:
+        analitico: Preseleccionar con el modelo de transiciones y simular solo las
+                   `confirmar` mejores políticas
+    
+    Returns:
+        dict con el ranking (lista de dicts, mejor primero) y el archivo CSV generado
+    """
+    import pandas as pd
+    
+    if semilla is None:
+        semilla = 0
+    
+    modelos = cargar_q_tables(rutas)
+    if not modelos:
+        print("No se encontraron modelos para evaluar")
+        return None
+    
+    # Una evaluación por política greedy distinta
+    politicas = {}
+    for modelo in modelos:
+        modelo['politica'] = huella_politica(modelo['q_table'])
+        politicas.setdefault(modelo['politica'], []).append(modelo)
+    huellas = list(politicas)
+    q_tables = np.stack([politicas[huella][0]['q_table'] for huella in huellas])
+    
+    df_pacientes = pd.read_csv(db_path)
+    panel = seleccionar_panel(df_pacientes, pacientes_panel, semilla=semilla)
+    
+    print(f"\nRANKING DE MODELOS: {len(modelos)} archivos, {len(huellas)} políticas distintas")
+    print(f"   - Panel: {len(panel)} pacientes x {episodios_panel} episodios (semilla {semilla})")
+    print(f"   - Procesos: {n_workers} (lotes de {tamano_lote} pacientes)")
+    
+    if analitico:
+        resumen = _preseleccion_analitica(q_tables, huellas, df_pacientes)
+        simuladas = sorted(huellas, key=lambda h: resumen[h]['puntuacion_analitica'], reverse=True)[:confirmar]
+        print(f"   - Evaluación analítica de {len(huellas)} políticas; se simulan las {len(simuladas)} mejores")
+    else:
+        resumen = {}
+        simuladas = huellas
+    
+    indices = [huellas.index(huella) for huella in simuladas]
+    metricas = evaluar_en_panel(q_tables[indices], panel, n_episodios=episodios_panel, n_workers=n_workers,
+                                tamano_lote=tamano_lote, semilla=semilla)
+    for huella, fila in zip(simuladas, resumir_metricas(metricas)):
+        resumen[huella] = {**resumen.get(huella, {}), **fila, 'evaluacion': 'simulada'}
+    
+    ranking = []
+    for modelo in modelos:
+        iguales = politicas[modelo['politica']]
+        ranking.append({
+            'modelo': modelo['modelo'],
+            'archivo': modelo['archivo'],
+            'checkpoint_numero': modelo['checkpoint_numero'],
+            'politica': modelo['politica'],
+            'misma_politica_que': iguales[0]['modelo'] if iguales[0] is not modelo else '',
+            **resumen[modelo['politica']]
+        })
+    # Primero las simuladas (por puntuación en el panel), después las solo analíticas
+    ranking.sort(key=lambda fila: (fila['evaluacion'] == 'simulada', fila['puntuacion']), reverse=True)
+    for posicion, fila in enumerate(ranking, start=1):
+        fila['posicion'] = posicion
+    
+    os.makedirs(directorio, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    archivo_ranking = os.path.join(directorio, f"ranking_modelos_{timestamp}.csv")
+    columnas = ['posicion', 'modelo', 'checkpoint_numero', 'politica', 'misma_politica_que', 'puntuacion',
+                'puntuacion_ic_inf', 'puntuacion_ic_sup', 'tiempo_en_rango', 'hipoglucemias',
+                'hiperglucemias', 'glucosa_promedio', 'recompensas', 'archivo']
+    if analitico:
+        columnas[6:6] = ['evaluacion', 'puntuacion_analitica']
+    pd.DataFrame(ranking)[columnas].to_csv(archivo_ranking, index=False)
+    
+    print(f"\n   {'#':>3} {'modelo':<28} {'puntuación (IC95)':>22} {'TIR':>6} {'hipo':>5}")
+    for fila in ranking[:20]:
+        duplicado = f"  = {fila['misma_politica_que']}" if fila['misma_politica_que'] else ''
+        if fila['evaluacion'] == 'analitica':
+            duplicado += "  (analítica)"
+        print(f"   {fila['posicion']:>3} {fila['modelo']:<28} {fila['puntuacion']:>8.1f} "
+              f"({fila['puntuacion_ic_inf']:.1f}-{fila['puntuacion_ic_sup']:.1f}) "
+              f"{fila['tiempo_en_rango']:>5.1f}% {fila['hipoglucemias']:>4.1f}%{duplicado}")
+    print(f"\n   - Ranking: {archivo_ranking}")
+    
+    return {
+        'modelos': len(modelos),
+        'politicas_distintas': len(huellas),
+        'politicas_simuladas': len(simuladas),
+        'pacientes_panel': len(panel),
+        'semilla': semilla,
+        'ranking': ranking,
+        'archivos': {'ranking': archivo_ranking}
+    }
+
+
+def _preseleccion_analitica(q_tables, huellas, df_pacientes):
+    """Métricas del modelo de transiciones (con las columnas del ranking) por política"""
+    from modelo_transiciones import ModeloTransiciones
+    
+    modelo = ModeloTransiciones.obtener(df_pacientes)
+    analiticas = modelo.evaluar_politicas(q_tables)
+    
+    resumen = {}
+    for i, huella in enumerate(huellas):
+        puntuacion = float(analiticas['puntuacion_compuesta'][i])
+        resumen[huella] = {
+            'evaluacion': 'analitica',
+            'puntuacion_analitica': puntuacion,
+            'puntuacion': puntuacion,
+            'puntuacion_ic_inf': puntuacion,
+            'puntuacion_ic_sup': puntuacion,
+            'tiempo_en_rango': float(analiticas['tiempo_en_rango_prom'][i]),
+            'hipoglucemias': float(analiticas['hipoglucemias_prom'][i]),
+            'hiperglucemias': float(analiticas['hiperglucemias_prom'][i]),
+            'glucosa_promedio': float(analiticas['glucosa_prom'][i]),
+            'recompensas': float(analiticas['recompensa_prom'][i])
+        }
+    return resumen
+
+
+def rutas_por_defecto():
+    """Todos los checkpoints guardados, en orden"""
+    return sorted(glob.glob(PATRON_CHECKPOINTS))
+
+
+def main(argv=None):
+    # Mismo flujo que "python cli.py rank"
+    from cli import main as cli_main
+    return cli_main(['rank'] + list(sys.argv[1:] if argv is None else argv))
+
+
+if __name__ == "__main__":
+    sys.exit(perfilado.ejecutar(main, 'ranking_checkpoints'))
@@ -0,0 +1,217 @@
+import glob
+import json
+import os
+import numpy as np
+
+# Registro compacto de trayectorias (entrenamiento, evaluación y planes).
+#
+# Cada paso simulado es un registro de ancho fijo (DTYPE_TRAYECTORIA, 20 bytes). Los
+# registros se acumulan en memoria y se vuelcan en bloques binarios de
+# `registros_por_bloque` registros (trayectorias_00000.bin, ...); indice.json lista los
+# bloques con su cantidad de registros y rango de pacientes. Los bloques se leen con
+# np.memmap sin cargarlos en memoria (ver abrir_trayectorias / leer_trayectorias).
+#
+# Los bucles solo llaman a agregar cuando hay un registro activo, así que desactivado
+# no agrega ningún costo.
+
+DTYPE_TRAYECTORIA = np.dtype([
+    ('paciente', '<i4'),         # id del paciente en la base de datos
+    ('episodio', '<u2'),         # episodio del paciente (0 en los planes)
+    ('paso', '<u2'),             # paso de 30 minutos dentro del episodio
+    ('estado', 'u1'),            # índice de estado en que se eligió la acción (0-239)
+    ('accion', 'u1'),            # índice de acción (0-3)
+    ('recompensa', '<f2'),
+    ('glucosa', '<f4'),          # glucosa después del paso (mg/dL)
+    ('insulina_activa', '<f2'),  # insulina activa después del paso (U)
+    ('probabilidad', '<f2')      # probabilidad de la acción en la política que la eligió (1 = greedy)
+])
+
+ARCHIVO_INDICE = 'indice.json'
+
+
+class RegistroTrayectorias:
+    """
+    Escribe registros de paso en bloques binarios de ancho fijo
+    
+    Si el directorio ya tiene un índice, los bloques nuevos se agregan a continuación.
+    Usar con `with` o llamar a cerrar() para volcar el último bloque.
+    """
+    
+    def __init__(self, directorio, registros_por_bloque=1_000_000, origen=None):
+        self.directorio = directorio
+        self.registros_por_bloque = registros_por_bloque
+        self.origen = origen
+        self._buffer = np.zeros(registros_por_bloque, dtype=DTYPE_TRAYECTORIA)
+        self._n = 0
+        
+        os.makedirs(directorio, exist_ok=True)
+        self.indice = cargar_indice(directorio)
+        if self.indice is not None and self.indice['dtype'] != [list(campo) for campo in DTYPE_TRAYECTORIA.descr]:
+            raise ValueError(f"{directorio} tiene registros con otro formato; usar un directorio nuevo")
+        self.indice = self.indice or {
+            'dtype': [list(campo) for campo in DTYPE_TRAYECTORIA.descr],
+            'bytes_por_registro': DTYPE_TRAYECTORIA.itemsize,
+            'total_registros': 0,
+            'bloques': []
+        }
+    
+    def agregar(self, paciente, episodio, paso, estado, accion, recompensa, glucosa, insulina_activa,
+                probabilidad=1.0):
+        """Agrega el registro de un paso"""
+        self._buffer[self._n] = (paciente, episodio, paso, estado, accion, recompensa, glucosa, insulina_activa,
+                                 probabilidad)
+        self._n += 1
+        if self._n == self.registros_por_bloque:
+            self._volcar()
+    
+    def agregar_lote(self, paciente, episodio, paso, estado, accion, recompensa, glucosa, insulina_activa,
+                     probabilidad=1.0):
+        """Agrega un registro por elemento (arreglos del mismo largo; los escalares se repiten)"""
+        campos = (paciente, episodio, paso, estado, accion, recompensa, glucosa, insulina_activa, probabilidad)
+        n = np.broadcast(*campos).size
+        campos = [np.broadcast_to(valores, (n,)) for valores in campos]
+        
+        inicio = 0
+        while inicio < n:
+            cantidad = min(n - inicio, self.registros_por_bloque - self._n)
+            destino = self._buffer[self._n:self._n + cantidad]
+            for nombre, valores in zip(DTYPE_TRAYECTORIA.names, campos):
+                destino[nombre] = valores[inicio:inicio + cantidad]
+            self._n += cantidad
+            inicio += cantidad
+            if self._n == self.registros_por_bloque:
+                self._volcar()
+    
+    def _volcar(self):
+        """Escribe los registros acumulados como un bloque nuevo y actualiza el índice"""
+        if self._n == 0:
+            return
+        registros = self._buffer[:self._n]
+        archivo = f"trayectorias_{len(self.indice['bloques']):05d}.bin"
+        registros.tofile(os.path.join(self.directorio, archivo))
+        
+        self.indice['bloques'].append({
+            'archivo': archivo,
+            'registros': int(self._n),
+            'paciente_min': int(registros['paciente'].min()),
+            'paciente_max': int(registros['paciente'].max()),
+            'origen': self.origen
+        })
+        self.indice['total_registros'] += int(self._n)
+        with open(os.path.join(self.directorio, ARCHIVO_INDICE), 'w', encoding='utf-8') as f:
+            json.dump(self.indice, f, indent=2)
+        self._n = 0
+    
+    def cerrar(self):
+        self._volcar()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.cerrar()
+        return False
+
+
+def cargar_indice(directorio):
+    """Índice de un directorio de trayectorias (None si no existe)"""
+    ruta = os.path.join(directorio, ARCHIVO_INDICE)
+    if not os.path.exists(ruta):
+        return None
+    with open(ruta, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def abrir_trayectorias(directorio, pacientes=None):
+    """
+    Bloques del directorio (y de sus subdirectorios, p. ej. uno por proceso) como np.memmap
+    
+    Args:
+        pacientes: Rango (min, max) de ids; se omiten los bloques que no lo cruzan
+    
+    Returns:
+        lista de arreglos memmap, en orden, con el dtype guardado en el índice
+        (DTYPE_TRAYECTORIA, o el de la versión que escribió el registro)
+    """
+    rutas_indice = sorted(glob.glob(os.path.join(directorio, '**', ARCHIVO_INDICE), recursive=True))
+    bloques = []
+    for ruta_indice in rutas_indice:
+        base = os.path.dirname(ruta_indice)
+        with open(ruta_indice, encoding='utf-8') as f:
+            indice = json.load(f)
+        dtype = np.dtype([tuple(campo) for campo in indice['dtype']])
+        for bloque in indice['bloques']:
+            if pacientes is not None and (bloque['paciente_max'] < pacientes[0] or bloque['paciente_min'] > pacientes[1]):
+                continue
+            bloques.append(np.memmap(os.path.join(base, bloque['archivo']), dtype=dtype,
+                                     mode='r', shape=(bloque['registros'],)))
+    return bloques
+
+
+def leer_trayectorias(directorio, pacientes=None):
+    """
+    Registros del directorio en un solo arreglo (filtrados por rango de pacientes)
+    
+    Para volúmenes que no caben en memoria, recorrer abrir_trayectorias bloque a bloque.
+    """
+    partes = []
+    for bloque in abrir_trayectorias(directorio, pacientes):
+        if pacientes is not None:
+            bloque = bloque[(bloque['paciente'] >= pacientes[0]) & (bloque['paciente'] <= pacientes[1])]
+        partes.append(np.asarray(bloque))
+    if not partes:
+        return np.zeros(0, dtype=DTYPE_TRAYECTORIA)
+    return np.concatenate(partes)
+
+
+def _tramos(datos):
+    """Inicio y largo de los tramos de pasos consecutivos del mismo paciente y episodio"""
+    corte = np.flatnonzero((datos['paciente'][1:] != datos['paciente'][:-1])
+                           | (datos['episodio'][1:] != datos['episodio'][:-1])
+                           | (datos['paso'][1:] != datos['paso'][:-1] + 1)) + 1
+    inicio = np.append(0, corte)
+    return inicio, np.diff(np.append(inicio, len(datos)))
+
+
+def leer_episodios(directorio, pasos_por_episodio=48, descartados=None):
+    """
+    Recorre los episodios completos del directorio, bloque a bloque
+    
+    Un episodio está completo si tiene los pasos 0..pasos_por_episodio-1 seguidos del
+    mismo paciente y episodio. Los bloques escritos paso a paso (entrenamiento,
+    evaluación) ya vienen agrupados; los escritos por lote se ordenan primero. Un
+    episodio repartido entre dos bloques seguidos se une; los incompletos se descartan
+    (se cuentan en descartados['registros']).
+    
+    Yields:
+        arreglos (E, pasos_por_episodio) de registros, ordenados por paso
+    """
+    if descartados is None:
+        descartados = {}
+    descartados.setdefault('registros', 0)
+    
+    bloques = abrir_trayectorias(directorio)
+    pendientes = np.zeros(0, dtype=bloques[0].dtype) if bloques else None
+    for i, bloque in enumerate(bloques):
+        n_pendientes = len(pendientes)
+        datos = np.concatenate([pendientes, np.asarray(bloque)])
+        arrastrado = np.arange(len(datos)) < n_pendientes
+        
+        inicio, tamano = _tramos(datos)
+        # Solo el último tramo puede quedar incompleto si el bloque viene agrupado
+        if np.any(tamano[:-1] != pasos_por_episodio):
+            orden = np.lexsort((datos['paso'], datos['episodio'], datos['paciente']))
+            datos = datos[orden]
+            arrastrado = arrastrado[orden]
+            inicio, tamano = _tramos(datos)
+        
+        completo = (tamano == pasos_por_episodio) & (datos['paso'][inicio] == 0)
+        # Incompletos: se reintentan con el bloque siguiente si aún no venían arrastrados
+        reintentar = (~completo & (tamano < pasos_por_episodio)
+                      & ~np.logical_or.reduceat(arrastrado, inicio) & (i < len(bloques) - 1))
+        
+        pendientes = datos[np.repeat(reintentar, tamano)]
+        episodios = datos[np.repeat(completo, tamano)].reshape(-1, pasos_por_episodio)
+        descartados['registros'] += int(len(datos) - len(pendientes) - episodios.size)
+        if len(episodios):
+            yield episodios
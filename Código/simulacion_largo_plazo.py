@@ -0,0 +1,215 @@
+import os
+import sys
+import time
+import numpy as np
+from evaluacion_panel import seleccionar_panel
+from simulador_diabetes_rl import PASOS_POR_DIA, generador_derivado, parametros_resolucion
+from simulador_vectorizado import crear_simulador_vectorizado
+import perfilado
+
+# Simulación de varios días seguidos por paciente (semanas o meses) con la política greedy.
+#
+# El estado del paciente (glucosa, insulina activa, tiempo desde la dosis) pasa de un día
+# al siguiente y las comidas se repiten cada día. Los pacientes se simulan en lotes con
+# SimuladorDiabetesVectorizado y no se guarda ninguna lectura: por paso solo se suman
+# contadores del día por paciente, que al cerrar cada día se agregan a
+#   por_dia       (n_dias,)  tiempo en rango, hipo/hiperglucemias y glucosa media de todos
+#   por_paciente  (N,)       totales, GMI de la primera y la última ventana de días
+# La memoria depende del tamaño de lote y de N, no de la cantidad de días.
+#
+# Con minutos_paso < 30 las métricas de glucosa cuentan las lecturas tipo CGM de cada
+# sub-paso (p. ej. 288 por día con 5 minutos); las decisiones siguen siendo cada 30 minutos.
+#
+# GMI (Glucose Management Indicator, HbA1c estimada) = 3.31 + 0.02392 · glucosa media.
+
+CAMPOS_DIA = ('en_rango', 'hipoglucemias', 'hiperglucemias', 'hipoglucemias_severas', 'glucosa', 'dosis')
+
+
+def gmi(glucosa_media):
+    """GMI (%) a partir de la glucosa media (mg/dL)"""
+    return 3.31 + 0.02392 * np.asarray(glucosa_media)
+
+
+def simular_largo_plazo(q_table, df_pacientes, n_dias=90, tamano_lote=10_000, semilla=0, ventana_gmi=14,
+                        minutos_paso=30):
+    """
+    Simula n_dias seguidos por paciente con la política greedy de la Q-table
+    
+    Args:
+        tamano_lote: Pacientes simulados a la vez (fija la memoria de trabajo)
+        semilla: Cada lote usa generador_derivado(semilla, posición de su primer paciente)
+        ventana_gmi: Días de las ventanas inicial y final del GMI de cada paciente (a lo sumo
+                     la mitad de n_dias, para que no se superpongan)
+        minutos_paso: Resolución de la simulación y de las lecturas de glucosa (5, 10, 15 o 30)
+    
+    Returns:
+        dict con 'por_dia' y 'por_paciente' (DataFrames) y 'resumen'
+    """
+    import pandas as pd
+    
+    politica = np.argmax(q_table, axis=1)
+    n = len(df_pacientes)
+    ventana = max(1, min(ventana_gmi, n_dias // 2))
+    lecturas_dia = PASOS_POR_DIA * parametros_resolucion(minutos_paso)[0]
+    lecturas_totales = n_dias * lecturas_dia
+    
+    # Sumas de todos los pacientes por día y de todos los días por paciente
+    por_dia = {campo: np.zeros(n_dias) for campo in CAMPOS_DIA}
+    por_paciente = {campo: np.zeros(n) for campo in CAMPOS_DIA}
+    glucosa_cuadrados = np.zeros(n)
+    glucosa_inicio = np.zeros(n)
+    glucosa_final = np.zeros(n)
+    dias_hipo_severa = np.zeros(n, dtype=np.int64)
+    
+    for inicio in range(0, n, tamano_lote):
+        lote = df_pacientes.iloc[inicio:inicio + tamano_lote]
+        filas = slice(inicio, inicio + len(lote))
+        simulador = crear_simulador_vectorizado(lote, rng=generador_derivado(semilla, inicio), dias=n_dias,
+                                                minutos_paso=minutos_paso)
+        dosis_accion = simulador.acciones.astype(float)
+        estados = simulador.reset()
+        
+        for dia in range(n_dias):
+            dia_lote = {campo: np.zeros(len(lote)) for campo in CAMPOS_DIA}
+            cuadrados = np.zeros(len(lote))
+            for _ in range(PASOS_POR_DIA):
+                acciones = politica[estados]
+                estados, _, _ = simulador.step(acciones)
+                dia_lote['dosis'] += dosis_accion[acciones]
+                for glucosa in simulador.lecturas_cgm:  # una fila por sub-paso
+                    dia_lote['en_rango'] += (glucosa >= 70) & (glucosa <= 180)
+                    dia_lote['hipoglucemias'] += glucosa < 70
+                    dia_lote['hiperglucemias'] += glucosa > 180
+                    dia_lote['hipoglucemias_severas'] += glucosa < 60
+                    dia_lote['glucosa'] += glucosa
+                    cuadrados += glucosa * glucosa
+            
+            for campo in CAMPOS_DIA:
+                por_dia[campo][dia] += dia_lote[campo].sum()
+                por_paciente[campo][filas] += dia_lote[campo]
+            glucosa_cuadrados[filas] += cuadrados
+            dias_hipo_severa[filas] += dia_lote['hipoglucemias_severas'] > 0
+            if dia < ventana:
+                glucosa_inicio[filas] += dia_lote['glucosa']
+            if dia >= n_dias - ventana:
+                glucosa_final[filas] += dia_lote['glucosa']
+    
+    lecturas_poblacion = n * lecturas_dia
+    tabla_dias = pd.DataFrame({
+        'dia': np.arange(1, n_dias + 1),
+        'tiempo_en_rango': por_dia['en_rango'] / lecturas_poblacion * 100,
+        'hipoglucemias': por_dia['hipoglucemias'] / lecturas_poblacion * 100,
+        'hiperglucemias': por_dia['hiperglucemias'] / lecturas_poblacion * 100,
+        'hipoglucemias_severas': por_dia['hipoglucemias_severas'] / lecturas_poblacion * 100,
+        'glucosa_media': por_dia['glucosa'] / lecturas_poblacion,
+        'dosis_diaria': por_dia['dosis'] / n
+    })
+    # GMI de la población con la glucosa media de los últimos `ventana` días
+    tabla_dias['gmi_movil'] = gmi(tabla_dias['glucosa_media'].rolling(ventana, min_periods=1).mean())
+    
+    glucosa_media = por_paciente['glucosa'] / lecturas_totales
+    desviacion = np.sqrt(np.maximum(glucosa_cuadrados / lecturas_totales - glucosa_media ** 2, 0))
+    gmi_inicio = gmi(glucosa_inicio / (ventana * lecturas_dia))
+    gmi_final = gmi(glucosa_final / (ventana * lecturas_dia))
+    ids = df_pacientes['id'].to_numpy() if 'id' in df_pacientes.columns else np.arange(n)
+    tabla_pacientes = pd.DataFrame({
+        'id': ids,
+        'glucosa_media': glucosa_media,
+        'cv': desviacion / glucosa_media * 100,
+        'gmi': gmi(glucosa_media),
+        'gmi_inicio': gmi_inicio,
+        'gmi_final': gmi_final,
+        'deriva_gmi': gmi_final - gmi_inicio,
+        'tiempo_en_rango': por_paciente['en_rango'] / lecturas_totales * 100,
+        'hipoglucemias': por_paciente['hipoglucemias'] / lecturas_totales * 100,
+        'hiperglucemias': por_paciente['hiperglucemias'] / lecturas_totales * 100,
+        'dias_hipo_severa': dias_hipo_severa,
+        'dosis_diaria': por_paciente['dosis'] / n_dias
+    })
+    
+    resumen = {
+        'pacientes': n,
+        'dias': n_dias,
+        'minutos_paso': minutos_paso,
+        'ventana_gmi': ventana,
+        'tiempo_en_rango': float(tabla_pacientes['tiempo_en_rango'].mean()),
+        'hipoglucemias': float(tabla_pacientes['hipoglucemias'].mean()),
+        'hiperglucemias': float(tabla_pacientes['hiperglucemias'].mean()),
+        'gmi_medio': float(tabla_pacientes['gmi'].mean()),
+        'deriva_gmi_media': float(tabla_pacientes['deriva_gmi'].mean()),
+        'pacientes_gmi_sobre_7': float(np.mean(tabla_pacientes['gmi'] > 7) * 100),
+        'pacientes_con_hipo_severa': float(np.mean(dias_hipo_severa > 0) * 100)
+    }
+    
+    return {'por_dia': tabla_dias, 'por_paciente': tabla_pacientes, 'resumen': resumen}
+
+
+def ejecutar_simulacion_largo_plazo(modelo_path, db_path, n_pacientes=None, n_dias=90, tamano_lote=10_000,
+                                    semilla=None, ventana_gmi=14, salida=None, minutos_paso=30):
+    """
+    Simula un modelo (.pkl/.npy) durante n_dias por paciente y muestra el resumen semanal
+    
+    Args:
+        n_pacientes: Pacientes de la base (muestra con la semilla; None = todos)
+        salida: CSV donde guardar las métricas por paciente (None = no se guarda)
+    
+    Returns:
+        dict con el resumen, las métricas por día y el tiempo de la corrida
+    """
+    import pandas as pd
+    from ranking_checkpoints import cargar_q_tables
+    
+    if semilla is None:
+        semilla = 0
+    q_table = cargar_q_tables([modelo_path])[0]['q_table']
+    df_pacientes = pd.read_csv(db_path)
+    if n_pacientes is not None:
+        df_pacientes = seleccionar_panel(df_pacientes, n_pacientes, semilla=semilla)
+    
+    inicio = time.perf_counter()
+    resultado = simular_largo_plazo(q_table, df_pacientes, n_dias=n_dias, tamano_lote=tamano_lote,
+                                    semilla=semilla, ventana_gmi=ventana_gmi, minutos_paso=minutos_paso)
+    tiempo = time.perf_counter() - inicio
+    resumen = resultado['resumen']
+    por_dia = resultado['por_dia']
+    
+    print(f"\nSIMULACIÓN DE {n_dias} DÍAS: {modelo_path}")
+    print(f"   - {resumen['pacientes']:,} pacientes x {n_dias} días ({tiempo:.1f} s, "
+          f"{resumen['pacientes'] * n_dias * PASOS_POR_DIA / tiempo:,.0f} pasos/s, semilla {semilla})")
+    if minutos_paso != 30:
+        print(f"   - Lecturas de glucosa cada {minutos_paso} minutos (decisiones cada 30)")
+    print(f"\n   {'días':<9} {'en rango':>9} {'hipo':>7} {'hiper':>7} {'glucosa':>9} {'GMI móvil':>10}")
+    for semana in range(0, n_dias, 7):
+        dias = por_dia.iloc[semana:semana + 7]
+        print(f"   {semana + 1:>3}-{semana + len(dias):<5} {dias['tiempo_en_rango'].mean():>8.1f}% "
+              f"{dias['hipoglucemias'].mean():>6.2f}% {dias['hiperglucemias'].mean():>6.1f}% "
+              f"{dias['glucosa_media'].mean():>9.1f} {dias['gmi_movil'].iloc[-1]:>9.2f}%")
+    
+    print(f"\n   - GMI medio: {resumen['gmi_medio']:.2f}% (deriva primera -> última ventana de "
+          f"{resumen['ventana_gmi']} días: {resumen['deriva_gmi_media']:+.3f})")
+    print(f"   - Pacientes con GMI > 7%: {resumen['pacientes_gmi_sobre_7']:.1f}%")
+    print(f"   - Pacientes con algún día de hipoglucemia severa: {resumen['pacientes_con_hipo_severa']:.1f}%")
+    
+    if salida is not None:
+        os.makedirs(os.path.dirname(salida) or '.', exist_ok=True)
+        resultado['por_paciente'].to_csv(salida, index=False)
+        print(f"   - Métricas por paciente: {salida}")
+    
+    return {
+        'modelo': modelo_path,
+        'tiempo_s': tiempo,
+        'semilla': semilla,
+        'resumen': resumen,
+        'por_dia': resultado['por_dia'].to_dict(orient='list'),
+        'archivo': salida
+    }
+
+
+def main(argv=None):
+    # Mismo flujo que "python cli.py multiday"
+    from cli import main as cli_main
+    return cli_main(['multiday'] + list(sys.argv[1:] if argv is None else argv))
+
+
+if __name__ == "__main__":
+    sys.exit(perfilado.ejecutar(main, 'simulacion_largo_plazo'))
@@ -1,29 +1,98 @@
 import numpy as np
-import random
+from array import array
+
+PASOS_POR_DIA = 48     # pasos de 30 minutos
+MINUTOS_DIA = 24 * 60  # el reloj de las comidas se reinicia cada día
+MINUTOS_PASO = 30      # minutos entre decisiones
+RESOLUCIONES_CGM = (5, 10, 15, 30)  # minutos_paso posibles (sub-pasos por decisión: 6, 3, 2, 1)
+
+
+def parametros_resolucion(minutos_paso):
+    """
+    Sub-pasos por decisión, fracción de 30 minutos de cada sub-paso y decaimiento de la
+    insulina por sub-paso (0.75 cada 30 minutos) para una resolución de minutos_paso
+    """
+    if minutos_paso not in RESOLUCIONES_CGM:
+        raise ValueError(f"minutos_paso debe ser uno de {RESOLUCIONES_CGM} (recibido {minutos_paso})")
+    fraccion = minutos_paso / MINUTOS_PASO
+    return MINUTOS_PASO // minutos_paso, fraccion, 0.75 ** fraccion
+
+
+def generador_derivado(semilla, *clave):
+    """
+    np.random.Generator de la semilla y la clave (enteros, p. ej. la posición del paciente
+    en la muestra), vía SeedSequence(semilla, spawn_key=clave): el flujo no depende del
+    orden ni del proceso en que se simule. Con semilla None la entropía es nueva.
+    """
+    return np.random.default_rng(np.random.SeedSequence(semilla, spawn_key=clave))
+
+
+class EstadoSimulador:
+    """
+    Estado dinámico de un SimuladorDiabetesRL (ver snapshot/restore)
+    
+    El ruido presorteado del día se guarda por referencia: el simulador nunca modifica
+    ese arreglo, reset() y los pasos extra crean uno nuevo.
+    """
+    
+    __slots__ = ('glucosa', 'insulina_activa', 'tiempo_desde_dosis', 'tiempo_actual', 'pasos', 'ruido')
+    
+    def __init__(self, glucosa, insulina_activa, tiempo_desde_dosis, tiempo_actual, pasos, ruido):
+        self.glucosa = glucosa
+        self.insulina_activa = insulina_activa
+        self.tiempo_desde_dosis = tiempo_desde_dosis
+        self.tiempo_actual = tiempo_actual
+        self.pasos = pasos
+        self.ruido = ruido
+
 
 class SimuladorDiabetesRL:
     """
     Simulador simplificado para entrenamiento RL
     Basado en la propuesta del PDF
+    
+    Los atributos van en __slots__ y las categorías y acciones son de la clase, así que
+    cada simulador ocupa unos cientos de bytes (sobre todo el ruido del día).
+    
+    Las decisiones son cada 30 minutos; con minutos_paso < 30 cada paso se integra en
+    sub-pasos (lecturas tipo CGM cada 5, 10 o 15 minutos, ver step).
     """
     
-    def __init__(self, paciente_id=1, tipo_sensibilidad="normal"):
+    # ESPACIO DE ESTADOS según PDF
+    categorias_glucosa = ["<70", "70-180", "180-250", ">250"]
+    categorias_insulina_activa = [0, 5, 10, 15, 20]
+    categorias_tiempo_dosis = ["0-60", "60-120", "120-240", ">240"]
+    categorias_sensibilidad = ["baja", "normal", "alta"]
+    
+    # ACCIONES según PDF
+    acciones = [0, 5, 10, 15]  # unidades de insulina
+    
+    # Comidas simuladas (picos de glucosa): 8am, 1pm, 8pm
+    HORARIOS_COMIDA = (8*60, 13*60, 20*60)
+    
+    __slots__ = ('paciente_id', 'tipo_sensibilidad', 'rng', 'efecto_insulina', 'metabolismo_basal',
+                 'horarios_comida', 'fuerza_comida', '_variabilidad_extra', 'pasos_por_episodio', 'glucosa',
+                 'insulina_activa', 'tiempo_desde_dosis', 'tiempo_actual', 'pasos', '_ruido', 'minutos_paso',
+                 'sub_pasos', 'fraccion_paso', 'decaimiento_insulina', 'lecturas_cgm')
+    
+    def __init__(self, paciente_id=1, tipo_sensibilidad="normal", rng=None, dias=1, minutos_paso=30):
         """
         Args:
             paciente_id: Identificador del paciente
             tipo_sensibilidad: "baja", "normal", "alta"
+            rng: np.random.Generator propio del simulador, o semilla / SeedSequence
+                 para crearlo (None = entropía nueva)
+            dias: Días seguidos por episodio (las comidas se repiten cada día)
+            minutos_paso: Resolución de la simulación dentro de cada paso de 30 minutos
+                          (5, 10, 15 o 30)
         """
         self.paciente_id = paciente_id
         self.tipo_sensibilidad = tipo_sensibilidad
-        
-        # ESPACIO DE ESTADOS según PDF
-        self.categorias_glucosa = ["<70", "70-180", "180-250", ">250"]
-        self.categorias_insulina_activa = [0, 5, 10, 15, 20]
-        self.categorias_tiempo_dosis = ["0-60", "60-120", "120-240", ">240"]
-        self.categorias_sensibilidad = ["baja", "normal", "alta"]
-        
-        # ACCIONES según PDF
-        self.acciones = [0, 5, 10, 15]  # unidades de insulina
+        self.rng = np.random.default_rng(rng)
+        self._variabilidad_extra = 0.0
+        self.pasos_por_episodio = PASOS_POR_DIA * dias
+        self.minutos_paso = minutos_paso
+        self.sub_pasos, self.fraccion_paso, self.decaimiento_insulina = parametros_resolucion(minutos_paso)
         
         # Parámetros según sensibilidad
         self._configurar_parametros()
@@ -45,17 +114,23 @@ class SimuladorDiabetesRL:
             self.metabolismo_basal = 2.2
         
         # Comidas simuladas (picos de glucosa)
-        self.horarios_comida = [8*60, 13*60, 20*60]  # 8am, 1pm, 8pm
+        self.horarios_comida = self.HORARIOS_COMIDA
         self.fuerza_comida = 25  # mg/dL por comida
     
     def reset(self):
         """Reinicia la simulación"""
         # Estado inicial aleatorio pero realista
-        self.glucosa = np.random.uniform(80, 160)
+        self.glucosa = float(self.rng.uniform(80, 160))
         self.insulina_activa = 0
-        self.tiempo_desde_dosis = np.random.randint(120, 300)  # 2-5 horas
+        self.tiempo_desde_dosis = int(self.rng.integers(120, 300))  # 2-5 horas
         self.tiempo_actual = 0  # minutos desde inicio
         self.pasos = 0
+        self.lecturas_cgm = (self.glucosa,)
+        
+        # Ruido de todos los sub-pasos del episodio, sorteado de una vez (desvío 5 cada
+        # 30 minutos: la varianza de los sub-pasos de un paso suma 25)
+        self._ruido = array('d', self.rng.normal(0, 5 * self.fraccion_paso ** 0.5,
+                                                 size=self.pasos_por_episodio * self.sub_pasos).tobytes())
         
         return self._discretizar_estado()
     
@@ -107,7 +182,7 @@ class SimuladorDiabetesRL:
         """Calcula efecto de comidas en la glucosa"""
         efecto = 0
         for hora_comida in self.horarios_comida:
-            tiempo_desde_comida = self.tiempo_actual - hora_comida
+            tiempo_desde_comida = self.tiempo_actual % MINUTOS_DIA - hora_comida
             # Comida afecta entre 0-90 minutos después
             if 0 <= tiempo_desde_comida <= 90:
                 # Pico a los 60 minutos
@@ -123,6 +198,11 @@ class SimuladorDiabetesRL:
         """
         Ejecuta un paso de simulación (30 minutos)
         
+        Con minutos_paso < 30 el paso se integra en sub-pasos: basal, comidas e insulina
+        se escalan por fraccion_paso (comidas evaluadas a la hora de cada sub-paso), la
+        insulina decae 0.75 ** fraccion_paso y el ruido tiene desvío 5 * sqrt(fraccion_paso).
+        Las glucosas al final de cada sub-paso quedan en lecturas_cgm.
+        
         Args:
             accion: Índice de la acción (0-3)
         
@@ -137,6 +217,36 @@ class SimuladorDiabetesRL:
             self.insulina_activa += dosis
             self.tiempo_desde_dosis = 0
         
+        # Variabilidad aleatoria (presorteada en reset; pasos extra en bloques de un día)
+        inicio_ruido = self.pasos * self.sub_pasos
+        if inicio_ruido >= len(self._ruido):
+            self._ruido = self._ruido + array('d', self.rng.normal(0, 5 * self.fraccion_paso ** 0.5,
+                                                                   size=PASOS_POR_DIA * self.sub_pasos).tobytes())
+        
+        if self.sub_pasos == 1:
+            self._avanzar(self._ruido[inicio_ruido])
+            self.lecturas_cgm = (self.glucosa,)
+        else:
+            lecturas = []
+            for ruido in self._ruido[inicio_ruido:inicio_ruido + self.sub_pasos]:
+                self._avanzar(ruido)
+                lecturas.append(self.glucosa)
+            self.lecturas_cgm = tuple(lecturas)
+        self.pasos += 1
+        
+        # 4. CALCULAR RECOMPENSA (EXACTA del PDF)
+        recompensa = self._calcular_recompensa(dosis)
+        
+        # 5. VERIFICAR TERMINACIÓN
+        terminado = self.pasos >= self.pasos_por_episodio  # 24 horas (48 pasos de 30min) por día
+        
+        # 6. NUEVO ESTADO
+        nuevo_estado = self._discretizar_estado()
+        
+        return nuevo_estado, recompensa, terminado
+    
+    def _avanzar(self, ruido):
+        """Avanza la fisiología un sub-paso de minutos_paso minutos (el paso completo con 30)"""
         # 2. SIMULAR FISIOLOGÍA
         # Efecto insulina
         reduccion_glucosa = self.insulina_activa * self.efecto_insulina
@@ -147,36 +257,21 @@ class SimuladorDiabetesRL:
         # Efecto comidas
         efecto_comida = self._calcular_efecto_comida()
         
-        # Variabilidad aleatoria
-        ruido = np.random.normal(0, 5)
-        
         # Cambio total en glucosa
-        delta_glucosa = aumento_glucosa + efecto_comida - reduccion_glucosa + ruido
+        delta_glucosa = (aumento_glucosa + efecto_comida - reduccion_glucosa) * self.fraccion_paso + ruido
         
         # 3. ACTUALIZAR VARIABLES
         self.glucosa += delta_glucosa
         self.glucosa = max(40, min(400, self.glucosa))  # Límites seguros
         
         # Decaer insulina (25% cada 30min)
-        self.insulina_activa *= 0.75
+        self.insulina_activa *= self.decaimiento_insulina
         if self.insulina_activa < 0.5:
             self.insulina_activa = 0
         
         # Actualizar tiempos
-        self.tiempo_desde_dosis += 30
-        self.tiempo_actual += 30
-        self.pasos += 1
-        
-        # 4. CALCULAR RECOMPENSA (EXACTA del PDF)
-        recompensa = self._calcular_recompensa(dosis)
-        
-        # 5. VERIFICAR TERMINACIÓN
-        terminado = self.pasos >= 48  # 24 horas (48 pasos de 30min)
-        
-        # 6. NUEVO ESTADO
-        nuevo_estado = self._discretizar_estado()
-        
-        return nuevo_estado, recompensa, terminado
+        self.tiempo_desde_dosis += self.minutos_paso
+        self.tiempo_actual += self.minutos_paso
     
     def _calcular_recompensa(self, dosis):
         """Calcula recompensa según PDF"""
@@ -200,6 +295,41 @@ class SimuladorDiabetesRL:
         else:
             return -1
     
+    def snapshot(self):
+        """
+        Captura el estado dinámico del simulador en un EstadoSimulador para poder retomar
+        la simulación desde este punto. Incluye el ruido presorteado del día, así que los
+        pasos restantes se repiten igual; el generador no se guarda (solo se usa en el
+        próximo reset)
+        """
+        return EstadoSimulador(self.glucosa, self.insulina_activa, self.tiempo_desde_dosis,
+                               self.tiempo_actual, self.pasos, self._ruido)
+    
+    def restore(self, snapshot):
+        """Restaura un estado capturado con snapshot() (o de otro simulador del mismo paciente)"""
+        self.glucosa = snapshot.glucosa
+        self.insulina_activa = snapshot.insulina_activa
+        self.tiempo_desde_dosis = snapshot.tiempo_desde_dosis
+        self.tiempo_actual = snapshot.tiempo_actual
+        self.pasos = snapshot.pasos
+        self._ruido = snapshot.ruido
+        self.lecturas_cgm = (self.glucosa,)
+        
+        return self._discretizar_estado()
+    
+    def clonar(self, rng=None):
+        """
+        Copia del simulador en su estado actual, sin volver a configurar parámetros
+        (rollouts, comparaciones con números aleatorios comunes). Comparte con el original
+        el ruido presorteado del día y, si rng es None, el generador
+        """
+        copia = object.__new__(type(self))
+        for nombre in SimuladorDiabetesRL.__slots__:
+            setattr(copia, nombre, getattr(self, nombre))
+        if rng is not None:
+            copia.rng = np.random.default_rng(rng)
+        return copia
+    
     def get_estado_actual(self):
         """Retorna estado actual discreto"""
         return self._discretizar_estado()
@@ -210,7 +340,8 @@ class SimuladorDiabetesRL:
             'glucosa': round(self.glucosa, 1),
             'insulina_activa': round(self.insulina_activa, 1),
             'tiempo_desde_dosis': self.tiempo_desde_dosis,
-            'hora': f"{self.tiempo_actual//60:02d}:{(self.tiempo_actual%60):02d}",
+            'dia': self.tiempo_actual // MINUTOS_DIA + 1,
+            'hora': f"{self.tiempo_actual % MINUTOS_DIA // 60:02d}:{(self.tiempo_actual % 60):02d}",
             'pasos': self.pasos,
             'paciente_id': self.paciente_id,
             'sensibilidad': self.tipo_sensibilidad
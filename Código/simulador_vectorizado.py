@@ -0,0 +1,419 @@
+import numpy as np
+from simulador_diabetes_rl import PASOS_POR_DIA, MINUTOS_DIA, parametros_resolucion
+
+# Bordes de discretización (np.searchsorted con side='right'); los límites
+# inclusivos por arriba ("<= 180") se desplazan al siguiente flotante
+_BORDES_GLUCOSA = np.array([70, np.nextafter(180, np.inf), np.nextafter(250, np.inf)])
+_BORDES_TIEMPO_DOSIS = np.array([np.nextafter(60, np.inf), np.nextafter(120, np.inf), np.nextafter(240, np.inf)])
+
+# Recompensa por tramo de glucosa: <60, 60-70, 70-180, 180-260, >260
+_BORDES_RECOMPENSA = np.array([60, 70, np.nextafter(180, np.inf), np.nextafter(260, np.inf)])
+_VALORES_RECOMPENSA = np.array([-20.0, -1.0, 10.0, -1.0, -15.0])
+
+class SimuladorDiabetesVectorizado:
+    """
+    Versión vectorizada de SimuladorDiabetesRL
+    Simula N pacientes a la vez con la misma dinámica (pasos de 30 minutos),
+    guardando el estado de cada paciente en arreglos de NumPy
+    
+    Con minutos_paso < 30 los sub-pasos de cada paso se calculan juntos como arreglos
+    (sub_pasos, N) (ver _simular_sub_pasos), sin un bucle de Python por sub-paso
+    """
+    
+    # ESPACIO DE ESTADOS y ACCIONES (idénticos al simulador escalar)
+    categorias_sensibilidad = ["baja", "normal", "alta"]
+    acciones = np.array([0, 5, 10, 15])  # unidades de insulina
+    
+    # Parámetros base por sensibilidad: (efecto_insulina, metabolismo_basal)
+    parametros_sensibilidad = {
+        "baja": (1.5, 2.0),
+        "normal": (2.5, 2.2),
+        "alta": (3.5, 2.5)
+    }
+    
+    def __init__(self, tipos_sensibilidad, efecto_insulina=None, metabolismo_basal=None,
+                 fuerza_comida=None, paciente_ids=None, rng=None, dias=1, minutos_paso=30):
+        """
+        Args:
+            tipos_sensibilidad: Lista con "baja", "normal" o "alta" por paciente (o su índice 0-2)
+            efecto_insulina: mg/dL reducidos por unidad (por paciente, opcional)
+            metabolismo_basal: Aumento basal por paso (por paciente, opcional)
+            fuerza_comida: mg/dL por comida (por paciente, opcional)
+            paciente_ids: Identificadores de los pacientes (opcional)
+            rng: np.random.Generator usado para el estado inicial y el ruido, o semilla /
+                 SeedSequence para crearlo (None = entropía nueva)
+            dias: Días seguidos por episodio (las comidas se repiten cada día)
+            minutos_paso: Resolución dentro de cada paso de 30 minutos (5, 10, 15 o 30;
+                          mismo escalado que SimuladorDiabetesRL.step)
+        """
+        self.n = len(tipos_sensibilidad)
+        self.rng = np.random.default_rng(rng)
+        self.pasos_por_episodio = PASOS_POR_DIA * dias
+        self.minutos_paso = minutos_paso
+        self.sub_pasos, self.fraccion_paso, decaimiento = parametros_resolucion(minutos_paso)
+        # Minuto y factor de decaimiento acumulado de cada sub-paso dentro del paso
+        self._minuto_sub_paso = np.arange(self.sub_pasos) * minutos_paso
+        self._decaimiento_sub_paso = decaimiento ** np.arange(self.sub_pasos + 1)[:, None]
+        
+        tipos_sensibilidad = np.asarray(tipos_sensibilidad)
+        if np.issubdtype(tipos_sensibilidad.dtype, np.integer):
+            self.sensibilidad_idx = tipos_sensibilidad.astype(np.int64)
+        else:
+            self.sensibilidad_idx = np.array(
+                [self.categorias_sensibilidad.index(s) for s in tipos_sensibilidad], dtype=np.int64
+            )
+        self.paciente_ids = (np.asarray(paciente_ids) if paciente_ids is not None
+                             else np.arange(self.n))
+        
+        # Parámetros según sensibilidad (mismos valores que _configurar_parametros)
+        base_efecto = np.array([self.parametros_sensibilidad[s][0] for s in self.categorias_sensibilidad])
+        base_basal = np.array([self.parametros_sensibilidad[s][1] for s in self.categorias_sensibilidad])
+        
+        self.efecto_insulina = (np.asarray(efecto_insulina, dtype=float) if efecto_insulina is not None
+                                else base_efecto[self.sensibilidad_idx])
+        self.metabolismo_basal = (np.asarray(metabolismo_basal, dtype=float) if metabolismo_basal is not None
+                                  else base_basal[self.sensibilidad_idx])
+        self.fuerza_comida = (np.asarray(fuerza_comida, dtype=float) if fuerza_comida is not None
+                              else np.full(self.n, 25.0))
+        
+        # Comidas simuladas (picos de glucosa)
+        self.horarios_comida = np.array([8*60, 13*60, 20*60])  # 8am, 1pm, 8pm
+        self.tabular_efecto_comida()
+        
+        # Inicializar
+        self.reset()
+    
+    def repetir(self, k, rng=None):
+        """
+        Crea un simulador con cada paciente repetido k veces (filas ordenadas por paciente),
+        útil para simular varias realizaciones de ruido en una sola pasada
+        """
+        simulador = SimuladorDiabetesVectorizado(
+            np.repeat(self.sensibilidad_idx, k),
+            efecto_insulina=np.repeat(self.efecto_insulina, k),
+            metabolismo_basal=np.repeat(self.metabolismo_basal, k),
+            fuerza_comida=np.repeat(self.fuerza_comida, k),
+            paciente_ids=np.repeat(self.paciente_ids, k),
+            rng=rng if rng is not None else self.rng,
+            dias=self.pasos_por_episodio // PASOS_POR_DIA,
+            minutos_paso=self.minutos_paso
+        )
+        simulador.horarios_comida = self.horarios_comida.copy()
+        simulador.tabular_efecto_comida()
+        
+        return simulador
+    
+    @classmethod
+    def desde_simulador(cls, simulador, n=1, rng=None):
+        """
+        Crea un simulador vectorizado con n copias de un SimuladorDiabetesRL
+        (mismos parámetros fisiológicos y mismo estado actual)
+        """
+        vectorizado = cls(
+            [simulador.tipo_sensibilidad] * n,
+            efecto_insulina=np.full(n, float(simulador.efecto_insulina)),
+            metabolismo_basal=np.full(n, float(simulador.metabolismo_basal)),
+            fuerza_comida=np.full(n, float(simulador.fuerza_comida)),
+            paciente_ids=np.full(n, simulador.paciente_id),
+            rng=rng,
+            dias=simulador.pasos_por_episodio // PASOS_POR_DIA,
+            minutos_paso=simulador.minutos_paso
+        )
+        vectorizado.horarios_comida = np.array(simulador.horarios_comida)
+        vectorizado.tabular_efecto_comida()
+        vectorizado.fijar_estado(simulador.glucosa, simulador.insulina_activa,
+                                 simulador.tiempo_desde_dosis, simulador.tiempo_actual, simulador.pasos)
+        
+        return vectorizado
+    
+    def fijar_estado(self, glucosa, insulina_activa, tiempo_desde_dosis, tiempo_actual, pasos):
+        """Fija el estado dinámico de todos los pacientes (escalares o arreglos (N,))"""
+        self.glucosa = np.broadcast_to(np.asarray(glucosa, dtype=float), (self.n,)).copy()
+        self.insulina_activa = np.broadcast_to(np.asarray(insulina_activa, dtype=float), (self.n,)).copy()
+        self.tiempo_desde_dosis = np.broadcast_to(np.asarray(tiempo_desde_dosis, dtype=np.int64), (self.n,)).copy()
+        self.tiempo_actual = np.broadcast_to(np.asarray(tiempo_actual, dtype=np.int64), (self.n,)).copy()
+        self.pasos = pasos
+        self.lecturas_cgm = self.glucosa[None, :]
+        
+        return self.indices_estado()
+    
+    def snapshot(self):
+        """
+        Estado dinámico de todos los pacientes: copias de glucosa, insulina_activa,
+        tiempo_desde_dosis y tiempo_actual, y el paso actual (ver restore)
+        """
+        return (self.glucosa.copy(), self.insulina_activa.copy(), self.tiempo_desde_dosis.copy(),
+                self.tiempo_actual.copy(), self.pasos)
+    
+    def restore(self, snapshot):
+        """Restaura un estado capturado con snapshot() (el mismo se puede restaurar varias veces)"""
+        glucosa, insulina_activa, tiempo_desde_dosis, tiempo_actual, self.pasos = snapshot
+        self.glucosa = glucosa.copy()
+        self.insulina_activa = insulina_activa.copy()
+        self.tiempo_desde_dosis = tiempo_desde_dosis.copy()
+        self.tiempo_actual = tiempo_actual.copy()
+        self.lecturas_cgm = self.glucosa[None, :]
+        
+        return self.indices_estado()
+    
+    def reset(self, glucosa_inicial=None):
+        """
+        Reinicia la simulación de todos los pacientes
+        
+        Args:
+            glucosa_inicial: Escalar o arreglo (N,). Si es None se sortea como en
+                             SimuladorDiabetesRL.reset (80-160 mg/dL)
+        """
+        if glucosa_inicial is None:
+            self.glucosa = self.rng.uniform(80, 160, size=self.n)
+        else:
+            self.glucosa = np.broadcast_to(np.asarray(glucosa_inicial, dtype=float), (self.n,)).copy()
+        self.insulina_activa = np.zeros(self.n)
+        self.tiempo_desde_dosis = self.rng.integers(120, 300, size=self.n)  # 2-5 horas
+        self.tiempo_actual = np.zeros(self.n, dtype=np.int64)  # minutos desde inicio
+        self.pasos = 0
+        self.lecturas_cgm = self.glucosa[None, :]
+        
+        return self.indices_estado()
+    
+    def indices_estado(self):
+        """Discretiza el estado de todos los pacientes y devuelve su índice en la Q-table"""
+        # 1. Glucosa: "<70", "70-180", "180-250", ">250"
+        g_idx = np.searchsorted(_BORDES_GLUCOSA, self.glucosa, side='right')
+        
+        # 2. Insulina activa (redondeada a múltiplos de 5, máximo 20)
+        i_idx = np.minimum(4, np.round(self.insulina_activa / 5)).astype(np.int64)
+        
+        # 3. Tiempo desde última dosis: "0-60", "60-120", "120-240", ">240"
+        t_idx = np.searchsorted(_BORDES_TIEMPO_DOSIS, self.tiempo_desde_dosis, side='right')
+        
+        # Índice único: g*60 + i*12 + t*3 + s
+        return g_idx*60 + i_idx*12 + t_idx*3 + self.sensibilidad_idx
+    
+    def tabular_efecto_comida(self):
+        """
+        Precalcula la progresión de las comidas minuto a minuto (sin multiplicar por
+        fuerza_comida), y por minuto de inicio de paso la de cada sub-paso. Debe llamarse
+        de nuevo si se modifica horarios_comida
+        """
+        minutos = np.arange(int(np.max(self.horarios_comida)) + 92)
+        tiempo_desde_comida = minutos[:, None] - self.horarios_comida[None, :]
+        
+        # Comida afecta entre 0-90 minutos después, pico a los 60 minutos
+        # (rampa d/60 hasta el pico y luego 1 - (d-60)/30; fuera de la ventana vale 0)
+        progresion = np.minimum(tiempo_desde_comida / 60, (90 - tiempo_desde_comida) / 30)
+        self._progresion_comida = np.maximum(progresion, 0).sum(axis=1)
+        
+        # (sub_pasos, minutos): progresión en cada sub-paso de un paso que empieza en ese minuto
+        ultimo = len(self._progresion_comida) - 1
+        self._progresion_sub_paso = self._progresion_comida[np.minimum(self._minuto_sub_paso[:, None] + minutos, ultimo)]
+    
+    def _calcular_efecto_comida(self):
+        """Calcula efecto de comidas en la glucosa para todos los pacientes"""
+        # Después de la última comida la tabla termina en 0; el reloj se reinicia cada día
+        ultimo = len(self._progresion_comida) - 1
+        return self.fuerza_comida * self._progresion_comida[np.minimum(self.tiempo_actual % MINUTOS_DIA, ultimo)]
+    
+    def step(self, acciones_idx, ruido=None):
+        """
+        Ejecuta un paso de simulación (30 minutos) para todos los pacientes
+        
+        Args:
+            acciones_idx: Arreglo (N,) con el índice de la acción (0-3) de cada paciente
+            ruido: Arreglo (sub_pasos, N) opcional con la variabilidad aleatoria a aplicar
+                   (o (N,) con minutos_paso = 30); basta una forma compatible por
+                   broadcasting, p. ej. un escalar compartido por todos los pacientes
+        
+        Returns:
+            (nuevos_estados_idx, recompensas, terminado); las glucosas al final de cada
+            sub-paso quedan en lecturas_cgm (sub_pasos, N)
+        """
+        dosis = self.acciones[acciones_idx]
+        
+        # 1. ADMINISTRAR INSULINA
+        con_dosis = dosis > 0
+        self.insulina_activa = self.insulina_activa + dosis
+        self.tiempo_desde_dosis = np.where(con_dosis, 0, self.tiempo_desde_dosis)
+        
+        if self.sub_pasos > 1:
+            self._simular_sub_pasos(ruido)
+        else:
+            self._simular_paso(ruido)
+        self.pasos += 1
+        
+        # 4. CALCULAR RECOMPENSA
+        recompensas = self._calcular_recompensa(dosis)
+        
+        # 5. VERIFICAR TERMINACIÓN
+        terminado = self.pasos >= self.pasos_por_episodio  # 24 horas (48 pasos de 30min) por día
+        
+        return self.indices_estado(), recompensas, terminado
+    
+    def _simular_paso(self, ruido):
+        """Fisiología de un paso de 30 minutos con una sola actualización"""
+        # 2. SIMULAR FISIOLOGÍA
+        reduccion_glucosa = self.insulina_activa * self.efecto_insulina
+        efecto_comida = self._calcular_efecto_comida()
+        if ruido is None:
+            ruido = self.rng.normal(0, 5, size=self.n)
+        else:
+            ruido = np.broadcast_to(ruido, (self.n,))
+        
+        delta_glucosa = self.metabolismo_basal + efecto_comida - reduccion_glucosa + ruido
+        
+        # 3. ACTUALIZAR VARIABLES
+        self.glucosa = np.clip(self.glucosa + delta_glucosa, 40, 400)  # Límites seguros
+        
+        # Decaer insulina (25% cada 30min)
+        self.insulina_activa = self.insulina_activa * 0.75
+        self.insulina_activa[self.insulina_activa < 0.5] = 0
+        
+        # Actualizar tiempos
+        self.tiempo_desde_dosis = self.tiempo_desde_dosis + 30
+        self.tiempo_actual = self.tiempo_actual + 30
+        self.lecturas_cgm = self.glucosa[None, :]
+    
+    def _simular_sub_pasos(self, ruido):
+        """
+        Fisiología de un paso de 30 minutos en sub_pasos sub-pasos de minutos_paso minutos
+        
+        Sin dosis dentro del paso la insulina de cada sub-paso es insulina_activa por el
+        decaimiento acumulado (0 desde que baja de 0.5 U), así que los cambios de glucosa
+        de todos los sub-pasos se calculan juntos como arreglos (sub_pasos, N); por
+        sub-paso solo queda sumarlos y recortar a 40-400 mg/dL, fila a fila
+        """
+        # 2. SIMULAR FISIOLOGÍA (basal, comidas e insulina escalados a fraccion_paso; los
+        # factores por paciente se multiplican antes, sobre arreglos (N,))
+        insulina = self._decaimiento_sub_paso * self.insulina_activa  # (sub_pasos + 1, N)
+        decaida = insulina[1:]
+        decaida[decaida < 0.5] = 0
+        
+        ultimo = len(self._progresion_comida) - 1
+        progresion = self._progresion_sub_paso.take(np.minimum(self.tiempo_actual % MINUTOS_DIA, ultimo), axis=1)
+        
+        if ruido is None:
+            ruido = self.rng.normal(0, 5 * self.fraccion_paso ** 0.5, size=(self.sub_pasos, self.n))
+        
+        # Cambio de glucosa de cada sub-paso; las filas se acumulan en el mismo arreglo
+        lecturas = progresion * (self.fuerza_comida * self.fraccion_paso)
+        lecturas -= insulina[:-1] * (self.efecto_insulina * self.fraccion_paso)
+        lecturas += self.metabolismo_basal * self.fraccion_paso
+        lecturas += np.broadcast_to(ruido, (self.sub_pasos, self.n))
+        
+        # 3. ACTUALIZAR VARIABLES (cada fila pasa a ser la glucosa al final de su sub-paso)
+        glucosa = self.glucosa
+        for sub_paso in range(self.sub_pasos):
+            glucosa = np.clip(glucosa + lecturas[sub_paso], 40, 400, out=lecturas[sub_paso])  # Límites seguros
+        self.lecturas_cgm = lecturas
+        self.glucosa = lecturas[-1].copy()
+        
+        # Insulina al final del paso (25% menos cada 30min)
+        self.insulina_activa = insulina[-1]
+        
+        # Actualizar tiempos
+        self.tiempo_desde_dosis = self.tiempo_desde_dosis + 30
+        self.tiempo_actual = self.tiempo_actual + 30
+    
+    def _calcular_recompensa(self, dosis):
+        """Calcula recompensa según PDF (mismo orden de prioridad que el simulador escalar)"""
+        recompensas = _VALORES_RECOMPENSA[np.searchsorted(_BORDES_RECOMPENSA, self.glucosa, side='right')]
+        
+        # Dosis excesiva (solo aplica fuera del rango ideal y de los extremos)
+        if self.acciones.max() > 20:
+            recompensas = np.where((dosis > 20) & (recompensas == -1.0), -5.0, recompensas)
+        return recompensas
+    
+    def simular_dia(self, q_table, glucosa_inicial=None, n_pasos=None, registro=None):
+        """
+        Simula un día completo con la política greedy de la Q-table
+        
+        Registra los valores ANTES de cada paso (igual que simular_dia_completo del planificador).
+        Si se pasa un RegistroTrayectorias, además agrega cada paso con la glucosa DESPUÉS del paso.
+        n_pasos = None simula el episodio completo (pasos_por_episodio, 48 por día).
+        
+        Returns:
+            dict con arreglos (N, n_pasos): glucosa, dosis, accion_idx, insulina_activa, estado_idx,
+            (N, n_pasos * sub_pasos) glucosa_cgm con las lecturas DESPUÉS de cada sub-paso
+            y (N,) recompensa_total
+        """
+        if n_pasos is None:
+            n_pasos = self.pasos_por_episodio
+        estados = self.reset(glucosa_inicial)
+        
+        # Se llena por paso (filas contiguas) y se transpone al final a (N, n_pasos)
+        glucosa = np.empty((n_pasos, self.n), dtype=np.float32)
+        accion_idx = np.empty((n_pasos, self.n), dtype=np.int8)
+        insulina_activa = np.empty((n_pasos, self.n), dtype=np.float32)
+        estado_idx = np.empty((n_pasos, self.n), dtype=np.int16)
+        glucosa_cgm = np.empty((n_pasos * self.sub_pasos, self.n), dtype=np.float32)
+        recompensa_total = np.zeros(self.n)
+        
+        # La política está congelada: se precalcula la acción greedy de cada estado
+        politica = np.argmax(q_table, axis=1)
+        
+        for paso in range(n_pasos):
+            acciones = politica[estados]
+            
+            glucosa[paso] = self.glucosa
+            accion_idx[paso] = acciones
+            insulina_activa[paso] = self.insulina_activa
+            estado_idx[paso] = estados
+            
+            estados, recompensas, _ = self.step(acciones)
+            recompensa_total += recompensas
+            glucosa_cgm[paso * self.sub_pasos:(paso + 1) * self.sub_pasos] = self.lecturas_cgm
+            if registro is not None:
+                registro.agregar_lote(self.paciente_ids, 0, paso, estado_idx[paso], acciones, recompensas,
+                                      self.glucosa, self.insulina_activa)
+        
+        accion_idx = np.ascontiguousarray(accion_idx.T)
+        datos = {
+            'glucosa': np.ascontiguousarray(glucosa.T),
+            'dosis': self.acciones[accion_idx].astype(np.int8),
+            'accion_idx': accion_idx,
+            'insulina_activa': np.ascontiguousarray(insulina_activa.T),
+            'estado_idx': np.ascontiguousarray(estado_idx.T),
+            'glucosa_cgm': np.ascontiguousarray(glucosa_cgm.T),
+            'recompensa_total': recompensa_total
+        }
+        
+        return datos
+
+
+def clasificar_sensibilidad(factor_sens):
+    """Clasifica el factor de sensibilidad del paciente en "baja", "normal" o "alta" """
+    factor_sens = np.asarray(factor_sens, dtype=float)
+    return np.where(factor_sens < 40, "baja", np.where(factor_sens < 60, "normal", "alta"))
+
+
+def crear_simulador_vectorizado(df_pacientes, rng=None, dias=1, minutos_paso=30):
+    """
+    Crea un simulador vectorizado para todos los pacientes de un DataFrame,
+    con el mismo ajuste de parámetros que crear_simulador_personalizado
+    """
+    n = len(df_pacientes)
+    
+    def columna(nombre, defecto):
+        if nombre in df_pacientes.columns:
+            return df_pacientes[nombre].to_numpy(dtype=float)
+        return np.full(n, float(defecto))
+    
+    factor_sens = columna('factor_sensibilidad', 50)
+    peso = columna('peso_kg', 70)
+    raciones = columna('raciones_carbohidratos', 70)
+    
+    tipos_sensibilidad = clasificar_sensibilidad(factor_sens)
+    basal_base = np.array([SimuladorDiabetesVectorizado.parametros_sensibilidad[s][1] for s in tipos_sensibilidad])
+    
+    paciente_ids = df_pacientes['id'].to_numpy() if 'id' in df_pacientes.columns else np.arange(n)
+    
+    return SimuladorDiabetesVectorizado(
+        tipos_sensibilidad,
+        efecto_insulina=2.5 * (50 / np.maximum(20, factor_sens)),
+        metabolismo_basal=basal_base * (peso / 70.0),
+        fuerza_comida=25 * (raciones / 70.0),
+        paciente_ids=paciente_ids,
+        rng=rng,
+        dias=dias,
+        minutos_paso=minutos_paso
+    )
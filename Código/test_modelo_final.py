@@ -1,17 +1,18 @@
 import numpy as np
-import pandas as pd
-import matplotlib.pyplot as plt
 import pickle
 import json
+import sys
 from tqdm import tqdm
 from datetime import datetime
-import seaborn as sns
-from simulador_diabetes_rl import SimuladorDiabetesRL
+from simulador_diabetes_rl import SimuladorDiabetesRL, generador_derivado
 from agente_q_learning import AgenteQLearning
 import warnings
 warnings.filterwarnings('ignore')
 import os
 import glob
+import perfilado
+import graficos
+from registro_trayectorias import RegistroTrayectorias
 
 class EvaluadorFinal:
     
@@ -78,6 +79,7 @@ class EvaluadorFinal:
         
         # Cargar pacientes
         print("\n3. Cargando base de datos de pacientes...")
+        import pandas as pd
         try:
             self.df_pacientes = pd.read_csv(self.db_path)
             print(f"   {len(self.df_pacientes):,} pacientes cargados")
@@ -100,7 +102,7 @@ class EvaluadorFinal:
             print(f"   Error cargando datos: {e}")
             return False
     
-    def crear_simulador_personalizado(self, paciente_data):
+    def crear_simulador_personalizado(self, paciente_data, rng=None):
         # Usar factor_sensibilidad para determinar sensibilidad
         factor_sens = paciente_data.get('factor_sensibilidad', 50)
         
@@ -114,7 +116,8 @@ class EvaluadorFinal:
         # Crear simulador
         simulador = SimuladorDiabetesRL(
             paciente_id=paciente_data.get('id', 1),
-            tipo_sensibilidad=sensibilidad
+            tipo_sensibilidad=sensibilidad,
+            rng=rng
         )
         
         # Ajustar parámetros según paciente real
@@ -136,7 +139,20 @@ class EvaluadorFinal:
         
         return simulador
     
-    def evaluar_muestra(self, n_pacientes=1000, n_episodios_por_paciente=3):
+    def evaluar_muestra(self, n_pacientes=1000, n_episodios_por_paciente=3, n_workers=1, tamano_lote=250, semilla=None,
+                        directorio_trayectorias=None):
+        """
+        Evalúa la política greedy sobre una muestra de pacientes
+        
+        Args:
+            n_workers: Procesos en paralelo (1 = secuencial, en este proceso)
+            tamano_lote: Pacientes por tarea cuando n_workers > 1
+            semilla: Semilla del ruido de la simulación (None = sin fijar). Cada paciente
+                     simula con generador_derivado(semilla, posición en la muestra), así
+                     el resultado es el mismo en secuencial y con cualquier n_workers
+            directorio_trayectorias: Guardar cada paso evaluado (ver registro_trayectorias.py);
+                                     en paralelo, un subdirectorio por lote
+        """
         print(f"\n4. Evaluando con {n_pacientes:,} pacientes ({n_episodios_por_paciente} episodios cada uno)...")
         
         if n_pacientes > len(self.df_pacientes):
@@ -146,6 +162,39 @@ class EvaluadorFinal:
         # Seleccionar muestra representativa
         muestra = self.df_pacientes.sample(n=n_pacientes, random_state=42)
         
+        if semilla is None:
+            semilla = np.random.SeedSequence().entropy
+        
+        if n_workers > 1 and len(muestra) > tamano_lote:
+            metricas_totales = self._evaluar_en_paralelo(muestra, n_episodios_por_paciente,
+                                                         n_workers, tamano_lote, semilla, directorio_trayectorias)
+        else:
+            registro = None
+            if directorio_trayectorias is not None:
+                registro = RegistroTrayectorias(directorio_trayectorias, origen='evaluacion')
+            
+            # Barra de progreso
+            pbar = tqdm(total=len(muestra), desc="Evaluando pacientes", unit="paciente")
+            metricas_totales = self._evaluar_pacientes(muestra, n_episodios_por_paciente, pbar, registro=registro,
+                                                       semilla=semilla)
+            pbar.close()
+            if registro is not None:
+                registro.cerrar()
+        
+        # Guardar resultados
+        self.resultados = metricas_totales
+        
+        print(f"\nEvaluacion completada:")
+        print(f"  - Total episodios: {len(metricas_totales['tiempo_en_rango']):,}")
+        print(f"  - Pacientes evaluados: {len(muestra):,}")
+        
+        return metricas_totales
+    
+    def _evaluar_pacientes(self, muestra, n_episodios_por_paciente, pbar=None, registro=None, semilla=None, inicio=0):
+        """
+        Evalúa la política greedy sobre un DataFrame de pacientes y retorna las métricas acumuladas
+        (inicio: posición del primer paciente en la muestra completa, que fija su generador)
+        """
         # Inicializar métricas
         metricas_totales = {
             'tiempo_en_rango': [],
@@ -163,11 +212,10 @@ class EvaluadorFinal:
             }
         }
         
-        # Barra de progreso
-        pbar = tqdm(total=len(muestra), desc="Evaluando pacientes", unit="paciente")
-        
-        for _, paciente in muestra.iterrows():
-            simulador = self.crear_simulador_personalizado(paciente.to_dict())
+        for posicion, (indice, paciente) in enumerate(muestra.iterrows(), start=inicio):
+            simulador = self.crear_simulador_personalizado(paciente.to_dict(),
+                                                           rng=generador_derivado(semilla, posicion))
+            paciente_id = paciente.get('id', indice)
             
             # Determinar categorías del paciente
             tipo_diabetes = paciente['tipo_diabetes_especifico']
@@ -201,7 +249,7 @@ class EvaluadorFinal:
                 }
             
             # Evaluar múltiples episodios por paciente
-            for _ in range(n_episodios_por_paciente):
+            for episodio in range(n_episodios_por_paciente):
                 estado = simulador.reset()
                 estado_idx = self.agente.estado_a_indice(estado, simulador)
                 terminado = False
@@ -218,6 +266,9 @@ class EvaluadorFinal:
                     
                     nuevo_estado, recompensa, terminado = simulador.step(accion_idx)
                     nuevo_estado_idx = self.agente.estado_a_indice(nuevo_estado, simulador)
+                    if registro is not None:
+                        registro.agregar(paciente_id, episodio, simulador.pasos - 1, estado_idx, accion_idx,
+                                         recompensa, simulador.glucosa, simulador.insulina_activa)
                     
                     estado_idx = nuevo_estado_idx
                     recompensa_total += recompensa
@@ -252,18 +303,43 @@ class EvaluadorFinal:
                 # Guardar por edad
                 metricas_totales['por_edad'][cat_edad].append(tiempo_rango)
             
-            pbar.update(1)
+            if pbar is not None:
+                pbar.update(1)
         
+        return metricas_totales
+    
+    def _evaluar_en_paralelo(self, muestra, n_episodios_por_paciente, n_workers, tamano_lote, semilla=None,
+                             directorio_trayectorias=None):
+        """
+        Reparte la muestra en lotes de `tamano_lote` pacientes entre `n_workers` procesos.
+        Cada paciente usa el generador de su posición en la muestra, así el resultado no
+        depende del reparto en lotes ni del orden en que terminan los procesos
+        """
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+        
+        if semilla is None:
+            semilla = np.random.SeedSequence().entropy
+        
+        lotes = [muestra.iloc[i:i + tamano_lote] for i in range(0, len(muestra), tamano_lote)]
+        print(f"   {len(lotes)} lotes de hasta {tamano_lote} pacientes en {n_workers} procesos")
+        
+        partes = [None] * len(lotes)
+        pbar = tqdm(total=len(muestra), desc="Evaluando pacientes", unit="paciente")
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            futuros = {
+                executor.submit(_evaluar_lote_proceso, self.agente.q_table, lote,
+                                n_episodios_por_paciente, semilla, i * tamano_lote,
+                                None if directorio_trayectorias is None
+                                else os.path.join(directorio_trayectorias, f"lote_{i:04d}")): i
+                for i, lote in enumerate(lotes)
+            }
+            for futuro in as_completed(futuros):
+                i = futuros[futuro]
+                partes[i] = futuro.result()
+                pbar.update(len(lotes[i]))
         pbar.close()
         
-        # Guardar resultados
-        self.resultados = metricas_totales
-        
-        print(f"\nEvaluacion completada:")
-        print(f"  - Total episodios: {len(metricas_totales['tiempo_en_rango']):,}")
-        print(f"  - Pacientes evaluados: {len(muestra):,}")
-        
-        return metricas_totales
+        return _combinar_metricas(partes)
     
     def calcular_estadisticas(self):
         if not self.resultados:
@@ -348,6 +424,10 @@ class EvaluadorFinal:
             print("No hay resultados para visualizar")
             return
         
+        import pandas as pd
+        import seaborn as sns
+        plt = graficos.pyplot()
+        
         # Configurar estilo
         plt.style.use('seaborn-v0_8-darkgrid')
         sns.set_palette("husl")
@@ -379,7 +459,8 @@ class EvaluadorFinal:
                 etiquetas_tipo.append(etiqueta)
         
         if datos_tipo:
-            bp = axes[0, 1].boxplot(datos_tipo, labels=etiquetas_tipo, patch_artist=True)
+            bp = axes[0, 1].boxplot(datos_tipo, patch_artist=True)
+            axes[0, 1].set_xticks(range(1, len(etiquetas_tipo) + 1), etiquetas_tipo)
             # Colorear las cajas
             for patch in bp['boxes']:
                 patch.set_facecolor(sns.color_palette()[0])
@@ -467,7 +548,7 @@ class EvaluadorFinal:
             plt.savefig(filename, dpi=300, bbox_inches='tight')
             print(f"\nGraficos guardados como: {filename}")
         
-        plt.show()
+        graficos.mostrar(plt)
         
         return fig
     
@@ -558,19 +639,23 @@ class EvaluadorFinal:
             'md': nombre_md
         }
     
-    def ejecutar_evaluacion_completa(self, n_pacientes=1000):
+    def ejecutar_evaluacion_completa(self, n_pacientes=1000, n_episodios_por_paciente=3, n_workers=1,
+                                     tamano_lote=250, semilla=None, visualizar=True, directorio_trayectorias=None):
         # Cargar modelo y datos
         if not self.cargar_modelo_y_datos():
             return None
         
         # Evaluar muestra
-        resultados = self.evaluar_muestra(n_pacientes=n_pacientes, n_episodios_por_paciente=3)
+        resultados = self.evaluar_muestra(n_pacientes=n_pacientes, n_episodios_por_paciente=n_episodios_por_paciente,
+                                          n_workers=n_workers, tamano_lote=tamano_lote, semilla=semilla,
+                                          directorio_trayectorias=directorio_trayectorias)
         
         # Calcular estadísticas
         estadisticas = self.calcular_estadisticas()
         
         # Visualizar resultados
-        self.visualizar_resultados()
+        if visualizar:
+            self.visualizar_resultados()
         
         # Guardar resultados
         archivos = self.guardar_resultados()
@@ -604,62 +689,46 @@ class EvaluadorFinal:
             'archivos': archivos
         }
 
-def main():
+def _evaluar_lote_proceso(q_table, lote, n_episodios_por_paciente, semilla, inicio, directorio_trayectorias=None):
+    """
+    Tarea de un proceso de evaluación: evalúa un lote de pacientes con la Q-table dada
+    (inicio: posición del lote en la muestra)
+    """
+    evaluador = EvaluadorFinal()
+    evaluador.agente = AgenteQLearning(n_estados=q_table.shape[0], n_acciones=q_table.shape[1])
+    evaluador.agente.q_table = q_table
+    if directorio_trayectorias is None:
+        return evaluador._evaluar_pacientes(lote, n_episodios_por_paciente, semilla=semilla, inicio=inicio)
+    with RegistroTrayectorias(directorio_trayectorias, origen='evaluacion') as registro:
+        return evaluador._evaluar_pacientes(lote, n_episodios_por_paciente, registro=registro,
+                                            semilla=semilla, inicio=inicio)
+
+
+def _combinar_metricas(partes):
+    """Une las métricas de varios lotes (en orden) en una sola estructura"""
+    combinadas = partes[0]
+    for parte in partes[1:]:
+        for clave in ('tiempo_en_rango', 'hipoglucemias', 'hiperglucemias', 'recompensas',
+                      'glucosa_promedio', 'acciones_promedio'):
+            combinadas[clave].extend(parte[clave])
+        for grupo in ('por_sensibilidad', 'por_edad'):
+            for categoria, valores in parte[grupo].items():
+                combinadas[grupo][categoria].extend(valores)
+        for tipo, datos in parte['por_tipo_diabetes'].items():
+            if tipo not in combinadas['por_tipo_diabetes']:
+                combinadas['por_tipo_diabetes'][tipo] = datos
+                continue
+            destino = combinadas['por_tipo_diabetes'][tipo]
+            for clave in ('tiempo_en_rango', 'hipoglucemias', 'hiperglucemias', 'recompensas'):
+                destino[clave].extend(datos[clave])
+            destino['count'] += datos['count']
+    return combinadas
 
-    print("TEST FINAL DEL MODELO RL - DIABETES TIPO 1")
-    
-    # Configuración - buscar en Resultados/best_model/
-    MODELO_PATH = "Resultados/best_model/best_model.pkl"  # Ruta fija al mejor modelo
-    DB_PATH = "Base de datos/db_diabetes_50k.csv"
-    
-    # Crear directorios necesarios
-    os.makedirs('Resultados', exist_ok=True)
-    os.makedirs('Resultados/best_model', exist_ok=True)
-    
-    # Verificar si existe la base de datos
-    if not os.path.exists(DB_PATH):
-        print(f"ERROR: No se encuentra la base de datos: {DB_PATH}")
-        print("Asegurate de que el archivo existe en el directorio actual.")
-        return
-    
-    try:
-        df_temp = pd.read_csv(DB_PATH, nrows=1)
-        total_pacientes = sum(1 for line in open(DB_PATH)) - 1  # Contar líneas menos el encabezado
-        N_PACIENTES_EVALUAR = total_pacientes
-    except:
-        N_PACIENTES_EVALUAR = 1000
-    
-    print(f"\nConfiguracion:")
-    print(f" - Modelo: {MODELO_PATH}")
-    print(f" - Base de datos: {DB_PATH}")
-    print(f" - Pacientes a evaluar: {N_PACIENTES_EVALUAR}")
-    
-    # Crear evaluador
-    evaluador = EvaluadorFinal(modelo_path=MODELO_PATH, db_path=DB_PATH)
-    
-    # Ejecutar evaluación completa
-    resultados = evaluador.ejecutar_evaluacion_completa(n_pacientes=N_PACIENTES_EVALUAR)
-    
-    if resultados:
-        print(f"\nRESULTADO FINAL:")
-        print(f"  - Pacientes evaluados: {N_PACIENTES_EVALUAR}")
-        print(f"  - Modelo: {MODELO_PATH}")
-        print(f"  - Dataset: {DB_PATH}")
-        
-        if 'estadisticas' in resultados and resultados['estadisticas']:
-            stats = resultados['estadisticas']
-            print(f"\nMETRICAS FINALES:")
-            print(f"  - Tiempo en rango: {stats['tiempo_en_rango']['mean']:.1f}%")
-            print(f"  - Hipoglucemias: {stats['hipoglucemias']['mean']:.1f}%")
-            print(f"  - Hiperglucemias: {stats['hiperglucemias']['mean']:.1f}%")
-            print(f"  - Puntuacion: {stats.get('puntuacion_compuesta', 0):.1f}/100")
-        
-        print(f"\nArchivos generados:")
-        if 'archivos' in resultados:
-            for tipo, archivo in resultados['archivos'].items():
-                print(f"  - {archivo}")
 
-    print("PROCESO FINALIZADO")
+def main(argv=None):
+    # Mismo flujo que "python cli.py evaluate"
+    from cli import main as cli_main
+    return cli_main(['evaluate'] + list(sys.argv[1:] if argv is None else argv))
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(perfilado.ejecutar(main, 'test_modelo_final'))
\ No newline at end of file